@@ -0,0 +1,472 @@
+"""
+Agregados por hora e por dia das métricas de acesso e de eventos
+Substitui as sete consultas sobre page_views cruas de getAccessMetrics (e o
+GROUP BY de getEventMetrics em activity_logs), cujo custo cresce com o período:
+um ano no painel passa a ler centenas de linhas agregadas em vez de milhões.
+
+Tabelas (migração 0007 de schema_migrations.py), todas com granularidade
+'hour' e 'day' (UTC, como o created_at do Prisma):
+  page_view_rollups           views, sketches de sessões e usuários únicos e,
+                              nas linhas diárias, views por hora do dia
+  page_view_path_rollups      views por path
+  page_view_referrer_rollups  views por referrer (vazios fora, como no painel)
+  activity_rollups            eventos e sketch de usuários por action_type
+  analytics_rollup_state      marca d'água (último id processado) e ids
+                              pendentes por tabela
+
+Únicos usam HyperLogLog (2^11 registradores, erro típico ~2,3%): o sketch de
+um período é a união (máximo por registrador) dos sketches das horas/dias, e o
+hash vem do próprio banco (hashtextextended), que já devolve o menor valor por
+registrador; só chegam ao Python no máximo 2048 linhas por hora.
+
+A atualização é incremental pelo id: processa só as linhas acima da marca
+d'água, em blocos de ROLLUP_CHUNK_IDS ids, um commit por bloco junto com a
+nova marca d'água (uma queda no meio não conta nada duas vezes). O limite
+superior é o max(id) visível, sem lock (os INSERTs nunca esperam pelos
+agregados): um INSERT ainda em andamento pode ter um id menor que ele e
+aparecer depois. Por isso os ids que faltam nos últimos ROLLUP_OVERLAP_IDS
+abaixo da marca d'água ficam pendentes e são conferidos de novo nas rodadas
+seguintes; cada linha entra uma única vez, quando aparece. Ids que saem da
+janela sem aparecer são de transações desfeitas.
+
+INSTRUÇÕES DE USO:
+  python analytics_rollups.py                  # atualização incremental
+  python analytics_rollups.py --watch 60       # worker: atualiza a cada 60 s
+  python analytics_rollups.py --rebuild        # refaz tudo desde o primeiro id
+  python analytics_rollups.py --metrics 2026-01-01 2026-12-31 [--compare]
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
+
+from db_pool import get_pool
+from schema_migrations import migrate
+
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_VALUE_BITS = 64 - HLL_PRECISION
+HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+GRANULARITIES = ('hour', 'day')
+SOURCES = ('page_views', 'activity_logs')
+
+# Ids por transação na atualização (limita memória e duração dos locks)
+ROLLUP_CHUNK_IDS = 100000
+
+# Janela abaixo da marca d'água em que ids ausentes (INSERTs ainda em
+# andamento) são conferidos de novo a cada rodada
+ROLLUP_OVERLAP_IDS = 50000
+
+# Chave do advisory lock: uma atualização por vez (sector_benchmarks usa 4711001)
+ADVISORY_LOCK_KEY = 4711003
+
+TOP_LIMIT = 10
+
+
+def hll_empty():
+    return np.zeros(HLL_REGISTERS, dtype=np.uint8)
+
+
+def hll_from_bytes(data):
+    return np.frombuffer(bytes(data), dtype=np.uint8).copy()
+
+
+def hll_estimate(registers):
+    """Cardinalidade estimada (com a correção de contagem linear para poucos itens)"""
+    zeros = int(np.count_nonzero(registers == 0))
+    estimate = HLL_ALPHA * HLL_REGISTERS ** 2 / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+    if estimate <= 2.5 * HLL_REGISTERS and zeros:
+        estimate = HLL_REGISTERS * np.log(HLL_REGISTERS / zeros)
+    return int(round(estimate))
+
+
+def _sketches(cursor, table, column, selection, dimension=None):
+    """
+    {(hora[, dimensão]): registradores} das linhas de `selection` (_id_filter). O
+    registrador são os HLL_PRECISION bits altos do hash; o posto vem do menor
+    valor dos bits restantes (mais zeros à esquerda = posto maior).
+    """
+    dimension_sql = f", {dimension}" if dimension else ''
+    cursor.execute(f"""
+        SELECT date_trunc('hour', created_at){dimension_sql},
+               (hashtextextended({column}, 0) >> {HLL_VALUE_BITS}) & {HLL_REGISTERS - 1},
+               min(hashtextextended({column}, 0) & {(1 << HLL_VALUE_BITS) - 1})
+        FROM {table}
+        WHERE {selection[0]} AND {column} IS NOT NULL
+        GROUP BY 1, 2{', 3' if dimension else ''};
+    """, selection[1])
+    sketches = {}
+    for row in cursor.fetchall():
+        key, register, value = row[:-2], row[-2], row[-1]
+        registers = sketches.get(key)
+        if registers is None:
+            registers = sketches[key] = hll_empty()
+        registers[register] = HLL_VALUE_BITS + 1 - int(value).bit_length()
+    return sketches
+
+
+def _buckets(hour):
+    """Chaves (granularidade, bucket) que uma hora alimenta"""
+    return (('hour', hour), ('day', hour.replace(hour=0)))
+
+
+def _id_filter(low, high, ids=()):
+    """Filtro (SQL, parâmetros) das linhas com id em (low, high] ou em `ids`"""
+    return "(id > %s AND id <= %s OR id = ANY(%s))", (low, high, list(ids))
+
+
+def _rollup_page_views(cursor, selection):
+    cursor.execute(f"""
+        SELECT date_trunc('hour', created_at), count(*)
+        FROM page_views WHERE {selection[0]}
+        GROUP BY 1;
+    """, selection[1])
+    hours = cursor.fetchall()
+    sessions = _sketches(cursor, 'page_views', 'session_id', selection)
+    users = _sketches(cursor, 'page_views', 'user_id', selection)
+
+    rows = {}
+    for hour, views in hours:
+        for key in _buckets(hour):
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = [0, hll_empty(), hll_empty(), [0] * 24 if key[0] == 'day' else None]
+            row[0] += views
+            np.maximum(row[1], sessions.get((hour,), row[1]), out=row[1])
+            np.maximum(row[2], users.get((hour,), row[2]), out=row[2])
+            if row[3] is not None:
+                row[3][hour.hour] += views
+
+    cursor.execute("""
+        SELECT granularity, bucket, views, sessions_hll, users_hll, views_by_hour
+        FROM page_view_rollups
+        WHERE (granularity, bucket) IN (SELECT * FROM unnest(%s::text[], %s::timestamp[]));
+    """, ([key[0] for key in rows], [key[1] for key in rows]))
+    for granularity, bucket, views, sessions_hll, users_hll, views_by_hour in cursor.fetchall():
+        row = rows[(granularity, bucket)]
+        row[0] += views
+        np.maximum(row[1], hll_from_bytes(sessions_hll), out=row[1])
+        np.maximum(row[2], hll_from_bytes(users_hll), out=row[2])
+        if views_by_hour:
+            row[3] = [a + b for a, b in zip(row[3], views_by_hour)]
+
+    execute_values(cursor, """
+        INSERT INTO page_view_rollups (granularity, bucket, views, sessions_hll, users_hll, views_by_hour)
+        VALUES %s
+        ON CONFLICT (granularity, bucket) DO UPDATE SET
+            views = EXCLUDED.views, sessions_hll = EXCLUDED.sessions_hll,
+            users_hll = EXCLUDED.users_hll, views_by_hour = EXCLUDED.views_by_hour;
+    """, [(granularity, bucket, views, psycopg2.Binary(sessions_hll.tobytes()),
+           psycopg2.Binary(users_hll.tobytes()), by_hour)
+          for (granularity, bucket), (views, sessions_hll, users_hll, by_hour) in rows.items()])
+
+    for table, column, where in (('page_view_path_rollups', 'path', ''),
+                                 ('page_view_referrer_rollups', 'referrer',
+                                  "AND referrer IS NOT NULL AND referrer != ''")):
+        for granularity in GRANULARITIES:
+            cursor.execute(f"""
+                INSERT INTO {table} (granularity, bucket, {column}, views)
+                SELECT %s, date_trunc(%s, created_at), {column}, count(*)
+                FROM page_views
+                WHERE {selection[0]} {where}
+                GROUP BY 2, 3
+                ON CONFLICT (granularity, bucket, {column}) DO UPDATE
+                SET views = {table}.views + EXCLUDED.views;
+            """, (granularity, granularity, *selection[1]))
+    return sum(views for _, views in hours)
+
+
+def _rollup_activity(cursor, selection):
+    cursor.execute(f"""
+        SELECT date_trunc('hour', created_at), action_type, count(*)
+        FROM activity_logs WHERE {selection[0]}
+        GROUP BY 1, 2;
+    """, selection[1])
+    hours = cursor.fetchall()
+    users = _sketches(cursor, 'activity_logs', 'user_id', selection, dimension='action_type')
+
+    rows = {}
+    for hour, action_type, events in hours:
+        for granularity, bucket in _buckets(hour):
+            row = rows.get((granularity, bucket, action_type))
+            if row is None:
+                row = rows[(granularity, bucket, action_type)] = [0, hll_empty()]
+            row[0] += events
+            np.maximum(row[1], users.get((hour, action_type), row[1]), out=row[1])
+
+    cursor.execute("""
+        SELECT granularity, bucket, action_type, events, users_hll
+        FROM activity_rollups
+        WHERE (granularity, bucket, action_type) IN
+              (SELECT * FROM unnest(%s::text[], %s::timestamp[], %s::text[]));
+    """, tuple(list(column) for column in zip(*rows)) if rows else ([], [], []))
+    for granularity, bucket, action_type, events, users_hll in cursor.fetchall():
+        row = rows[(granularity, bucket, action_type)]
+        row[0] += events
+        np.maximum(row[1], hll_from_bytes(users_hll), out=row[1])
+
+    execute_values(cursor, """
+        INSERT INTO activity_rollups (granularity, bucket, action_type, events, users_hll)
+        VALUES %s
+        ON CONFLICT (granularity, bucket, action_type) DO UPDATE SET
+            events = EXCLUDED.events, users_hll = EXCLUDED.users_hll;
+    """, [(granularity, bucket, action_type, events, psycopg2.Binary(users_hll.tobytes()))
+          for (granularity, bucket, action_type), (events, users_hll) in rows.items()])
+    return sum(events for _, _, events in hours)
+
+
+ROLLUPS = {'page_views': _rollup_page_views, 'activity_logs': _rollup_activity}
+
+
+def _high_water(cursor, table):
+    """Maior id visível agora (sem lock: ids menores ainda podem aparecer, ver _missing_ids)"""
+    cursor.execute(f"SELECT coalesce(max(id), 0) FROM {table};")
+    return cursor.fetchone()[0]
+
+
+def _missing_ids(cursor, table, low, high, pending):
+    """
+    Ids da janela de ROLLUP_OVERLAP_IDS abaixo de `high` que ainda não
+    apareceram: os pendentes de antes e as lacunas de (low, high]
+    """
+    floor = high - ROLLUP_OVERLAP_IDS
+    cursor.execute(f"""
+        SELECT array_agg(candidate ORDER BY candidate) FROM (
+            SELECT unnest(%s::bigint[]) AS candidate
+            UNION ALL
+            SELECT generate_series(greatest(%s, %s) + 1, %s)
+        ) candidates
+        WHERE candidate > %s
+          AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = candidate);
+    """, (list(pending), low, floor, high, floor))
+    return cursor.fetchone()[0] or []
+
+
+def refresh(conn, rebuild=False, chunk_ids=ROLLUP_CHUNK_IDS):
+    """Processa as linhas novas de cada tabela; devolve {tabela: (linhas, marca d'água)}"""
+    cursor = conn.cursor()
+    conn.commit()
+    # Lock de sessão: cada bloco é uma transação
+    cursor.execute("SELECT pg_advisory_lock(%s);", (ADVISORY_LOCK_KEY,))
+    try:
+        if rebuild:
+            cursor.execute("""
+                TRUNCATE page_view_rollups, page_view_path_rollups, page_view_referrer_rollups,
+                         activity_rollups, analytics_rollup_state;
+            """)
+            conn.commit()
+
+        stats = {}
+        for source in SOURCES:
+            cursor.execute("SELECT last_id, pending_ids FROM analytics_rollup_state WHERE source = %s;", (source,))
+            low, pending = cursor.fetchone() or (0, [])
+            high = _high_water(cursor, source)
+            conn.commit()
+
+            # Pendentes que apareceram entram no primeiro bloco (ou sozinhos, sem linhas novas)
+            processed = 0
+            while low < high or pending:
+                chunk_high = min(high, low + chunk_ids)
+                # Um snapshot para o bloco: o que não entra na soma fica nos pendentes
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                cursor.execute(f"SELECT array_agg(id) FROM {source} WHERE id = ANY(%s);", (list(pending),))
+                arrived = cursor.fetchone()[0] or []
+                processed += ROLLUPS[source](cursor, _id_filter(low, chunk_high, arrived))
+                pending = _missing_ids(cursor, source, low, chunk_high, set(pending) - set(arrived))
+                cursor.execute("""
+                    INSERT INTO analytics_rollup_state (source, last_id, pending_ids) VALUES (%s, %s, %s)
+                    ON CONFLICT (source) DO UPDATE SET last_id = EXCLUDED.last_id, pending_ids = EXCLUDED.pending_ids,
+                                                       updated_at = CURRENT_TIMESTAMP;
+                """, (source, chunk_high, pending))
+                conn.commit()
+                if low == chunk_high:
+                    break
+                low = chunk_high
+            stats[source] = (processed, low)
+        return stats
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s);", (ADVISORY_LOCK_KEY,))
+        conn.commit()
+        cursor.close()
+
+
+def _range_filter(date_from, date_to):
+    """
+    WHERE das tabelas de agregados para [date_from, date_to], arredondado para
+    horas inteiras: dias completos vêm das linhas diárias, as pontas das horárias.
+    """
+    start = date_from.replace(minute=0, second=0, microsecond=0)
+    end = date_to.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    first_day = start if start.hour == 0 else start.replace(hour=0) + timedelta(days=1)
+    last_day = end.replace(hour=0)
+    if first_day >= last_day:
+        return "granularity = 'hour' AND bucket >= %s AND bucket < %s", (start, end)
+    return ("""((granularity = 'day' AND bucket >= %s AND bucket < %s)
+                OR (granularity = 'hour' AND ((bucket >= %s AND bucket < %s) OR (bucket >= %s AND bucket < %s))))""",
+            (first_day, last_day, start, first_day, last_day, end))
+
+
+def _top(cursor, table, column, where, params):
+    cursor.execute(f"""
+        SELECT {column}, sum(views)::bigint FROM {table}
+        WHERE {where}
+        GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT {TOP_LIMIT};
+    """, params)
+    return cursor.fetchall()
+
+
+def access_metrics(cursor, date_from, date_to):
+    """Mesmo formato de getAccessMetrics, calculado a partir dos agregados"""
+    where, params = _range_filter(date_from, date_to)
+    cursor.execute(f"""
+        SELECT granularity, bucket, views, sessions_hll, users_hll, views_by_hour
+        FROM page_view_rollups WHERE {where};
+    """, params)
+    total_views = 0
+    sessions, users = hll_empty(), hll_empty()
+    by_day = defaultdict(int)
+    by_hour = [0] * 24
+    for granularity, bucket, views, sessions_hll, users_hll, views_by_hour in cursor.fetchall():
+        total_views += views
+        np.maximum(sessions, hll_from_bytes(sessions_hll), out=sessions)
+        np.maximum(users, hll_from_bytes(users_hll), out=users)
+        by_day[bucket.date()] += views
+        if views_by_hour:
+            by_hour = [a + b for a, b in zip(by_hour, views_by_hour)]
+        else:
+            by_hour[bucket.hour] += views
+
+    top_pages = _top(cursor, 'page_view_path_rollups', 'path', where, params)
+    top_referrers = _top(cursor, 'page_view_referrer_rollups', 'referrer', where, params)
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    cursor.execute("""
+        SELECT coalesce(sum(views), 0)::bigint FROM page_view_rollups
+        WHERE granularity = 'hour' AND bucket >= %s;
+    """, (now.replace(hour=0, minute=0, second=0, microsecond=0),))
+    today_views = cursor.fetchone()[0]
+    # Últimos 5 minutos: poucas linhas pelo índice de created_at, lidas direto
+    cursor.execute("SELECT count(DISTINCT session_id) FROM page_views WHERE created_at >= %s;",
+                   (now - timedelta(minutes=5),))
+    active_now = cursor.fetchone()[0]
+    cursor.execute("SELECT max(updated_at) FROM analytics_rollup_state WHERE source = 'page_views';")
+    updated_at = cursor.fetchone()[0]
+
+    unique_sessions = hll_estimate(sessions)
+    return {
+        'summary': {
+            'totalViews': total_views,
+            'uniqueSessions': unique_sessions,
+            'uniqueUsers': hll_estimate(users),
+            'todayViews': today_views,
+            'activeNow': active_now,
+            'avgPagesPerSession': round(total_views / unique_sessions, 1) if unique_sessions else 0,
+        },
+        'viewsByDay': [{'date': day.isoformat(), 'count': count} for day, count in sorted(by_day.items())],
+        'topPages': [{'path': path, 'count': count} for path, count in top_pages],
+        'topReferrers': [{'referrer': referrer, 'count': count} for referrer, count in top_referrers],
+        'viewsByHour': [{'hour': hour, 'count': count} for hour, count in enumerate(by_hour) if count],
+        'rollupUpdatedAt': updated_at.isoformat() if updated_at else None,
+    }
+
+
+def event_metrics(cursor, date_from, date_to):
+    """Mesmo formato de getEventMetrics, com usuários únicos por tipo"""
+    where, params = _range_filter(date_from, date_to)
+    cursor.execute(f"SELECT action_type, events, users_hll FROM activity_rollups WHERE {where};", params)
+    events = defaultdict(int)
+    users = {}
+    for action_type, count, users_hll in cursor.fetchall():
+        events[action_type] += count
+        registers = users.setdefault(action_type, hll_empty())
+        np.maximum(registers, hll_from_bytes(users_hll), out=registers)
+    return {
+        'byType': [{'actionType': action_type, 'count': count, 'uniqueUsers': hll_estimate(users[action_type])}
+                   for action_type, count in sorted(events.items(), key=lambda item: (-item[1], item[0]))],
+    }
+
+
+def _raw_summary(cursor, date_from, date_to):
+    """Totais direto de page_views, como o painel faz hoje (--compare)"""
+    cursor.execute("""
+        SELECT count(*), count(DISTINCT session_id), count(DISTINCT user_id)
+        FROM page_views WHERE created_at >= %s AND created_at < %s;
+    """, (date_from.replace(minute=0, second=0, microsecond=0),
+          date_to.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)))
+    return cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agregados de métricas de acesso e eventos')
+    parser.add_argument('--rebuild', action='store_true', help='Apaga os agregados e reprocessa desde o início')
+    parser.add_argument('--watch', type=float, metavar='SEGUNDOS', help='Atualiza continuamente neste intervalo')
+    parser.add_argument('--metrics', nargs=2, metavar=('DE', 'ATE'),
+                        help='Mostra as métricas do período (AAAA-MM-DD ou ISO 8601, UTC)')
+    parser.add_argument('--compare', action='store_true', help='Com --metrics, compara com as consultas em page_views')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("📊 GREENA - Agregados de Acesso e Eventos")
+    print("="*60)
+
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            migrate(conn)
+            if args.metrics:
+                date_from = datetime.fromisoformat(args.metrics[0])
+                date_to = datetime.fromisoformat(args.metrics[1])
+                if len(args.metrics[1]) == 10:
+                    date_to = date_to.replace(hour=23, minute=59, second=59)
+                with conn.cursor() as cursor:
+                    started = time.perf_counter()
+                    access = access_metrics(cursor, date_from, date_to)
+                    events = event_metrics(cursor, date_from, date_to)
+                    elapsed = time.perf_counter() - started
+                    summary = access['summary']
+                    print(f"\n👁️  {summary['totalViews']} views, ~{summary['uniqueSessions']} sessões, "
+                          f"~{summary['uniqueUsers']} usuários, {summary['avgPagesPerSession']} páginas/sessão, "
+                          f"{summary['todayViews']} hoje, {summary['activeNow']} ativos agora")
+                    print(f"📅 {len(access['viewsByDay'])} dias; top páginas: "
+                          + ', '.join(f"{p['path']} ({p['count']})" for p in access['topPages'][:5]))
+                    print("🎯 Eventos: " + ', '.join(f"{e['actionType']} {e['count']} (~{e['uniqueUsers']} usuários)"
+                                                     for e in events['byType']))
+                    print(f"⏱️  {elapsed * 1000:.1f} ms a partir dos agregados "
+                          f"(atualizados em {access['rollupUpdatedAt']})")
+                    if args.compare:
+                        started = time.perf_counter()
+                        views, raw_sessions, raw_users = _raw_summary(cursor, date_from, date_to)
+                        elapsed = time.perf_counter() - started
+                        print(f"🔍 page_views direto: {views} views, {raw_sessions} sessões, {raw_users} usuários "
+                              f"({elapsed * 1000:.1f} ms)")
+                conn.commit()
+                return
+
+            while True:
+                started = time.perf_counter()
+                stats = refresh(conn, rebuild=args.rebuild)
+                print(f"✅ Agregados atualizados em {(time.perf_counter() - started) * 1000:.1f} ms: "
+                      + ', '.join(f"{source} +{rows} linhas (até id {last_id})"
+                                  for source, (rows, last_id) in stats.items()))
+                if not args.watch:
+                    break
+                args.rebuild = False
+                time.sleep(args.watch)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrompido")
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Auditoria do catálogo, das respostas e dos diagnósticos
+Motor por trás do verify_data do seed_database.py, feito para rodar também
+sobre responses e diagnoses em escala:
+
+- cada verificação é uma única consulta (uma ida ao banco), não uma por tabela
+- contagens e quebras por framework/pilar/tema/critério saem de uma passada
+  com GROUPING SETS
+- resultados grandes chegam por cursor do servidor (named cursor), em lotes
+  de AUDIT_FETCH_SIZE linhas; das listas de problemas só ficam a contagem e
+  até AUDIT_SAMPLES exemplos
+
+Verificações:
+  catalogue   totais e quebras do catálogo, nós vazios (pilar sem tema...)
+  orphans     linhas apontando para pai inexistente e diagnósticos concluídos
+              sem respostas/pontuação (tabelas shadow não têm FK)
+  duplicates  chaves naturais repetidas (código do pilar, nome do tema no
+              pilar, questão no critério, resposta por diagnóstico/questão...)
+  responses   respostas por framework, status e pilar (N/A e média)
+
+INSTRUÇÕES DE USO:
+1. Configure DATABASE_URL no .env (ver db_pool.py)
+2. Execute: python audit_data.py   (sai com código 1 se houver órfãos ou duplicados)
+
+EXEMPLOS:
+  python audit_data.py --checks catalogue orphans
+  python audit_data.py --suffix _shadow --checks catalogue orphans duplicates
+"""
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from db_pool import get_pool
+
+AUDIT_FETCH_SIZE = 2000
+AUDIT_SAMPLES = 5
+
+CatalogueCounts = namedtuple('CatalogueCounts', 'pillars themes criteria items')
+Finding = namedtuple('Finding', 'check count samples')
+
+# GROUPING(framework, pilar, tema, critério) → nível da linha
+CATALOGUE_LEVELS = {15: 'total', 7: 'framework', 3: 'pillar', 1: 'theme', 0: 'criteria'}
+RESPONSE_LEVELS = {7: 'total', 3: 'framework', 1: 'status', 6: 'pillar'}
+
+# (escopo, verificação, tabelas necessárias, consulta que devolve a chave de cada linha problemática);
+# escopo 'catalogue' é o que o verify_data do seed roda, 'data' inclui respostas e diagnósticos
+ORPHAN_CHECKS = [
+    ('catalogue', 'themes sem pilar', ('themes{s}', 'pillars{s}'), """
+        SELECT t.id::text FROM themes{s} t
+        WHERE NOT EXISTS (SELECT 1 FROM pillars{s} p WHERE p.id = t.pillar_id)"""),
+    ('catalogue', 'criteria sem tema', ('criteria{s}', 'themes{s}'), """
+        SELECT c.id::text FROM criteria{s} c
+        WHERE NOT EXISTS (SELECT 1 FROM themes{s} t WHERE t.id = c.theme_id)"""),
+    ('catalogue', 'assessment_items sem critério', ('assessment_items{s}', 'criteria{s}'), """
+        SELECT ai.id::text FROM assessment_items{s} ai
+        WHERE NOT EXISTS (SELECT 1 FROM criteria{s} c WHERE c.id = ai.criteria_id)"""),
+    ('catalogue', 'framework_mappings sem questão', ('framework_mappings', 'assessment_items{s}'), """
+        SELECT m.id::text FROM framework_mappings m
+        WHERE NOT EXISTS (SELECT 1 FROM assessment_items{s} ai WHERE ai.id = m.esg_assessment_item_id)
+           OR NOT EXISTS (SELECT 1 FROM assessment_items{s} ai WHERE ai.id = m.gri_assessment_item_id)"""),
+    ('data', 'responses sem diagnóstico', ('responses', 'diagnoses'), """
+        SELECT r.id::text FROM responses r
+        WHERE NOT EXISTS (SELECT 1 FROM diagnoses d WHERE d.id = r.diagnosis_id)"""),
+    ('data', 'responses sem questão', ('responses', 'assessment_items{s}'), """
+        SELECT r.id::text FROM responses r
+        WHERE NOT EXISTS (SELECT 1 FROM assessment_items{s} ai WHERE ai.id = r.assessment_item_id)"""),
+    ('data', 'diagnosis_scores sem pilar', ('diagnosis_scores', 'pillars{s}'), """
+        SELECT s.id::text FROM diagnosis_scores s
+        WHERE NOT EXISTS (SELECT 1 FROM pillars{s} p WHERE p.id = s.pillar_id)"""),
+    ('data', 'diagnósticos concluídos sem respostas', ('diagnoses', 'responses'), """
+        SELECT d.id FROM diagnoses d
+        WHERE d.status = 'completed' AND NOT EXISTS (SELECT 1 FROM responses r WHERE r.diagnosis_id = d.id)"""),
+    ('data', 'diagnósticos concluídos sem pontuação', ('diagnoses', 'diagnosis_scores'), """
+        SELECT d.id FROM diagnoses d
+        WHERE d.status = 'completed' AND NOT EXISTS (SELECT 1 FROM diagnosis_scores s WHERE s.diagnosis_id = d.id)"""),
+]
+
+# (escopo, verificação, tabela, colunas da chave natural)
+DUPLICATE_CHECKS = [
+    ('catalogue', 'pillars (framework, code)', 'pillars{s}', ('framework', 'code')),
+    ('catalogue', 'themes (pillar_id, name)', 'themes{s}', ('pillar_id', 'name')),
+    ('catalogue', 'criteria (theme_id, name)', 'criteria{s}', ('theme_id', 'name')),
+    ('catalogue', 'assessment_items (criteria_id, question)', 'assessment_items{s}', ('criteria_id', 'question')),
+    ('catalogue', 'framework_mappings (esg, gri)', 'framework_mappings', ('esg_assessment_item_id', 'gri_assessment_item_id')),
+    ('data', 'responses (diagnosis_id, assessment_item_id)', 'responses', ('diagnosis_id', 'assessment_item_id')),
+    ('data', 'diagnosis_scores (diagnosis_id, pillar_id)', 'diagnosis_scores', ('diagnosis_id', 'pillar_id')),
+]
+
+
+def stream(conn, query, params=None, name='audit', fetch_size=AUDIT_FETCH_SIZE):
+    """Linhas de `query` por um cursor do servidor, buscadas em lotes de `fetch_size`"""
+    with conn.cursor(name=name) as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(query, params)
+        yield from cursor
+
+
+def existing_tables(conn, tables):
+    """Quais das tabelas existem (uma consulta para todas)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM unnest(%s::text[]) name WHERE to_regclass(name) IS NOT NULL;",
+                   (list(tables),))
+    found = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return found
+
+
+def audit_catalogue(conn, table_suffix='', fetch_size=AUDIT_FETCH_SIZE, samples=AUDIT_SAMPLES):
+    """
+    Totais, quebras por framework/pilar/tema e nós vazios em uma passada
+    (GROUPING SETS). As linhas de critério só alimentam contagem e exemplos
+    de critérios sem questões.
+    """
+    s = table_suffix
+    # Correspondências entre frameworks (só há a tabela live): InitPlan, calculado uma vez
+    mappings = ("(SELECT COUNT(*) FROM framework_mappings)" if existing_tables(conn, ('framework_mappings',))
+                else 'NULL::bigint')
+    query = f"""
+        SELECT GROUPING(p.framework, p.id, t.id, c.id),
+               p.framework, p.id, min(p.code), min(p.name), t.id, min(t.name), c.id, min(c.name),
+               COUNT(DISTINCT p.id), COUNT(DISTINCT t.id), COUNT(DISTINCT c.id), COUNT(ai.id),
+               {mappings}
+        FROM pillars{s} p
+        LEFT JOIN themes{s} t ON p.id = t.pillar_id
+        LEFT JOIN criteria{s} c ON t.id = c.theme_id
+        LEFT JOIN assessment_items{s} ai ON c.id = ai.criteria_id
+        GROUP BY GROUPING SETS ((), (p.framework), (p.framework, p.id), (p.framework, p.id, t.id),
+                                (p.framework, p.id, t.id, c.id))
+        ORDER BY 1 DESC, 2, 4, 6, 8;
+    """
+    result = {'totals': CatalogueCounts(0, 0, 0, 0), 'frameworks': {}, 'pillars': [], 'themes': [],
+              'empty': {}, 'mappings': None}
+    empty = {level: [0, []] for level in ('pillar', 'theme', 'criteria')}
+    for row in stream(conn, query, name='audit_catalogue', fetch_size=fetch_size):
+        level = CATALOGUE_LEVELS[row[0]]
+        framework, pillar_id, code, name, theme_id, theme_name, criteria_id, criteria_name = row[1:9]
+        counts = CatalogueCounts(*row[9:13])
+        result['mappings'] = row[13]
+        if level == 'total':
+            result['totals'] = counts
+        elif level == 'framework':
+            result['frameworks'][framework] = counts
+        elif level == 'pillar':
+            result['pillars'].append((framework, pillar_id, code, name, counts))
+        elif level == 'theme' and theme_id is not None:
+            result['themes'].append((pillar_id, theme_id, theme_name, counts))
+        # Nó vazio: o filho do LEFT JOIN é nulo (ele mesmo aparece no nível de cima)
+        if level == 'pillar' and counts.themes == 0:
+            node = f"{code} ({name})"
+        elif level == 'theme' and theme_id is not None and counts.criteria == 0:
+            node = f"{code} › {theme_name}"
+        elif level == 'criteria' and criteria_id is not None and counts.items == 0:
+            node = f"{code} › {theme_name} › {criteria_name}"
+        else:
+            continue
+        empty[level][0] += 1
+        if len(empty[level][1]) < samples:
+            empty[level][1].append(node)
+    conn.commit()
+    result['empty'] = {level: Finding(level, count, nodes) for level, (count, nodes) in empty.items() if count}
+    return result
+
+
+def _findings(conn, name, branches, fetch_size, samples):
+    """Executa os ramos (verificação, chave, linhas) em um UNION ALL e agrupa por verificação"""
+    findings = {}
+    if branches:
+        query = '\nUNION ALL\n'.join(branches) + ';'
+        for check, key, rows in stream(conn, query, name=name, fetch_size=fetch_size):
+            finding = findings.setdefault(check, [0, []])
+            finding[0] += rows
+            if len(finding[1]) < samples:
+                finding[1].append(key if rows == 1 else f"{key} ×{rows}")
+        conn.commit()
+    return [Finding(check, count, keys) for check, (count, keys) in findings.items()]
+
+
+def audit_orphans(conn, table_suffix='', scopes=('catalogue', 'data'), fetch_size=AUDIT_FETCH_SIZE,
+                  samples=AUDIT_SAMPLES):
+    """Linhas sem pai (anti-joins) de todas as tabelas em uma consulta"""
+    checks = [(check, [table.format(s=table_suffix) for table in tables], query.format(s=table_suffix))
+              for scope, check, tables, query in ORPHAN_CHECKS if scope in scopes]
+    available = existing_tables(conn, {table for _, tables, _ in checks for table in tables})
+    branches = [f"SELECT '{check}', key, 1 FROM ({query}) AS orphan(key)"
+                for check, tables, query in checks if available.issuperset(tables)]
+    return _findings(conn, 'audit_orphans', branches, fetch_size, samples)
+
+
+def audit_duplicates(conn, table_suffix='', scopes=('catalogue', 'data'), fetch_size=AUDIT_FETCH_SIZE,
+                     samples=AUDIT_SAMPLES):
+    """Chaves naturais repetidas de todas as tabelas em uma consulta"""
+    checks = [(check, table.format(s=table_suffix), ', '.join(columns))
+              for scope, check, table, columns in DUPLICATE_CHECKS if scope in scopes]
+    available = existing_tables(conn, {table for _, table, _ in checks})
+    branches = [f"""
+            SELECT '{check}', concat_ws(' / ', {key}), COUNT(*)::int FROM {table}
+            GROUP BY {key} HAVING COUNT(*) > 1"""
+                for check, table, key in checks if table in available]
+    return _findings(conn, 'audit_duplicates', branches, fetch_size, samples)
+
+
+def audit_responses(conn, table_suffix='', fetch_size=AUDIT_FETCH_SIZE):
+    """
+    Respostas por framework, status do diagnóstico e pilar em uma passada:
+    (nível, framework, status, pilar, respostas, diagnósticos, N/A, média das válidas).
+    None se as tabelas do Prisma ainda não existem.
+    """
+    s = table_suffix
+    if existing_tables(conn, ('responses', 'diagnoses')) != {'responses', 'diagnoses'}:
+        return None
+    query = f"""
+        SELECT GROUPING(d.framework, d.status, p.id), d.framework, d.status, min(p.code),
+               COUNT(*), COUNT(DISTINCT r.diagnosis_id),
+               COUNT(*) FILTER (WHERE r.evaluation_value = 0),
+               round(avg(r.evaluation_value) FILTER (WHERE r.evaluation_value > 0), 2)
+        FROM responses r
+        JOIN diagnoses d ON d.id = r.diagnosis_id
+        LEFT JOIN assessment_items{s} ai ON ai.id = r.assessment_item_id
+        LEFT JOIN criteria{s} c ON c.id = ai.criteria_id
+        LEFT JOIN themes{s} t ON t.id = c.theme_id
+        LEFT JOIN pillars{s} p ON p.id = t.pillar_id
+        GROUP BY GROUPING SETS ((), (d.framework), (d.framework, d.status), (p.id))
+        ORDER BY GROUPING(d.framework, d.status, p.id) = 6, 2 NULLS FIRST, 3 NULLS FIRST, 4;
+    """
+    rows = [(RESPONSE_LEVELS[row[0]], *row[1:])
+            for row in stream(conn, query, name='audit_responses', fetch_size=fetch_size)]
+    conn.commit()
+    return rows
+
+
+def print_findings(title, findings):
+    if not findings:
+        print(f"✅ {title}: nenhum")
+        return
+    for finding in findings:
+        print(f"⚠️  {title} — {finding.check}: {finding.count} (ex.: {', '.join(map(str, finding.samples))})")
+
+
+def print_catalogue(audit):
+    totals = audit['totals']
+    print(f"✅ Pilares: {totals.pillars}")
+    print(f"✅ Temas: {totals.themes}")
+    print(f"✅ Critérios: {totals.criteria}")
+    print(f"✅ Questões: {totals.items}")
+    print("\nBreakdown por Pilar:")
+    for _, _, code, name, counts in sorted(audit['pillars'], key=lambda pillar: pillar[2]):
+        print(f"  - {code} ({name}): {counts.items} questões")
+    labels = {'pillar': 'Pilares sem temas', 'theme': 'Temas sem critérios', 'criteria': 'Critérios sem questões'}
+    for level, finding in audit['empty'].items():
+        print(f"⚠️  {labels[level]}: {finding.count} (ex.: {'; '.join(finding.samples)})")
+
+
+def print_responses(rows):
+    if rows is None:
+        print("⚠️  Respostas: tabelas responses/diagnoses ainda não existem")
+        return
+    for level, framework, status, code, responses, diagnoses, not_applicable, average in rows:
+        label = {'total': 'Total', 'framework': framework, 'status': f"{framework} / {status}",
+                 'pillar': f"pilar {code or '(questão fora do catálogo)'}"}[level]
+        indent = '  ' if level != 'total' else ''
+        print(f"{indent}- {label}: {responses} respostas, {diagnoses} diagnósticos, "
+              f"{not_applicable} N/A, média {average if average is not None else '-'}")
+
+
+CHECKS = ('catalogue', 'orphans', 'duplicates', 'responses')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auditoria do catálogo, respostas e diagnósticos')
+    parser.add_argument('--checks', nargs='+', choices=CHECKS, default=list(CHECKS))
+    parser.add_argument('--suffix', default='', help="Sufixo das tabelas do catálogo (ex.: _shadow)")
+    parser.add_argument('--fetch-size', type=int, default=AUDIT_FETCH_SIZE, help='Linhas por lote do cursor')
+    parser.add_argument('--samples', type=int, default=AUDIT_SAMPLES, help='Exemplos por problema')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🔎 GREENA - Auditoria de Dados")
+    print("="*60)
+
+    problems = 0
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            for check in args.checks:
+                print(f"\n[{check}]")
+                started = time.perf_counter()
+                if check == 'catalogue':
+                    print_catalogue(audit_catalogue(conn, args.suffix, args.fetch_size, args.samples))
+                elif check == 'orphans':
+                    findings = audit_orphans(conn, args.suffix, fetch_size=args.fetch_size, samples=args.samples)
+                    print_findings('Órfãos', findings)
+                    problems += len(findings)
+                elif check == 'duplicates':
+                    findings = audit_duplicates(conn, args.suffix, fetch_size=args.fetch_size, samples=args.samples)
+                    print_findings('Duplicados', findings)
+                    problems += len(findings)
+                else:
+                    print_responses(audit_responses(conn, args.suffix, args.fetch_size))
+                print(f"⏱️  {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        pool.closeall()
+
+    print("\n" + "="*60)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
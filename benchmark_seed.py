@@ -0,0 +1,288 @@
+"""
+Benchmark do seed e das consultas do catálogo
+Mede create_tables, seed_pillars/seed_questions (e os modos bulk/stream) e a
+verificação (verify_data e o join de breakdown) com catálogos sintéticos
+maiores que o atual (215 questões), em um PostgreSQL local descartável.
+
+INSTRUÇÕES DE USO:
+1. Tenha os binários do PostgreSQL (initdb, pg_ctl) no PATH ou informe --pg-bin
+2. Execute: python benchmark_seed.py
+3. Resultados em benchmark_results.json (p50/p95 por fase e round trips)
+
+EXEMPLOS:
+  python benchmark_seed.py --scales 10,100 --repeat 5
+  python benchmark_seed.py --modes bulk,stream --scales 1000
+  python benchmark_seed.py --dsn postgresql://postgres@localhost/bench   # banco já existente (será APAGADO)
+
+O initdb não roda como root: nesse caso use outro usuário ou --dsn.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import psycopg2
+
+from db_pool import get_pool
+import seed_database
+from seed_database import CountingCursor, SeedReport, PILLARS
+
+BASE_QUESTIONS = 'esg_questions_complete.json'
+DEFAULT_SCALES = (10, 100, 1000)
+DEFAULT_MODES = ('rows', 'bulk', 'stream')
+
+# Tabelas recriadas a cada execução (banco descartável)
+BENCHMARK_TABLES = (
+    'schema_migrations', 'framework_mappings', 'catalogue_hashes', 'assessment_items', 'criteria', 'themes', 'pillars',
+    'pillars_staging', 'themes_staging', 'criteria_staging', 'assessment_items_staging',
+)
+
+
+def percentile(samples, p):
+    """Percentil por posição mais próxima (mesmo critério do PoolMetrics)"""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ThrowawayPostgres:
+    """Cluster PostgreSQL temporário (initdb + pg_ctl), removido ao final"""
+
+    def __init__(self, pg_bin=None, keep=False):
+        initdb = shutil.which('initdb', path=pg_bin) if pg_bin else shutil.which('initdb')
+        if not initdb:
+            raise RuntimeError("initdb não encontrado: instale o PostgreSQL ou informe --pg-bin")
+        self.bin_dir = os.path.dirname(initdb)
+        self.keep = keep
+        self.root = tempfile.mkdtemp(prefix='greena-bench-')
+        self.data_dir = os.path.join(self.root, 'data')
+        self.port = _free_port()
+
+    def _run(self, tool, *args):
+        subprocess.run([os.path.join(self.bin_dir, tool), *args], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def start(self):
+        self._run('initdb', '-D', self.data_dir, '-U', 'postgres', '--auth=trust', '-E', 'UTF8')
+        self._run('pg_ctl', '-D', self.data_dir, '-w', '-l', os.path.join(self.root, 'postgres.log'),
+                  '-o', f"-p {self.port} -k {self.root} -c listen_addresses=''", 'start')
+        admin = psycopg2.connect(host=self.root, port=self.port, user='postgres', dbname='postgres')
+        admin.autocommit = True
+        with admin.cursor() as cursor:
+            cursor.execute("CREATE DATABASE greena_bench;")
+        admin.close()
+        return f'postgresql://postgres@/greena_bench?host={self.root}&port={self.port}'
+
+    def stop(self):
+        try:
+            self._run('pg_ctl', '-D', self.data_dir, '-m', 'fast', 'stop')
+        finally:
+            if not self.keep:
+                shutil.rmtree(self.root, ignore_errors=True)
+
+
+def write_synthetic_catalogue(base_path, scale, output_path):
+    """
+    Gera um catálogo `scale` vezes maior: cada tema é replicado com um sufixo
+    (#1, #2...), multiplicando temas, critérios e questões na mesma proporção.
+    """
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+
+    total = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        out.write('{')
+        for pillar_index, (pillar_code, pillar_data) in enumerate(base.items()):
+            fields = {key: value for key, value in pillar_data.items() if key != 'questions'}
+            out.write(('' if pillar_index == 0 else ',') + json.dumps(pillar_code) + ': {')
+            for key, value in fields.items():
+                out.write(f'{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}, ')
+            out.write('"questions": [')
+            first = True
+            for copy in range(1, scale + 1):
+                for question in pillar_data['questions']:
+                    question = dict(question, id=f"{question['id']}.{copy}")
+                    if scale > 1:
+                        question['theme'] = f"{question['theme']} #{copy}"
+                    out.write(('' if first else ',') + json.dumps(question, ensure_ascii=False))
+                    first = False
+                    total += 1
+            out.write(']}')
+        out.write('}')
+    return total
+
+
+def reset_schema(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS " + ', '.join(BENCHMARK_TABLES) + " CASCADE;")
+    conn.commit()
+
+
+def run_once(conn, mode, json_path, batch_size):
+    """Executa um seed completo e devolve as fases do SeedReport"""
+    report = SeedReport(mode)
+    frameworks = {'ESG': {'json': json_path, 'pillars': PILLARS}}
+    # Os prints do seed não interessam ao benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        reset_schema(conn)
+        with report.phase('create_tables'):
+            seed_database.create_tables(conn)
+        if mode == 'rows':
+            with report.phase('seed_pillars'):
+                seed_database.seed_pillars(conn)
+            with report.phase('seed_questions'):
+                seed_database.seed_questions(conn, json_path)
+        elif mode == 'bulk':
+            with report.phase('seed_catalogue_bulk'):
+                seed_database.seed_catalogue_bulk(conn, SeedReport(mode), frameworks, mappings=[])
+        elif mode == 'stream':
+            with report.phase('seed_catalogue_stream'):
+                seed_database.seed_catalogue_stream(conn, SeedReport(mode), frameworks, mappings=[],
+                                                    batch_size=batch_size)
+        with report.phase('verify_data'):
+            seed_database.verify_data(conn)
+        cursor = conn.cursor()
+        with report.phase('breakdown join'):
+            seed_database.framework_counts(cursor)
+        cursor.close()
+        conn.commit()
+    return report.phases
+
+
+def summarize(runs):
+    """Agrupa as execuções por fase: p50/p95/máx em ms e round trips"""
+    by_phase = {}
+    for phases in runs:
+        for phase in phases:
+            by_phase.setdefault(phase['phase'], []).append(phase)
+    summary = {}
+    for name, samples in by_phase.items():
+        seconds = [sample['seconds'] for sample in samples]
+        summary[name] = {
+            'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+            'p95_ms': round(percentile(seconds, 95) * 1000, 3),
+            'max_ms': round(max(seconds) * 1000, 3),
+            'round_trips': max(sample['round_trips'] for sample in samples),
+            'runs': len(samples),
+        }
+    return summary
+
+
+def run_benchmark(dsn, scales, modes, repeat, batch_size, workdir):
+    get_pool(dsn, cursor_factory=CountingCursor)
+    conn = seed_database.create_connection()
+    if not conn:
+        raise RuntimeError("Não foi possível conectar ao banco do benchmark")
+
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW server_version;")
+        server_version = cursor.fetchone()[0]
+    results = {
+        'environment': {
+            'postgres': server_version,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'repeat': repeat,
+        'scales': [],
+    }
+
+    try:
+        for scale in scales:
+            json_path = os.path.join(workdir, f'catalogue_{scale}x.json')
+            questions = write_synthetic_catalogue(BASE_QUESTIONS, scale, json_path)
+            size_mb = os.path.getsize(json_path) / (1024 * 1024)
+            print(f"\n📦 Catálogo {scale}×: {questions} questões ({size_mb:.1f} MB)")
+            scale_result = {'scale': scale, 'questions': questions, 'json_mb': round(size_mb, 2), 'modes': {}}
+            for mode in modes:
+                runs = []
+                for run in range(repeat):
+                    started = time.perf_counter()
+                    runs.append(run_once(conn, mode, json_path, batch_size))
+                    print(f"   {mode:<7} execução {run + 1}/{repeat}: {time.perf_counter() - started:.2f}s")
+                scale_result['modes'][mode] = summarize(runs)
+            results['scales'].append(scale_result)
+            os.remove(json_path)
+    finally:
+        seed_database.release_connection(conn)
+        get_pool().closeall()
+    return results
+
+
+def print_summary(results):
+    print("\n" + "="*78)
+    print("⏱️  BENCHMARK DO SEED (p50 / p95 em ms)")
+    print("="*78)
+    for scale_result in results['scales']:
+        print(f"\n{scale_result['scale']}× ({scale_result['questions']} questões)")
+        for mode, phases in scale_result['modes'].items():
+            for name, data in phases.items():
+                print(f"  - {mode:<7} {name:<24} {data['p50_ms']:>10.1f} {data['p95_ms']:>10.1f}"
+                      f"  {data['round_trips']:>8} round trips")
+    print("="*78)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do seed do catálogo ESG')
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help='Multiplicadores do catálogo de 215 questões (ex.: 10,100,1000)')
+    parser.add_argument('--modes', default=','.join(DEFAULT_MODES),
+                        help='Modos do seed medidos: rows, bulk, stream')
+    parser.add_argument('--repeat', type=int, default=3, help='Execuções por escala e modo')
+    parser.add_argument('--batch-size', type=int, default=seed_database.STREAM_BATCH_SIZE,
+                        help='Questões por lote no modo stream')
+    parser.add_argument('--output', default='benchmark_results.json', help='Arquivo JSON de resultados')
+    parser.add_argument('--dsn', help='Usa um banco existente em vez de um cluster temporário (as tabelas '
+                                      'do catálogo são APAGADAS)')
+    parser.add_argument('--pg-bin', help='Diretório com initdb/pg_ctl')
+    parser.add_argument('--keep', action='store_true', help='Mantém o diretório do cluster temporário')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    modes = [mode.strip() for mode in args.modes.split(',')]
+    unknown = set(modes) - set(DEFAULT_MODES)
+    if unknown:
+        parser.error(f"modos desconhecidos: {', '.join(sorted(unknown))}")
+
+    print("\n" + "="*60)
+    print("🏁 GREENA - Benchmark do Seed")
+    print("="*60)
+
+    server = None
+    dsn = args.dsn
+    if not dsn:
+        server = ThrowawayPostgres(args.pg_bin, keep=args.keep)
+        print(f"🐘 Iniciando PostgreSQL temporário em {server.root} (porta {server.port})...")
+        dsn = server.start()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix='greena-bench-json-') as workdir:
+            results = run_benchmark(dsn, scales, modes, args.repeat, args.batch_size, workdir)
+    finally:
+        if server:
+            server.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print_summary(results)
+    print(f"\n✅ Resultados salvos em {args.output}\n")
+
+
+if __name__ == "__main__":
+    main()
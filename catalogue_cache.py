@@ -0,0 +1,334 @@
+"""
+Cache do catálogo em memória (pilares → temas → critérios → questões)
+Uma cópia compacta e compartilhada pelo processo, montada a partir do banco já
+populado pelo seed, em vez de cada job reler as tabelas ou o JSON.
+
+Representação: arrays paralelos (array('i') para IDs e posições, listas para
+os textos, com sys.intern nos textos repetidos como framework e código GRI).
+As questões ficam em ordem de árvore, então as de um pilar formam um intervalo
+contíguo. Buscas em O(1):
+  item(id)             questão com critério, tema e pilar
+  item_path(id)        (criteria_id, theme_id, pillar_id)
+  pillar_items(id)     intervalo de posições das questões do pilar
+  pillar_item_ids(id)  IDs das questões do pilar (memoryview, sem cópia)
+  pillar(id)           código, nome e framework do pilar
+
+A cópia é invalidada pela versão do catálogo (tabela catalogue_version,
+incrementada pelo seed), consultada no máximo a cada VERSION_CHECK_INTERVAL
+segundos.
+
+INSTRUÇÕES DE USO:
+  from catalogue_cache import get_catalogue
+  catalogue = get_catalogue()
+  criteria_id, theme_id, pillar_id = catalogue.item_path(item_id)
+
+  python catalogue_cache.py    # carrega e mostra tamanho e tempos
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from db_pool import get_pool
+
+# Intervalo mínimo entre consultas da versão do catálogo (segundos)
+VERSION_CHECK_INTERVAL = 30
+
+CatalogueItem = namedtuple('CatalogueItem', 'id question order_index criteria_id theme_id pillar_id '
+                                            'pillar_code gri_code framework_tag')
+
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+
+def _id_index(ids):
+    """
+    id → posição. Com IDs densos, um array('i') (-1 = ausente): O(1) sem o
+    custo de um dict; com IDs esparsos (várias recargas do catálogo), um dict.
+    """
+    size = max(ids, default=-1) + 1
+    if size > 4 * len(ids) + 1024:
+        return {node_id: position for position, node_id in enumerate(ids)}
+    index = array('i', [-1]) * size
+    for position, node_id in enumerate(ids):
+        index[node_id] = position
+    return index
+
+
+def _position(index, node_id):
+    if isinstance(index, dict):
+        return index[node_id]
+    if 0 <= node_id < len(index) and index[node_id] >= 0:
+        return index[node_id]
+    raise KeyError(node_id)
+
+
+class Catalogue:
+    """Catálogo em arrays paralelos; os *_pillar/_theme/_criteria são posições, não IDs"""
+
+    __slots__ = (
+        'version',
+        'pillar_ids', 'pillar_codes', 'pillar_names', 'pillar_frameworks', 'pillar_item_start', 'pillar_item_end',
+        'theme_ids', 'theme_names', 'theme_pillar',
+        'criteria_ids', 'criteria_names', 'criteria_theme',
+        'item_ids', 'item_questions', 'item_order', 'item_criteria', 'item_gri_codes', 'item_framework_tags',
+        'item_data_fields',
+        '_pillar_index', '_item_index',
+    )
+
+    @classmethod
+    def load(cls, cursor, version=None):
+        self = cls()
+        self.version = version
+
+        cursor.execute("SELECT id, code, name, framework FROM pillars ORDER BY sort_order, id;")
+        rows = cursor.fetchall()
+        self.pillar_ids = array('i', (row[0] for row in rows))
+        self.pillar_codes = [_intern(row[1]) for row in rows]
+        self.pillar_names = [row[2] for row in rows]
+        self.pillar_frameworks = [_intern(row[3]) for row in rows]
+        cursor.execute("""
+            SELECT t.id, t.name, t.pillar_id
+            FROM themes t JOIN pillars p ON p.id = t.pillar_id
+            ORDER BY p.sort_order, p.id, t.order_index, t.id;
+        """)
+        rows = cursor.fetchall()
+        self.theme_ids = array('i', (row[0] for row in rows))
+        self.theme_names = [row[1] for row in rows]
+        pillar_index = _id_index(self.pillar_ids)
+        self.theme_pillar = array('i', (pillar_index[row[2]] for row in rows))
+
+        cursor.execute("""
+            SELECT c.id, c.name, c.theme_id
+            FROM criteria c
+            JOIN themes t ON t.id = c.theme_id
+            JOIN pillars p ON p.id = t.pillar_id
+            ORDER BY p.sort_order, p.id, t.order_index, t.id, c.order_index, c.id;
+        """)
+        rows = cursor.fetchall()
+        self.criteria_ids = array('i', (row[0] for row in rows))
+        self.criteria_names = [row[1] for row in rows]
+        theme_index = _id_index(self.theme_ids)
+        self.criteria_theme = array('i', (theme_index[row[2]] for row in rows))
+
+        # data_fields fica como texto JSON (decodificado sob demanda em data_fields())
+        cursor.execute("""
+            SELECT ai.id, ai.question, ai.order_index, ai.criteria_id, ai.gri_code, ai.framework_tag,
+                   ai.data_fields::text
+            FROM assessment_items ai
+            JOIN criteria c ON c.id = ai.criteria_id
+            JOIN themes t ON t.id = c.theme_id
+            JOIN pillars p ON p.id = t.pillar_id
+            ORDER BY p.sort_order, p.id, t.order_index, t.id, c.order_index, c.id, ai.order_index, ai.id;
+        """)
+        rows = cursor.fetchall()
+        self.item_ids = array('i', (row[0] for row in rows))
+        self.item_questions = [row[1] for row in rows]
+        self.item_order = array('i', (row[2] or 0 for row in rows))
+        criteria_index = _id_index(self.criteria_ids)
+        self.item_criteria = array('i', (criteria_index[row[3]] for row in rows))
+        self.item_gri_codes = [_intern(row[4]) for row in rows]
+        self.item_framework_tags = [_intern(row[5]) for row in rows]
+        self.item_data_fields = [row[6] for row in rows]
+        self.build_indexes()
+        return self
+
+    def build_indexes(self):
+        """Índices id → posição e intervalos de questões por pilar (arrays já preenchidos)"""
+        self._pillar_index = _id_index(self.pillar_ids)
+        self._item_index = _id_index(self.item_ids)
+
+        # Intervalo [início, fim) das questões de cada pilar (ordem de árvore)
+        self.pillar_item_start = array('i', [0]) * len(self.pillar_ids)
+        self.pillar_item_end = array('i', [0]) * len(self.pillar_ids)
+        previous = -1
+        for position in range(len(self.item_ids)):
+            pillar = self.theme_pillar[self.criteria_theme[self.item_criteria[position]]]
+            if pillar != previous:
+                self.pillar_item_start[pillar] = position
+                previous = pillar
+            self.pillar_item_end[pillar] = position + 1
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def __contains__(self, item_id):
+        try:
+            _position(self._item_index, item_id)
+        except KeyError:
+            return False
+        return True
+
+    def _item_positions(self, item_id):
+        position = _position(self._item_index, item_id)
+        criteria = self.item_criteria[position]
+        theme = self.criteria_theme[criteria]
+        return position, criteria, theme, self.theme_pillar[theme]
+
+    def item(self, item_id):
+        position, criteria, theme, pillar = self._item_positions(item_id)
+        return CatalogueItem(item_id, self.item_questions[position], self.item_order[position],
+                             self.criteria_ids[criteria], self.theme_ids[theme], self.pillar_ids[pillar],
+                             self.pillar_codes[pillar], self.item_gri_codes[position],
+                             self.item_framework_tags[position])
+
+    def item_path(self, item_id):
+        """(criteria_id, theme_id, pillar_id) da questão"""
+        _, criteria, theme, pillar = self._item_positions(item_id)
+        return self.criteria_ids[criteria], self.theme_ids[theme], self.pillar_ids[pillar]
+
+    def data_fields(self, item_id):
+        raw = self.item_data_fields[_position(self._item_index, item_id)]
+        return json.loads(raw) if raw else None
+
+    def pillar_items(self, pillar_id):
+        """Intervalo de posições (em item_ids) das questões do pilar"""
+        pillar = _position(self._pillar_index, pillar_id)
+        return range(self.pillar_item_start[pillar], self.pillar_item_end[pillar])
+
+    def pillar_item_ids(self, pillar_id):
+        positions = self.pillar_items(pillar_id)
+        return memoryview(self.item_ids)[positions.start:positions.stop]
+
+    def pillar(self, pillar_id):
+        """(id, código, nome, framework) do pilar"""
+        i = _position(self._pillar_index, pillar_id)
+        return pillar_id, self.pillar_codes[i], self.pillar_names[i], self.pillar_frameworks[i]
+
+    def pillars(self, framework=None):
+        """(id, código, nome, framework) na ordem de exibição"""
+        return [(self.pillar_ids[i], self.pillar_codes[i], self.pillar_names[i], self.pillar_frameworks[i])
+                for i in range(len(self.pillar_ids))
+                if framework is None or self.pillar_frameworks[i] == framework]
+
+    def memory_bytes(self):
+        """Tamanho aproximado da cópia (arrays, listas e textos distintos)"""
+        total = 0
+        seen = set()
+        for slot in self.__slots__:
+            value = getattr(self, slot, None)
+            total += sys.getsizeof(value)
+            if isinstance(value, list):
+                for text in value:
+                    if text is not None and id(text) not in seen:
+                        seen.add(id(text))
+                        total += sys.getsizeof(text)
+        return total
+
+
+def catalogue_version(cursor):
+    """Versão atual do catálogo (None se a tabela ainda não existe)"""
+    cursor.execute("SELECT to_regclass('catalogue_version') IS NOT NULL;")
+    if not cursor.fetchone()[0]:
+        return None
+    cursor.execute("SELECT version FROM catalogue_version;")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+_lock = threading.Lock()
+_cached = None
+_checked_at = 0.0
+
+
+def _refresh(conn):
+    global _cached
+    cursor = conn.cursor()
+    try:
+        version = catalogue_version(cursor)
+        # Sem versão no banco não há como saber se mudou: recarrega a cada verificação
+        if _cached is None or version is None or version != _cached.version:
+            _cached = Catalogue.load(cursor, version)
+        conn.commit()
+    finally:
+        cursor.close()
+    return _cached
+
+
+def get_catalogue(conn=None, max_age=VERSION_CHECK_INTERVAL):
+    """
+    Cópia compartilhada do catálogo. A versão no banco é conferida no máximo
+    a cada `max_age` segundos (0: sempre); sem `conn` usa o pool (db_pool).
+    """
+    global _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _cached is not None and now - _checked_at < max_age:
+            return _cached
+        if conn is not None:
+            catalogue = _refresh(conn)
+        else:
+            with get_pool().connection() as pooled:
+                catalogue = _refresh(pooled)
+        _checked_at = now
+        return catalogue
+
+
+def invalidate():
+    """Descarta a cópia: a próxima chamada de get_catalogue recarrega"""
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def _deep_size(value, seen=None):
+    """Tamanho aproximado de uma estrutura aninhada de dicts/listas (JSON carregado)"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, list):
+        size += sum(_deep_size(v, seen) for v in value)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache do catálogo em memória')
+    parser.add_argument('--json', default='esg_questions_complete.json',
+                        help='JSON comparado com a representação em arrays')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🗂️  GREENA - Cache do Catálogo")
+    print("="*60 + "\n")
+
+    started = time.perf_counter()
+    catalogue = get_catalogue()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for item_id in catalogue.item_ids:
+        catalogue.item_path(item_id)
+    lookup_seconds = time.perf_counter() - started
+
+    print(f"✅ Versão {catalogue.version}: {len(catalogue.pillar_ids)} pilares, {len(catalogue.theme_ids)} temas, "
+          f"{len(catalogue.criteria_ids)} critérios, {len(catalogue)} questões")
+    print(f"⏱️  Carga: {load_seconds * 1000:.1f} ms | item_path: "
+          f"{lookup_seconds / max(len(catalogue), 1) * 1e6:.2f} µs por questão")
+    print(f"📦 Memória: {catalogue.memory_bytes() / 1024:.1f} KB "
+          f"({catalogue.memory_bytes() / max(len(catalogue), 1):.0f} bytes por questão)")
+    for pillar_id, code, name, framework in catalogue.pillars():
+        print(f"  - {framework} {code} ({name}): {len(catalogue.pillar_items(pillar_id))} questões")
+
+    try:
+        with open(args.json, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        questions = sum(len(pillar.get('questions', [])) for pillar in data.values())
+        print(f"📄 {args.json} em dicts/listas: {_deep_size(data) / 1024:.1f} KB "
+              f"({_deep_size(data) / max(questions, 1):.0f} bytes por questão)")
+    except FileNotFoundError:
+        pass
+
+    get_pool().closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Busca textual no catálogo de questões (ESG e bancos GRI, em português)
+Substitui a varredura no cliente ou o ILIKE sem índice por um índice mantido
+pelo seed (tabela catalogue_search, migrações 8 e 9):
+
+- document: tsvector com a configuração portuguese sobre o texto sem acentos
+  (catalogue_unaccent), com pesos questão/código GRI (A), critério (B) e
+  tema (C); índice GIN
+- busca por palavras-chave: websearch_to_tsquery ("frase exata", OR, -termo),
+  ordenada por ts_rank, com os termos destacados na questão, no critério e
+  no tema
+- busca aproximada (erros de digitação): word_similarity do pg_trgm com
+  índices GIN de trigramas na questão, no critério e no tema; sem a extensão,
+  cai para busca por prefixo dos radicais ('residuo' acha 'resíduos')
+- refresh_search_index: sincroniza com o catálogo live regravando só as
+  questões que mudaram (o seed chama ao final de cada carga)
+
+Modos: keyword, fuzzy ou auto (palavras-chave; aproximada se nada casar).
+
+INSTRUÇÕES DE USO:
+1. Configure DATABASE_URL no .env (ver db_pool.py)
+2. Execute: python catalogue_search.py "gestão de resíduos"
+
+  from catalogue_search import search_catalogue
+  for result in search_catalogue(conn, 'emissoes de carbono', framework='GRI'):
+      print(result.rank, result.highlight)
+
+EXEMPLOS:
+  python catalogue_search.py "consumo de água" --framework ESG --limit 5
+  python catalogue_search.py "residuos solidos" --mode fuzzy
+  python catalogue_search.py --refresh                # após editar o catálogo fora do seed
+  python catalogue_search.py --benchmark 30000        # latência com 30 mil questões sintéticas (cópia TEMP)
+"""
+
+import argparse
+import re
+import statistics
+import sys
+import time
+import unicodedata
+from collections import namedtuple
+
+from db_pool import get_pool
+
+SEARCH_CONFIG = 'portuguese'
+SEARCH_LIMIT = 20
+HIGHLIGHT = ('<mark>', '</mark>')
+
+# Palavras da questão com similaridade de trigramas acima disso são destacadas na busca aproximada
+FUZZY_HIGHLIGHT_SIMILARITY = 0.4
+
+# Peso dos campos na busca aproximada (a questão conta inteira)
+FUZZY_WEIGHTS = {'question': 1.0, 'criteria': 0.8, 'theme': 0.6}
+
+_MARKERS = re.compile('(' + '|'.join(re.escape(marker) for marker in HIGHLIGHT) + ')')
+
+SearchResult = namedtuple('SearchResult', 'item_id framework pillar theme criteria question gri_code rank highlight')
+
+DOCUMENT_SQL = f"""
+    setweight(to_tsvector('{SEARCH_CONFIG}', catalogue_unaccent(question)), 'A')
+    || setweight(to_tsvector('simple', coalesce(gri_code, '')), 'A')
+    || setweight(to_tsvector('{SEARCH_CONFIG}', catalogue_unaccent(criteria)), 'B')
+    || setweight(to_tsvector('{SEARCH_CONFIG}', catalogue_unaccent(theme)), 'C')
+"""
+
+SEARCH_COLUMNS = ('framework', 'pillar_code', 'theme', 'criteria', 'question', 'gri_code')
+
+# Só as questões novas ou com texto alterado têm o tsvector recalculado
+REFRESH_SQL = f"""
+    WITH source AS (
+        SELECT ai.id AS item_id, p.framework, p.code AS pillar_code, t.name AS theme,
+               c.name AS criteria, ai.question, ai.gri_code
+        FROM assessment_items ai
+        JOIN criteria c ON c.id = ai.criteria_id
+        JOIN themes t ON t.id = c.theme_id
+        JOIN pillars p ON p.id = t.pillar_id
+    ), changed AS (
+        SELECT source.* FROM source
+        LEFT JOIN catalogue_search s ON s.item_id = source.item_id
+        WHERE s.item_id IS NULL
+           OR ({', '.join(f's.{column}' for column in SEARCH_COLUMNS)})
+              IS DISTINCT FROM ({', '.join(f'source.{column}' for column in SEARCH_COLUMNS)})
+    )
+    INSERT INTO catalogue_search (item_id, {', '.join(SEARCH_COLUMNS)}, document)
+    SELECT item_id, {', '.join(SEARCH_COLUMNS)}, {DOCUMENT_SQL} FROM changed
+    ON CONFLICT (item_id) DO UPDATE SET
+        {', '.join(f'{column} = EXCLUDED.{column}' for column in SEARCH_COLUMNS)},
+        document = EXCLUDED.document;
+"""
+
+# tsquery de cada modo a partir de %(q)s
+KEYWORD_QUERY = f"websearch_to_tsquery('{SEARCH_CONFIG}', catalogue_unaccent(%(q)s))"
+PREFIX_QUERY = f"""(
+    SELECT to_tsquery('simple', string_agg(quote_literal(lexeme) || ':*', ' & '))
+    FROM unnest(to_tsvector('{SEARCH_CONFIG}', catalogue_unaccent(%(q)s)))
+)"""
+
+TEXT_SEARCH_SQL = """
+    WITH q AS (SELECT {tsquery} AS query)
+    SELECT r.item_id, r.framework, r.pillar_code, r.theme, r.criteria, r.question, r.gri_code, r.rank,
+           ts_headline('{config}', catalogue_unaccent(r.question), q.query, %(options)s),
+           ts_headline('{config}', catalogue_unaccent(r.criteria), q.query, %(options)s),
+           ts_headline('{config}', catalogue_unaccent(r.theme), q.query, %(options)s)
+    FROM (
+        SELECT s.*, ts_rank(s.document, q.query, 1) AS rank
+        FROM catalogue_search s, q
+        WHERE s.document @@ q.query
+          AND (%(framework)s::text IS NULL OR s.framework = %(framework)s)
+        ORDER BY rank DESC, s.item_id
+        LIMIT %(limit)s
+    ) r, q
+    ORDER BY r.rank DESC, r.item_id;
+"""
+
+TRIGRAM_SEARCH_SQL = """
+    SELECT item_id, framework, pillar_code, theme, criteria, question, gri_code,
+           greatest({ranks}) AS rank
+    FROM catalogue_search
+    WHERE ({matches})
+      AND (%(framework)s::text IS NULL OR framework = %(framework)s)
+    ORDER BY rank DESC, item_id
+    LIMIT %(limit)s;
+""".format(
+    ranks=', '.join(f"{weight} * word_similarity(lower(catalogue_unaccent(%(q)s)), lower(catalogue_unaccent({column})))"
+                    for column, weight in FUZZY_WEIGHTS.items()),
+    matches=' OR '.join(f"lower(catalogue_unaccent(%(q)s)) <%% lower(catalogue_unaccent({column}))"
+                        for column in FUZZY_WEIGHTS),
+)
+
+
+def refresh_search_index(conn):
+    """
+    Sincroniza catalogue_search com o catálogo live: regrava as questões
+    novas ou alteradas e remove as que saíram. Devolve (gravadas, removidas).
+    """
+    cursor = conn.cursor()
+    cursor.execute(REFRESH_SQL)
+    upserted = cursor.rowcount
+    cursor.execute("""
+        DELETE FROM catalogue_search s
+        WHERE NOT EXISTS (SELECT 1 FROM assessment_items ai WHERE ai.id = s.item_id);
+    """)
+    removed = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return upserted, removed
+
+
+def has_trigram(cursor):
+    """True se o pg_trgm (migração 9) estiver instalado"""
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm');")
+    return cursor.fetchone()[0]
+
+
+def fold(text):
+    """Minúsculas sem acentos (equivalente em Python ao lower(catalogue_unaccent()))"""
+    return ''.join(char for char in unicodedata.normalize('NFKD', text.lower())
+                   if not unicodedata.combining(char))
+
+
+def _restore_accents(headline, original):
+    """
+    Passa os marcadores do ts_headline (calculado sobre o texto sem acentos)
+    para o texto original. catalogue_unaccent troca caractere por caractere;
+    se o tamanho não bater (ex.: 'æ' -> 'ae'), devolve o texto sem acentos.
+    """
+    start, stop = HIGHLIGHT
+    if len(headline.replace(start, '').replace(stop, '')) != len(original):
+        return headline
+    parts, position = [], 0
+    for segment in _MARKERS.split(headline):
+        if segment in HIGHLIGHT:
+            parts.append(segment)
+        else:
+            parts.append(original[position:position + len(segment)])
+            position += len(segment)
+    return ''.join(parts)
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def highlight_similar(text, query):
+    """Destaca as palavras de `text` parecidas (trigramas) com alguma palavra da busca"""
+    terms = [_trigrams(term) for term in re.findall(r'\w+', fold(query))]
+    start, stop = HIGHLIGHT
+
+    def mark(match):
+        grams = _trigrams(fold(match.group(0)))
+        for term in terms:
+            if len(grams & term) / len(grams | term) >= FUZZY_HIGHLIGHT_SIMILARITY:
+                return f"{start}{match.group(0)}{stop}"
+        return match.group(0)
+
+    return re.sub(r'\w+', mark, text)
+
+
+def _text_search(cursor, query, framework, limit, tsquery):
+    cursor.execute(TEXT_SEARCH_SQL.format(tsquery=tsquery, config=SEARCH_CONFIG), {
+        'q': query,
+        'framework': framework,
+        'limit': limit,
+        'options': f"StartSel={HIGHLIGHT[0]}, StopSel={HIGHLIGHT[1]}, HighlightAll=true",
+    })
+    results = []
+    for item_id, fw, pillar, theme, criteria, question, gri_code, rank, q_mark, c_mark, t_mark in cursor.fetchall():
+        highlight = {
+            'question': _restore_accents(q_mark, question),
+            'criteria': _restore_accents(c_mark, criteria),
+            'theme': _restore_accents(t_mark, theme),
+        }
+        results.append(SearchResult(item_id, fw, pillar, theme, criteria, question, gri_code, rank, highlight))
+    return results
+
+
+def _trigram_search(cursor, query, framework, limit):
+    cursor.execute(TRIGRAM_SEARCH_SQL, {'q': query, 'framework': framework, 'limit': limit})
+    return [
+        SearchResult(item_id, fw, pillar, theme, criteria, question, gri_code, rank, {
+            'question': highlight_similar(question, query),
+            'criteria': highlight_similar(criteria, query),
+            'theme': highlight_similar(theme, query),
+        })
+        for item_id, fw, pillar, theme, criteria, question, gri_code, rank in cursor.fetchall()
+    ]
+
+
+def _search(cursor, query, framework, limit, mode, trigram):
+    results = []
+    if mode in ('auto', 'keyword'):
+        results = _text_search(cursor, query, framework, limit, KEYWORD_QUERY)
+    if mode == 'fuzzy' or (mode == 'auto' and not results):
+        if trigram is None:
+            trigram = has_trigram(cursor)
+        if trigram:
+            results = _trigram_search(cursor, query, framework, limit)
+        else:
+            results = _text_search(cursor, query, framework, limit, PREFIX_QUERY)
+    return results
+
+
+def search_catalogue(conn, query, framework=None, limit=SEARCH_LIMIT, mode='auto', trigram=None):
+    """
+    Busca no catálogo. `mode`: keyword (palavras-chave), fuzzy (aproximada)
+    ou auto (keyword; fuzzy se nada casar). `trigram` força ou desliga o
+    pg_trgm (padrão: detecta). Devolve SearchResult ordenados por relevância,
+    com `highlight` = {'question', 'criteria', 'theme'} marcados com HIGHLIGHT.
+    """
+    if mode not in ('auto', 'keyword', 'fuzzy'):
+        raise ValueError(f"Modo de busca desconhecido: {mode}")
+    query = query.strip()
+    if not query:
+        return []
+
+    cursor = conn.cursor()
+    try:
+        results = _search(cursor, query, framework, limit, mode, trigram)
+        conn.commit()
+        return results
+    finally:
+        cursor.close()
+
+
+def print_results(results):
+    if not results:
+        print("  (nenhuma questão encontrada)")
+    for position, result in enumerate(results, 1):
+        code = f" [{result.gri_code}]" if result.gri_code else ''
+        print(f"  {position:>2}. ({result.rank:.3f}) {result.framework}/{result.pillar}{code} "
+              f"{result.highlight['question']}")
+        print(f"      {result.highlight['theme']} › {result.highlight['criteria']}")
+
+
+def benchmark(conn, rows, queries, repeat=20):
+    """
+    Mede a latência das buscas com `rows` questões sintéticas (palavras do
+    catálogo sorteadas). Tudo roda numa cópia TEMP de catalogue_search, que
+    na sessão esconde a tabela real (pg_temp vem antes no search_path):
+    nada é gravado nem deixa entradas mortas no índice real.
+    Devolve (questões, pg_trgm instalado, {(modo, busca): mediana em ms}).
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE catalogue_search (LIKE public.catalogue_search INCLUDING ALL) ON COMMIT DROP;
+        INSERT INTO catalogue_search SELECT * FROM public.catalogue_search;
+    """)
+    cursor.execute("SELECT COALESCE(MIN(item_id), 0) FROM catalogue_search;")
+    offset = min(cursor.fetchone()[0], 0) - 1
+    cursor.execute(f"""
+        WITH vocabulary AS (
+            SELECT array_agg(word) AS words FROM (
+                SELECT DISTINCT regexp_split_to_table(question || ' ' || criteria || ' ' || theme, '\\s+') AS word
+                FROM catalogue_search
+            ) w
+        ), synthetic AS (
+            -- g entra no índice só para o string_agg ser do subselect (e não da consulta externa)
+            SELECT n,
+                   (SELECT string_agg(words[1 + floor(random() * array_length(words, 1))::int + 0 * g], ' ')
+                    FROM generate_series(1, 8 + n %% 12) g) AS question,
+                   (SELECT string_agg(words[1 + floor(random() * array_length(words, 1))::int + 0 * g], ' ')
+                    FROM generate_series(1, 3) g) AS criteria,
+                   (SELECT string_agg(words[1 + floor(random() * array_length(words, 1))::int + 0 * g], ' ')
+                    FROM generate_series(1, 2) g) AS theme,
+                   NULL::text AS gri_code
+            FROM vocabulary, generate_series(1, %(rows)s) n
+        )
+        INSERT INTO catalogue_search (item_id, {', '.join(SEARCH_COLUMNS)}, document)
+        SELECT %(offset)s - n, CASE WHEN n %% 2 = 0 THEN 'ESG' ELSE 'GRI' END, 'BENCH',
+               theme, criteria, question, gri_code, {DOCUMENT_SQL}
+        FROM synthetic;
+    """, {'rows': rows, 'offset': offset})
+    cursor.execute("ANALYZE catalogue_search;")
+    cursor.execute("SELECT COUNT(*) FROM catalogue_search;")
+    total = cursor.fetchone()[0]
+    trigram = has_trigram(cursor)
+
+    # Mesma transação da cópia TEMP (search_catalogue faria commit)
+    timings = {}
+    try:
+        for mode in ('keyword', 'fuzzy'):
+            for query in queries:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    _search(cursor, query, None, SEARCH_LIMIT, mode, trigram)
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings[(mode, query)] = statistics.median(samples)
+    finally:
+        conn.rollback()
+        cursor.close()
+    return total, trigram, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Busca textual no catálogo de questões')
+    parser.add_argument('query', nargs='?', help='Texto da busca')
+    parser.add_argument('--framework', default=None, help='Filtra por framework (ESG, GRI)')
+    parser.add_argument('--limit', type=int, default=SEARCH_LIMIT, help='Máximo de resultados')
+    parser.add_argument('--mode', choices=['auto', 'keyword', 'fuzzy'], default='auto',
+                        help='keyword: palavras-chave; fuzzy: aproximada; auto: keyword e, sem resultado, fuzzy')
+    parser.add_argument('--refresh', action='store_true', help='Sincroniza o índice com o catálogo')
+    parser.add_argument('--benchmark', type=int, default=None, metavar='N',
+                        help='Mede a latência com N questões sintéticas (em uma cópia TEMP do índice)')
+    args = parser.parse_args()
+
+    if not (args.query or args.refresh or args.benchmark):
+        parser.error('informe a busca, --refresh ou --benchmark')
+
+    print("\n" + "="*60)
+    print("🔎 GREENA - Busca no Catálogo")
+    print("="*60)
+
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            if args.refresh:
+                started = time.perf_counter()
+                upserted, removed = refresh_search_index(conn)
+                print(f"✅ Índice de busca: {upserted} questões gravadas, {removed} removidas "
+                      f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+            if args.query:
+                started = time.perf_counter()
+                results = search_catalogue(conn, args.query, args.framework, args.limit, args.mode)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"\n📋 {len(results)} resultado(s) para \"{args.query}\" ({elapsed:.1f} ms)\n")
+                print_results(results)
+
+            if args.benchmark:
+                queries = [args.query] if args.query else ['gestão de resíduos', 'emissoes carbono',
+                                                           'energia renovavel', 'diversidade']
+                total, trigram, timings = benchmark(conn, args.benchmark, queries)
+                fuzzy = 'pg_trgm' if trigram else 'prefixo (sem pg_trgm)'
+                print(f"\n⏱️  Latência mediana com {total} questões (fuzzy: {fuzzy}):")
+                for (mode, query), ms in timings.items():
+                    print(f"  {mode:<8} {query:<24} {ms:6.2f} ms")
+    except Exception as e:
+        print(f"\n❌ Erro na busca: {e}")
+        sys.exit(1)
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Snapshot binário do catálogo (carga instantânea em jobs curtos e containers)
+O seed grava, ao final de cada carga, um arquivo com o catálogo do banco em
+registros de tamanho fixo e uma tabela de strings. Os leitores mapeiam o
+arquivo com mmap e acessam os registros direto no buffer, sem parse de JSON
+nem consulta ao banco.
+
+Formato (inteiros little-endian de 32 bits, strings UTF-8):
+  cabeçalho   magic, versão do formato, versão do catálogo (catalogue_version),
+              SHA-256 do conteúdo, SHA-256 dos JSON de origem e contagens
+  pilares     id, código, nome, framework, início e fim do intervalo de questões
+  temas       id, posição do pilar, nome
+  critérios   id, posição do tema, nome
+  questões    id, posição do critério, ordem, pergunta, código GRI, framework_tag,
+              data_fields (texto JSON), em ordem de árvore
+  índice      pares (id, posição) das questões ordenados por id (busca binária)
+  strings     textos sem repetição; cada referência é (offset, tamanho), -1 = NULL
+
+O snapshot vale enquanto a versão do catálogo no banco (com conexão) ou o
+hash dos JSON de origem (sem conexão) for o mesmo; senão open_catalogue cai
+para o cache do banco (catalogue_cache) ou, sem banco, para os JSON.
+
+INSTRUÇÕES DE USO:
+  from catalogue_snapshot import open_catalogue
+  catalogue = open_catalogue(conn)          # mesma interface do catalogue_cache
+  criteria_id, theme_id, pillar_id = catalogue.item_path(item_id)
+
+  python catalogue_snapshot.py              # abre o snapshot e mostra tempos
+  python catalogue_snapshot.py --write      # grava a partir do banco (o seed já faz isso)
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from catalogue_cache import Catalogue, CatalogueItem, get_catalogue, catalogue_version
+from db_pool import get_pool
+
+SNAPSHOT_PATH = os.getenv('CATALOGUE_SNAPSHOT', 'catalogue.snapshot')
+
+# JSON de origem do catálogo (os mesmos FRAMEWORKS do seed_database)
+DEFAULT_SOURCES = {
+    'ESG': 'esg_questions_complete.json',
+    'GRI': os.path.join('backend', 'gri_questions.json'),
+}
+
+MAGIC = b'GREENCAT'
+FORMAT_VERSION = 1
+
+# magic, formato, reservado, versão do catálogo, hash do conteúdo, hash das
+# origens, pilares, temas, critérios, questões, bytes de strings
+HEADER = struct.Struct('<8sHHq32s32s5I')
+
+PILLAR_FIELDS = 9      # id, code(off, len), name(off, len), framework(off, len), item_start, item_end
+THEME_FIELDS = 4       # id, pillar_pos, name(off, len)
+CRITERIA_FIELDS = 4    # id, theme_pos, name(off, len)
+ITEM_FIELDS = 11       # id, criteria_pos, order, question, gri_code, framework_tag, data_fields (off, len)
+INDEX_FIELDS = 2       # id, posição
+
+
+def sources_hash(sources):
+    """SHA-256 dos JSON de origem (None se algum não existe)"""
+    digest = hashlib.sha256()
+    for framework in sorted(sources):
+        try:
+            with open(sources[framework], 'rb') as f:
+                digest.update(framework.encode('utf-8') + b'\0' + f.read())
+        except FileNotFoundError:
+            return None
+    return digest.digest()
+
+
+class _StringTable:
+    def __init__(self):
+        self.offsets = {}
+        self.data = bytearray()
+
+    def ref(self, text):
+        if text is None:
+            return (-1, 0)
+        encoded = text.encode('utf-8')
+        offset = self.offsets.get(encoded)
+        if offset is None:
+            offset = self.offsets[encoded] = len(self.data)
+            self.data += encoded
+        return (offset, len(encoded))
+
+
+def write_snapshot(catalogue, path=SNAPSHOT_PATH, sources=None):
+    """Grava o catálogo (catalogue_cache.Catalogue) de forma atômica; devolve o hash do conteúdo"""
+    strings = _StringTable()
+    pillars = array('i')
+    for i in range(len(catalogue.pillar_ids)):
+        pillars.extend((catalogue.pillar_ids[i], *strings.ref(catalogue.pillar_codes[i]),
+                        *strings.ref(catalogue.pillar_names[i]), *strings.ref(catalogue.pillar_frameworks[i]),
+                        catalogue.pillar_item_start[i], catalogue.pillar_item_end[i]))
+    themes = array('i')
+    for i in range(len(catalogue.theme_ids)):
+        themes.extend((catalogue.theme_ids[i], catalogue.theme_pillar[i], *strings.ref(catalogue.theme_names[i])))
+    criteria = array('i')
+    for i in range(len(catalogue.criteria_ids)):
+        criteria.extend((catalogue.criteria_ids[i], catalogue.criteria_theme[i],
+                         *strings.ref(catalogue.criteria_names[i])))
+    items = array('i')
+    for i in range(len(catalogue.item_ids)):
+        items.extend((catalogue.item_ids[i], catalogue.item_criteria[i], catalogue.item_order[i],
+                      *strings.ref(catalogue.item_questions[i]), *strings.ref(catalogue.item_gri_codes[i]),
+                      *strings.ref(catalogue.item_framework_tags[i]), *strings.ref(catalogue.item_data_fields[i])))
+    index = array('i')
+    for item_id, position in sorted((item_id, i) for i, item_id in enumerate(catalogue.item_ids)):
+        index.extend((item_id, position))
+
+    sections = [pillars, themes, criteria, items, index]
+    if sys.byteorder != 'little':
+        for section in sections:
+            section.byteswap()
+    body = b''.join(section.tobytes() for section in sections) + bytes(strings.data)
+    content_hash = hashlib.sha256(body).digest()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0,
+                         catalogue.version if catalogue.version is not None else -1,
+                         content_hash, (sources_hash(sources) if sources else None) or bytes(32),
+                         len(catalogue.pillar_ids), len(catalogue.theme_ids), len(catalogue.criteria_ids),
+                         len(catalogue.item_ids), len(strings.data))
+
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(header)
+        f.write(body)
+    os.replace(temporary, path)
+    return content_hash.hex()
+
+
+class CatalogueSnapshot:
+    """
+    Catálogo lido direto do arquivo mapeado (mesma interface de consulta do
+    catalogue_cache.Catalogue). Os arrays de IDs e posições são memoryviews
+    sobre o mmap: nada é copiado na abertura.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < HEADER.size:
+            raise ValueError(f"{path}: snapshot truncado")
+        (magic, format_version, _, version, content_hash, source_hash,
+         pillars, themes, criteria, items, strings_size) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path}: formato de snapshot desconhecido")
+        if sys.byteorder != 'little':
+            raise ValueError("snapshot little-endian não pode ser mapeado nesta plataforma")
+        self.version = version if version >= 0 else None
+        self.content_hash = content_hash.hex()
+        self.sources_hash = source_hash if any(source_hash) else None
+
+        offset = HEADER.size
+        sections = []
+        for count, fields in ((pillars, PILLAR_FIELDS), (themes, THEME_FIELDS), (criteria, CRITERIA_FIELDS),
+                              (items, ITEM_FIELDS), (items, INDEX_FIELDS)):
+            size = count * fields * 4
+            sections.append(buffer[offset:offset + size].cast('i'))
+            offset += size
+        self._pillars, self._themes, self._criteria, self._items, self._index = sections
+        self._strings = buffer[offset:offset + strings_size]
+        if len(self._strings) != strings_size:
+            raise ValueError(f"{path}: snapshot truncado")
+        self._body = buffer[HEADER.size:offset + strings_size]
+
+        # Colunas (views com passo, sem cópia) com os mesmos nomes do Catalogue
+        self.pillar_ids = self._pillars[0::PILLAR_FIELDS]
+        self.pillar_item_start = self._pillars[7::PILLAR_FIELDS]
+        self.pillar_item_end = self._pillars[8::PILLAR_FIELDS]
+        self.theme_ids = self._themes[0::THEME_FIELDS]
+        self.theme_pillar = self._themes[1::THEME_FIELDS]
+        self.criteria_ids = self._criteria[0::CRITERIA_FIELDS]
+        self.criteria_theme = self._criteria[1::CRITERIA_FIELDS]
+        self.item_ids = self._items[0::ITEM_FIELDS]
+        self.item_criteria = self._items[1::ITEM_FIELDS]
+        self.item_order = self._items[2::ITEM_FIELDS]
+        self._index_ids = self._index[0::INDEX_FIELDS]
+        self._index_positions = self._index[1::INDEX_FIELDS]
+
+    def verify(self):
+        """Confere o hash do conteúdo (lê o arquivo inteiro; a abertura não faz isso)"""
+        return hashlib.sha256(self._body).hexdigest() == self.content_hash
+
+    def _text(self, section, record, field):
+        offset, length = section[record + field], section[record + field + 1]
+        if offset < 0:
+            return None
+        return str(self._strings[offset:offset + length], 'utf-8')
+
+    @property
+    def pillar_codes(self):
+        return [self._text(self._pillars, i * PILLAR_FIELDS, 1) for i in range(len(self.pillar_ids))]
+
+    @property
+    def pillar_names(self):
+        return [self._text(self._pillars, i * PILLAR_FIELDS, 3) for i in range(len(self.pillar_ids))]
+
+    @property
+    def pillar_frameworks(self):
+        return [self._text(self._pillars, i * PILLAR_FIELDS, 5) for i in range(len(self.pillar_ids))]
+
+    @property
+    def theme_names(self):
+        return [self._text(self._themes, i * THEME_FIELDS, 2) for i in range(len(self.theme_ids))]
+
+    @property
+    def criteria_names(self):
+        return [self._text(self._criteria, i * CRITERIA_FIELDS, 2) for i in range(len(self.criteria_ids))]
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def _item_position(self, item_id):
+        i = bisect.bisect_left(self._index_ids, item_id)
+        if i == len(self._index_ids) or self._index_ids[i] != item_id:
+            raise KeyError(item_id)
+        return self._index_positions[i]
+
+    def __contains__(self, item_id):
+        try:
+            self._item_position(item_id)
+        except KeyError:
+            return False
+        return True
+
+    def _item_positions(self, item_id):
+        position = self._item_position(item_id)
+        criteria = self.item_criteria[position]
+        theme = self.criteria_theme[criteria]
+        return position, criteria, theme, self.theme_pillar[theme]
+
+    def item(self, item_id):
+        position, criteria, theme, pillar = self._item_positions(item_id)
+        record = position * ITEM_FIELDS
+        return CatalogueItem(item_id, self._text(self._items, record, 3), self.item_order[position],
+                             self.criteria_ids[criteria], self.theme_ids[theme], self.pillar_ids[pillar],
+                             self._text(self._pillars, pillar * PILLAR_FIELDS, 1),
+                             self._text(self._items, record, 5), self._text(self._items, record, 7))
+
+    def item_path(self, item_id):
+        """(criteria_id, theme_id, pillar_id) da questão"""
+        _, criteria, theme, pillar = self._item_positions(item_id)
+        return self.criteria_ids[criteria], self.theme_ids[theme], self.pillar_ids[pillar]
+
+    def data_fields(self, item_id):
+        raw = self._text(self._items, self._item_position(item_id) * ITEM_FIELDS, 9)
+        return json.loads(raw) if raw else None
+
+    def _pillar_position(self, pillar_id):
+        for i, candidate in enumerate(self.pillar_ids):
+            if candidate == pillar_id:
+                return i
+        raise KeyError(pillar_id)
+
+    def pillar(self, pillar_id):
+        """(id, código, nome, framework) do pilar"""
+        record = self._pillar_position(pillar_id) * PILLAR_FIELDS
+        return (pillar_id, self._text(self._pillars, record, 1), self._text(self._pillars, record, 3),
+                self._text(self._pillars, record, 5))
+
+    def pillars(self, framework=None):
+        """(id, código, nome, framework) na ordem de exibição"""
+        pillars = [self.pillar(pillar_id) for pillar_id in self.pillar_ids]
+        return [pillar for pillar in pillars if framework is None or pillar[3] == framework]
+
+    def pillar_items(self, pillar_id):
+        """Intervalo de posições (em item_ids) das questões do pilar"""
+        pillar = self._pillar_position(pillar_id)
+        return range(self.pillar_item_start[pillar], self.pillar_item_end[pillar])
+
+    def pillar_item_ids(self, pillar_id):
+        positions = self.pillar_items(pillar_id)
+        return self.item_ids[positions.start:positions.stop]
+
+
+def _positions_within(groups):
+    """Posição (a partir de 1) de cada elemento no seu grupo, como o order_index do seed"""
+    counts = {}
+    for group in groups:
+        counts[group] = counts.get(group, 0) + 1
+        yield counts[group]
+
+
+def catalogue_from_json(sources=None):
+    """
+    Catálogo montado dos JSON (sem banco). Os IDs são sequenciais e locais,
+    não os do banco: serve para textos e estrutura, não para casar respostas.
+    """
+    catalogue = Catalogue()
+    catalogue.version = None
+    pillars, themes, criteria, items = [], [], [], []
+    theme_keys, criteria_keys = {}, {}
+    for framework, path in (sources or DEFAULT_SOURCES).items():
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for code, pillar_data in data.items():
+            pillar = len(pillars)
+            pillars.append((code, pillar_data.get('name', code), framework))
+            for question in pillar_data.get('questions', []):
+                theme_key = (pillar, question['theme'])
+                if theme_key not in theme_keys:
+                    theme_keys[theme_key] = len(themes)
+                    themes.append((pillar, question['theme']))
+                criteria_key = (theme_keys[theme_key], question['criteria'])
+                if criteria_key not in criteria_keys:
+                    criteria_keys[criteria_key] = len(criteria)
+                    criteria.append(criteria_key)
+                data_fields = question.get('dataFields')
+                items.append((criteria_keys[criteria_key], question['question'], question.get('griCode'),
+                               framework, json.dumps(data_fields, ensure_ascii=False) if data_fields else None))
+
+    # Questões em ordem de árvore (critérios são criados na ordem do arquivo)
+    order = sorted(range(len(items)), key=lambda i: (themes[criteria[items[i][0]][0]][0],
+                                                     criteria[items[i][0]][0], items[i][0], i))
+    catalogue.pillar_ids = array('i', range(1, len(pillars) + 1))
+    catalogue.pillar_codes = [sys.intern(p[0]) for p in pillars]
+    catalogue.pillar_names = [p[1] for p in pillars]
+    catalogue.pillar_frameworks = [sys.intern(p[2]) for p in pillars]
+    catalogue.theme_ids = array('i', range(1, len(themes) + 1))
+    catalogue.theme_names = [t[1] for t in themes]
+    catalogue.theme_pillar = array('i', (t[0] for t in themes))
+    catalogue.criteria_ids = array('i', range(1, len(criteria) + 1))
+    catalogue.criteria_names = [c[1] for c in criteria]
+    catalogue.criteria_theme = array('i', (c[0] for c in criteria))
+    catalogue.item_ids = array('i', range(1, len(items) + 1))
+    catalogue.item_questions = [items[i][1] for i in order]
+    catalogue.item_order = array('i', _positions_within(items[i][0] for i in order))
+    catalogue.item_criteria = array('i', (items[i][0] for i in order))
+    catalogue.item_gri_codes = [sys.intern(items[i][2]) if items[i][2] else None for i in order]
+    catalogue.item_framework_tags = [sys.intern(items[i][3]) for i in order]
+    catalogue.item_data_fields = [items[i][4] for i in order]
+    catalogue.build_indexes()
+    return catalogue
+
+
+def open_snapshot(path=SNAPSHOT_PATH, conn=None, sources=None):
+    """
+    Snapshot válido ou None (ausente, corrompido ou desatualizado). Com `conn`
+    compara com a versão do catálogo no banco; sem, com o hash dos JSON.
+    """
+    try:
+        snapshot = CatalogueSnapshot(path)
+    except (OSError, ValueError):
+        return None
+    if conn is not None:
+        cursor = conn.cursor()
+        current = catalogue_version(cursor)
+        conn.commit()
+        cursor.close()
+        return snapshot if current is not None and current == snapshot.version else None
+    current = sources_hash(sources or DEFAULT_SOURCES)
+    return snapshot if current is not None and current == snapshot.sources_hash else None
+
+
+def open_catalogue(conn=None, path=SNAPSHOT_PATH, sources=None):
+    """Snapshot mapeado se estiver em dia; senão o cache do banco (com `conn`) ou os JSON"""
+    snapshot = open_snapshot(path, conn, sources)
+    if snapshot is not None:
+        return snapshot
+    if conn is not None:
+        return get_catalogue(conn, max_age=0)
+    return catalogue_from_json(sources)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot binário do catálogo')
+    parser.add_argument('--path', default=SNAPSHOT_PATH, help='Arquivo do snapshot')
+    parser.add_argument('--write', action='store_true', help='Grava o snapshot a partir do banco')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("📦 GREENA - Snapshot do Catálogo")
+    print("="*60 + "\n")
+
+    if args.write:
+        with get_pool().connection() as conn:
+            content_hash = write_snapshot(get_catalogue(conn, max_age=0), args.path, DEFAULT_SOURCES)
+        get_pool().closeall()
+        print(f"✅ Snapshot gravado em {args.path} ({os.path.getsize(args.path) / 1024:.1f} KB, "
+              f"conteúdo {content_hash[:12]})")
+
+    started = time.perf_counter()
+    snapshot = open_snapshot(args.path)
+    open_seconds = time.perf_counter() - started
+    if snapshot is None:
+        started = time.perf_counter()
+        catalogue_from_json()
+        print(f"⚠️  Snapshot ausente ou desatualizado; leitura dos JSON: "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        return
+
+    started = time.perf_counter()
+    for item_id in snapshot.item_ids:
+        snapshot.item_path(item_id)
+    lookup_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    catalogue_from_json()
+    json_seconds = time.perf_counter() - started
+
+    print(f"✅ Versão {snapshot.version}, conteúdo {snapshot.content_hash[:12]}"
+          f" ({'íntegro' if snapshot.verify() else 'CORROMPIDO'}): {len(snapshot.pillar_ids)} pilares, "
+          f"{len(snapshot.theme_ids)} temas, {len(snapshot.criteria_ids)} critérios, {len(snapshot)} questões")
+    print(f"⏱️  Abertura (mmap + hash dos JSON): {open_seconds * 1e6:.0f} µs | leitura dos JSON: "
+          f"{json_seconds * 1000:.1f} ms")
+    print(f"⏱️  item_path: {lookup_seconds / max(len(snapshot), 1) * 1e6:.2f} µs por questão")
+
+
+if __name__ == "__main__":
+    main()
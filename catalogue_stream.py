@@ -0,0 +1,146 @@
+"""
+Leitor incremental (streaming) dos catálogos de questões
+
+Lê arquivos no formato de esg_questions_complete.json / gri_questions.json:
+
+    {
+      "E": {"name": "Ambiental", "questions": [{...}, {...}]},
+      "S": {...}
+    }
+
+sem carregar o documento inteiro na memória. O arquivo é lido em blocos e
+apenas uma questão é decodificada por vez, então o consumo de memória fica
+limitado pelo tamanho do bloco e da maior questão, e não pelo catálogo.
+
+USO:
+    from catalogue_stream import iter_questions
+
+    for pillar_code, question in iter_questions('esg_questions_complete.json'):
+        ...
+"""
+
+import json
+
+# Tamanho do bloco lido do arquivo (em caracteres)
+CHUNK_SIZE = 64 * 1024
+
+# Limite de tamanho de um único valor JSON (proteção contra arquivos malformados)
+MAX_VALUE_SIZE = 16 * 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffer deslizante sobre o arquivo, descartando o que já foi consumido"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Descarta o prefixo consumido antes de crescer o buffer
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Próximo caractere significativo (sem consumir), ou '' no fim do arquivo"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON inválido: esperado '{char}', encontrado '{found or 'EOF'}'")
+        self.pos += 1
+
+    def value(self):
+        """Decodifica o próximo valor JSON completo, lendo mais blocos se necessário"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # Exige um caractere após o valor: um número cortado no fim
+                # do bloco ("12" de "123") seria decodificado pela metade
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if len(self.buffer) - self.pos > MAX_VALUE_SIZE:
+                raise ValueError(f"Valor JSON maior que {MAX_VALUE_SIZE} caracteres")
+            self._fill()
+
+
+def iter_events(json_file_path, chunk_size=CHUNK_SIZE):
+    """
+    Gera eventos no estilo ijson, na ordem do arquivo:
+
+        ('pillar_start', code, None)
+        ('pillar_field', code, (chave, valor))   # ex.: ('name', 'Ambiental')
+        ('question', code, questão)
+        ('pillar_end', code, None)
+    """
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            pillar_code = reader.value()
+            reader.expect(':')
+            reader.expect('{')
+            yield ('pillar_start', pillar_code, None)
+
+            if reader.peek() != '}':
+                while True:
+                    key = reader.value()
+                    reader.expect(':')
+                    if key == 'questions':
+                        reader.expect('[')
+                        if reader.peek() != ']':
+                            while True:
+                                yield ('question', pillar_code, reader.value())
+                                if reader.peek() != ',':
+                                    break
+                                reader.pos += 1
+                        reader.expect(']')
+                    else:
+                        yield ('pillar_field', pillar_code, (key, reader.value()))
+                    if reader.peek() != ',':
+                        break
+                    reader.pos += 1
+
+            reader.expect('}')
+            yield ('pillar_end', pillar_code, None)
+            if reader.peek() != ',':
+                break
+            reader.pos += 1
+        reader.expect('}')
+
+
+def iter_questions(json_file_path, pillars=None, chunk_size=CHUNK_SIZE):
+    """
+    Gera (código do pilar, questão) na ordem do arquivo.
+
+    `pillars` limita a leitura a um conjunto de códigos de pilar.
+    """
+    for event, pillar_code, payload in iter_events(json_file_path, chunk_size):
+        if event == 'question' and (pillars is None or pillar_code in pillars):
+            yield pillar_code, payload
@@ -0,0 +1,386 @@
+"""
+Crosswalk ESG ↔ GRI compilado em matrizes esparsas (SciPy CSR)
+Projeta em lote as respostas de diagnósticos de um framework no outro: que
+cobertura GRI um diagnóstico ESG indica, e o contrário.
+
+- as correspondências de framework_mappings (carregadas pelo seed a partir
+  do backend/gri_esg_mapping.json) viram uma matriz questão × questão,
+  com peso pelo compatibilityLevel (COMPATIBILITY_WEIGHTS); o sentido
+  GRI → ESG usa a transposta
+- a composição com a matriz questão → pilar é pré-calculada (projeção
+  transitiva ESG → questão GRI → pilar GRI), então questões e pilares do
+  outro framework saem de uma única multiplicação para o lote inteiro
+- estimativa de cada questão/pilar: média das respostas (evaluationValue/5)
+  das questões correspondentes, ponderada pelos pesos; questões sem resposta
+  válida ('Não se aplica', 0) não entram. confidence = fração do peso das
+  correspondências que teve resposta
+- diagnósticos ESG são projetados em GRI e GRI em ESG; ESG_GRI já respondem
+  os dois e ficam de fora
+
+Os diagnósticos são processados em lotes de BATCH_DIAGNOSES: as respostas de
+cada lote chegam pelo mesmo COPY binário do score_diagnoses.py, viram uma
+matriz CSR (só as respostas válidas), são projetadas e as pontuações vão para
+a tabela temporária antes do próximo lote, então a memória depende do lote e
+não do total. A gravação em crosswalk_scores (migração 10) é um upsert só do
+que mudou, em uma transação.
+
+INSTRUÇÕES DE USO:
+1. Instale as dependências: pip install psycopg2-binary python-dotenv numpy scipy
+2. Execute: python crosswalk.py
+
+  from crosswalk import Crosswalk
+  crosswalk = Crosswalk.from_database(conn)
+  projection = crosswalk.project(values, answered, 'ESG')   # CSR diagnósticos × questões
+
+EXEMPLOS:
+  python crosswalk.py --status completed      # só diagnósticos concluídos
+  python crosswalk.py --dry-run               # calcula e mostra o resumo, sem gravar
+  python crosswalk.py --diagnosis <id>        # questões GRI estimadas de um diagnóstico
+  python crosswalk.py --batch 5000            # diagnósticos por lote (limita a memória)
+"""
+
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+
+from catalogue_snapshot import open_catalogue
+from db_pool import get_pool
+from score_diagnoses import (CHUNK_BYTES, CatalogueIndex, ScoreAccumulator, _copy_lines, js_round,
+                             load_diagnoses)
+from schema_migrations import migrate
+from seed_database import CountingCursor, SeedReport
+
+# Peso de cada correspondência pelo compatibilityLevel do mapeamento
+COMPATIBILITY_WEIGHTS = {'alta': 1.0, 'media': 0.6, 'baixa': 0.3}
+
+# Framework de origem → framework estimado
+DIRECTIONS = {'ESG': 'GRI', 'GRI': 'ESG'}
+
+# Diagnósticos por lote (um COPY, uma matriz CSR e uma projeção por lote)
+BATCH_DIAGNOSES = 20000
+
+# Linhas = diagnósticos. Questões: CSR só com as estimadas; pilares: matrizes
+# densas (NaN: sem correspondência)
+Projection = namedtuple('Projection', 'item_scores item_confidence pillar_scores pillar_confidence')
+
+
+class Crosswalk:
+    """
+    Correspondências compiladas sobre o índice do catálogo: questões e pilares
+    nas posições de catalogue.item_ids / catalogue.pillar_ids.
+    """
+
+    def __init__(self, catalogue, mappings):
+        """`mappings`: [(id da questão ESG, id da questão GRI, compatibilityLevel)]"""
+        self.index = CatalogueIndex(catalogue)
+        self.item_ids = np.asarray(catalogue.item_ids, dtype=np.int32)
+        self.position = np.full(len(self.index.item_pillar), -1, dtype=np.int64)
+        self.position[self.item_ids] = np.arange(len(self.item_ids))
+        items, pillars = len(self.item_ids), len(self.index.pillar_ids)
+        self.pillar_frameworks = np.asarray(self.index.pillar_frameworks)
+
+        # Pares repetidos ficam com o maior peso (a conversão coo → csr somaria)
+        pairs = {}
+        self.skipped = 0
+        for esg_item, gri_item, level in mappings:
+            esg, gri = self._item_position(esg_item), self._item_position(gri_item)
+            if esg < 0 or gri < 0 or level not in COMPATIBILITY_WEIGHTS:
+                self.skipped += 1
+                continue
+            pairs[(esg, gri)] = max(COMPATIBILITY_WEIGHTS[level], pairs.get((esg, gri), 0.0))
+        self.mappings = len(pairs)
+        esg_to_gri = sparse.csr_matrix(
+            (list(pairs.values()), ([row for row, _ in pairs], [col for _, col in pairs])),
+            shape=(items, items), dtype=np.float64)
+        item_pillar = sparse.csr_matrix(
+            (np.ones(items), (np.arange(items), self.index.item_pillar[self.item_ids])),
+            shape=(items, pillars), dtype=np.float64)
+
+        # Um operador por sentido: [questão → questão | questão → pilar] lado a lado
+        self.operators = {}
+        self.totals = {}
+        for source, matrix in (('ESG', esg_to_gri), ('GRI', esg_to_gri.T.tocsr())):
+            operator = sparse.hstack([matrix, matrix @ item_pillar], format='csr')
+            self.operators[source] = operator
+            self.totals[source] = np.asarray(operator.sum(axis=0)).ravel()
+
+    @classmethod
+    def from_database(cls, conn):
+        catalogue = open_catalogue(conn)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT esg_assessment_item_id, gri_assessment_item_id, compatibility_level
+            FROM framework_mappings;
+        """)
+        mappings = cursor.fetchall()
+        cursor.close()
+        return cls(catalogue, mappings)
+
+    def _item_position(self, item_id):
+        return int(self.position[item_id]) if 0 <= item_id < len(self.position) else -1
+
+    def project(self, values, answered, source):
+        """
+        Projeta um lote de diagnósticos do framework `source`.
+        `values`: CSR diagnósticos × questões com evaluationValue/5 (0-1) das
+        respostas válidas; `answered`: CSR com 1 nas mesmas posições. Uma
+        multiplicação esparsa para numerador e denominador de questões e
+        pilares do outro framework; só os pilares saem densos.
+        """
+        operator = self.operators[source]
+        items = values.shape[1]
+        stacked = sparse.vstack([values, answered], format='csr') @ operator
+        diagnoses = values.shape[0]
+        weighted, evidence = stacked[:diagnoses], stacked[diagnoses:]
+        totals = self.totals[source]
+        inverse_totals = np.zeros(len(totals))
+        np.divide(1.0, totals, out=inverse_totals, where=totals > 0)
+
+        # Questões: mesmo padrão de esparsidade nos dois (valores válidos são > 0)
+        item_evidence = evidence[:, :items].tocsr()
+        item_scores = weighted[:, :items].multiply(item_evidence.power(-1)).tocsr()
+        item_confidence = (item_evidence @ sparse.diags(inverse_totals[:items])).tocsr()
+
+        pillar_weighted = weighted[:, items:].toarray()
+        pillar_evidence = evidence[:, items:].toarray()
+        pillar_scores = np.full(pillar_weighted.shape, np.nan)
+        np.divide(pillar_weighted, pillar_evidence, out=pillar_scores, where=pillar_evidence > 0)
+        pillar_scores *= 100
+        finite = np.isfinite(pillar_scores)
+        pillar_scores[finite] = js_round(pillar_scores[finite])
+        return Projection(item_scores, item_confidence, pillar_scores, pillar_evidence * inverse_totals[items:])
+
+
+class ResponseMatrix(ScoreAccumulator):
+    """
+    COPY binário das respostas de um lote → CSR diagnósticos × questões
+    (valor/5 e resposta válida). Cada bloco do COPY vira uma CSR, somadas no
+    fim (um par diagnóstico/questão só aparece uma vez).
+    """
+
+    def __init__(self, crosswalk, diagnoses, chunk_bytes=CHUNK_BYTES):
+        super().__init__(crosswalk.index, diagnoses, chunk_bytes)
+        self.crosswalk = crosswalk
+        self.shape = (diagnoses, len(crosswalk.item_ids))
+        self.values = sparse.csr_matrix(self.shape, dtype=np.float64)
+        self.answered = sparse.csr_matrix(self.shape, dtype=np.float64)
+
+    def _accumulate(self, diagnosis, item, value, not_applicable):
+        self.responses += len(item)
+        position = np.full(len(item), -1, dtype=np.int64)
+        inside = item < len(self.crosswalk.position)
+        position[inside] = self.crosswalk.position[item[inside]]
+        known = position >= 0
+        self.ignored += int((~known).sum())
+        # Mesma regra do backend: 'Não se aplica' ou valor 0 não contam
+        valid = known & ~not_applicable & (value != 0)
+        coordinates = (diagnosis[valid], position[valid])
+        self.values += sparse.csr_matrix((value[valid] / 5, coordinates), shape=self.shape)
+        self.answered += sparse.csr_matrix((np.ones(int(valid.sum())), coordinates), shape=self.shape)
+
+
+class ProjectionSummary:
+    """Médias de pontuação e confiança por pilar estimado, somadas lote a lote"""
+
+    def __init__(self, crosswalk):
+        pillars = len(crosswalk.index.pillar_ids)
+        self.diagnoses = dict.fromkeys(DIRECTIONS, 0)
+        self.seconds = dict.fromkeys(DIRECTIONS, 0.0)
+        self.score_sums = {source: np.zeros(pillars) for source in DIRECTIONS}
+        self.confidence_sums = {source: np.zeros(pillars) for source in DIRECTIONS}
+        self.counts = {source: np.zeros(pillars, dtype=np.int64) for source in DIRECTIONS}
+
+    def add(self, source, projection, seconds):
+        finite = np.isfinite(projection.pillar_scores)
+        self.diagnoses[source] += len(finite)
+        self.seconds[source] += seconds
+        self.score_sums[source] += np.where(finite, projection.pillar_scores, 0).sum(axis=0)
+        self.confidence_sums[source] += np.where(finite, projection.pillar_confidence, 0).sum(axis=0)
+        self.counts[source] += finite.sum(axis=0)
+
+
+def _score_lines(crosswalk, ids, rows, source, projection):
+    """Linhas do COPY de new_crosswalk_scores para os pilares estimados de um lote"""
+    target = np.flatnonzero(crosswalk.pillar_frameworks == DIRECTIONS[source])
+    found, cols = np.nonzero(np.isfinite(projection.pillar_scores[:, target]))
+    return [f"{ids[rows[row]]}\t{crosswalk.index.pillar_codes[col]}\t{DIRECTIONS[source]}\t"
+            f"{projection.pillar_scores[row, col]:.2f}\t{projection.pillar_confidence[row, col]:.4f}\n"
+            for row, col in zip(found.tolist(), target[cols].tolist())]
+
+
+def compute_projection(conn, report, status=None, batch_size=BATCH_DIAGNOSES, chunk_bytes=CHUNK_BYTES,
+                       diagnosis_id=None):
+    """
+    Compila o crosswalk e projeta os diagnósticos ESG e GRI no outro
+    framework, lote a lote: COPY das respostas, CSR, projeção e COPY das
+    pontuações para new_crosswalk_scores (temporária, até o commit) antes do
+    próximo lote. As questões estimadas de `diagnosis_id` ficam no resultado.
+    """
+    cursor = conn.cursor()
+    with report.phase('crosswalk (CSR)'):
+        crosswalk = Crosswalk.from_database(conn)
+    with report.phase('diagnósticos'):
+        diagnosis_ids, frameworks = load_diagnoses(cursor, status)
+        cursor.execute("""
+            CREATE TEMP TABLE new_crosswalk_scores (
+                diagnosis_id TEXT, pillar_code TEXT, framework TEXT, score DECIMAL(5,2), confidence REAL
+            ) ON COMMIT DROP;
+        """)
+    frameworks = np.asarray(frameworks)
+
+    summary = ProjectionSummary(crosswalk)
+    responses = ignored = 0
+    selected = None
+    for start in range(0, len(diagnosis_ids), batch_size):
+        end = min(start + batch_size, len(diagnosis_ids))
+        matrix = ResponseMatrix(crosswalk, end - start, chunk_bytes)
+        with report.phase('COPY respostas'):
+            cursor.copy_expert(cursor.mogrify("""
+                COPY (
+                    SELECT d.idx - %s, r.assessment_item_id, r.evaluation_value,
+                           (r.evaluation = 'Não se aplica')::int
+                    FROM responses r
+                    JOIN scoring_diagnoses d ON d.id = r.diagnosis_id
+                    WHERE d.idx >= %s AND d.idx < %s AND d.framework IN ('ESG', 'GRI')
+                ) TO STDOUT (FORMAT binary)
+            """, (start, start, end)).decode(), matrix)
+            matrix.finish()
+        responses += matrix.responses
+        ignored += matrix.ignored
+
+        lines = []
+        for source in DIRECTIONS:
+            rows = np.flatnonzero(frameworks[start:end] == source)
+            if not len(rows):
+                continue
+            with report.phase(f'projeção {source} → {DIRECTIONS[source]}'):
+                started = time.perf_counter()
+                projection = crosswalk.project(matrix.values[rows], matrix.answered[rows], source)
+                summary.add(source, projection, time.perf_counter() - started)
+            rows += start
+            lines += _score_lines(crosswalk, diagnosis_ids, rows, source, projection)
+            if diagnosis_id is not None and selected is None:
+                match = np.flatnonzero(np.asarray(diagnosis_ids, dtype=object)[rows] == diagnosis_id)
+                if len(match):
+                    selected = (source, projection.item_scores[match[0]], projection.item_confidence[match[0]])
+        with report.phase('COPY pontuações (temporária)'):
+            _copy_lines(cursor, 'new_crosswalk_scores',
+                        ('diagnosis_id', 'pillar_code', 'framework', 'score', 'confidence'), lines)
+    cursor.close()
+
+    return {
+        'crosswalk': crosswalk,
+        'diagnosis_ids': diagnosis_ids,
+        'summary': summary,
+        'selected': selected,
+        'responses': responses,
+        'ignored': ignored,
+    }
+
+
+def write_projection(conn, report):
+    """Grava as pontuações por pilar em uma transação: upsert do que mudou e remoção do que sumiu"""
+    cursor = conn.cursor()
+
+    with report.phase('gravação crosswalk_scores'):
+        cursor.execute("""
+            INSERT INTO crosswalk_scores (diagnosis_id, pillar_code, framework, score, confidence)
+            SELECT diagnosis_id, pillar_code, framework, score, confidence FROM new_crosswalk_scores
+            ON CONFLICT (diagnosis_id, pillar_code) DO UPDATE SET
+                framework = EXCLUDED.framework, score = EXCLUDED.score,
+                confidence = EXCLUDED.confidence, updated_at = CURRENT_TIMESTAMP
+            WHERE (crosswalk_scores.framework, crosswalk_scores.score, crosswalk_scores.confidence)
+                IS DISTINCT FROM (EXCLUDED.framework, EXCLUDED.score, EXCLUDED.confidence);
+        """)
+        written = cursor.rowcount
+        # Diagnósticos do lote que perderam o pilar (ou mudaram para ESG_GRI)
+        cursor.execute("""
+            DELETE FROM crosswalk_scores c
+            USING scoring_diagnoses d
+            WHERE c.diagnosis_id = d.id
+              AND NOT EXISTS (SELECT 1 FROM new_crosswalk_scores n
+                              WHERE n.diagnosis_id = c.diagnosis_id AND n.pillar_code = c.pillar_code);
+        """)
+        removed = cursor.rowcount
+
+    with report.phase('commit'):
+        conn.commit()
+    cursor.close()
+    return written, removed
+
+
+def print_summary(result):
+    crosswalk = result['crosswalk']
+    summary = result['summary']
+    print(f"\n📊 {len(result['diagnosis_ids'])} diagnósticos, {result['responses']} respostas "
+          f"({result['ignored']} fora do catálogo); crosswalk com {crosswalk.mappings} correspondências "
+          f"({crosswalk.skipped} ignoradas)")
+    for source, target in DIRECTIONS.items():
+        print(f"\n🔀 {source} → {target}: {summary.diagnoses[source]} diagnósticos em "
+              f"{summary.seconds[source] * 1000:.1f} ms")
+        for col in np.flatnonzero(crosswalk.pillar_frameworks == target):
+            count = summary.counts[source][col]
+            if count:
+                print(f"  - {crosswalk.index.pillar_codes[col]:<7} média {summary.score_sums[source][col] / count:6.2f}  "
+                      f"confiança {summary.confidence_sums[source][col] / count:.2f}  ({count} diagnósticos)")
+            else:
+                print(f"  - {crosswalk.index.pillar_codes[col]:<7} sem correspondências")
+
+
+def print_diagnosis(result, diagnosis_id, limit=15):
+    """Questões do outro framework estimadas para um diagnóstico, das mais cobertas para as menos"""
+    crosswalk = result['crosswalk']
+    if result['selected'] is None:
+        print(f"\n⚠️  Diagnóstico {diagnosis_id} não está no lote (ESG_GRI ou fora do filtro de status)")
+        return
+    source, scores, confidence = result['selected']
+    order = np.argsort(-scores.data, kind='stable')[:limit]
+    print(f"\n🔎 {diagnosis_id} ({source} → {DIRECTIONS[source]}): {scores.nnz} questões estimadas")
+    confidence = dict(zip(confidence.indices.tolist(), confidence.data.tolist()))
+    for position in scores.indices[order].tolist():
+        print(f"  - questão {crosswalk.item_ids[position]:>6}  {scores[0, position] * 100:6.2f}  "
+              f"confiança {confidence.get(position, 0.0):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Projeção em lote de diagnósticos ESG ↔ GRI (crosswalk)')
+    parser.add_argument('--status', help="Filtra diagnósticos por status (ex.: completed); padrão: todos")
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // (1024 * 1024),
+                        help='MB do COPY de respostas acumulados por bloco')
+    parser.add_argument('--batch', type=int, default=BATCH_DIAGNOSES,
+                        help=f'Diagnósticos por lote (padrão: {BATCH_DIAGNOSES})')
+    parser.add_argument('--diagnosis', help='Mostra as questões estimadas deste diagnóstico')
+    parser.add_argument('--dry-run', action='store_true', help='Calcula e mostra o resumo, sem gravar')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🔀 GREENA - Crosswalk ESG ↔ GRI")
+    print("="*60)
+
+    report = SeedReport('crosswalk')
+    pool = get_pool(cursor_factory=CountingCursor)
+    try:
+        with pool.connection() as conn:
+            if not args.dry_run:
+                migrate(conn)
+            result = compute_projection(conn, report, args.status, args.batch, args.chunk_mb * 1024 * 1024,
+                                        args.diagnosis)
+            print_summary(result)
+            if args.diagnosis:
+                print_diagnosis(result, args.diagnosis)
+            if args.dry_run:
+                conn.rollback()
+            else:
+                written, removed = write_projection(conn, report)
+                print(f"\n✅ crosswalk_scores: {written} linhas gravadas, {removed} removidas")
+        report.print_report()
+        pool.metrics.print_report()
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Agregados por diagnóstico em critério, tema e pilar (pontuação do relatório)
+O relatório (getPillarBreakdowns do ReportService) relê todas as respostas do
+diagnóstico com o include de cinco níveis resposta→questão→critério→tema→pilar
+a cada visualização. Aqui a soma dos evaluationValue, as respostas válidas e
+as respondidas ficam materializadas em diagnosis_aggregates, chave
+(diagnosis_id, level, node_id), e o detalhamento completo de um diagnóstico é
+uma única varredura pela PK; nomes e número de questões vêm do catálogo em
+memória (snapshot ou catalogue_cache).
+
+Atualização por delta (migrações 0011 e 0012 de schema_migrations.py):
+triggers de statement em responses, com tabelas de transição, somam a
+diferença de cada INSERT/UPDATE/DELETE nos três níveis (a mesma função grava
+a fila response_changes do live_scoring.py), resolvendo a hierarquia de
+create_tables. O upsert de uma resposta altera três linhas; um COPY em massa
+vira um único upsert agregado. Respostas apagadas saem dos agregados e nós
+que ficam sem respostas são removidos.
+
+Os agregados guardam ids de critério/tema/pilar: quando o catálogo muda
+(catalogue_version, incrementada pelo seed), são reconstruídos a partir de
+responses sob LOCK ... IN SHARE MODE (espera as escritas em andamento e segura
+as novas só durante a reconstrução). A reconstrução nunca roda na leitura: o
+seed_database.py a faz ao final da carga e este script serve de job
+(python diagnosis_aggregates.py); até lá a leitura responde com o último
+estado materializado.
+
+INSTRUÇÕES DE USO:
+  python diagnosis_aggregates.py                       # aplica a migração e reconstrói se preciso
+  python diagnosis_aggregates.py --diagnosis <id>      # detalhamento por pilar/tema
+
+  from diagnosis_aggregates import pillar_breakdowns
+  breakdowns = pillar_breakdowns(conn, diagnosis_id)
+
+EXEMPLOS:
+  python diagnosis_aggregates.py --rebuild             # refaz tudo a partir de responses
+  python diagnosis_aggregates.py --verify              # compara com o recálculo completo
+  python diagnosis_aggregates.py --diagnosis <id> --compare
+  python diagnosis_aggregates.py --benchmark 200       # upserts de respostas com os triggers (rollback)
+"""
+
+import argparse
+import random
+import time
+from functools import lru_cache
+
+import numpy as np
+import psycopg2.errors
+
+from catalogue_snapshot import open_catalogue
+from db_pool import get_pool
+from generate_diagnoses import EVALUATION_LABELS
+from schema_migrations import migrate
+from score_diagnoses import DIAGNOSIS_FRAMEWORKS, js_round
+
+# Faixas do relatório: tema forte a partir de 80%, fraco abaixo de 50%
+STRENGTH_THRESHOLD = 80
+WEAKNESS_THRESHOLD = 50
+
+# Chave do advisory lock da reconstrução (analytics_rollups usa 4711003)
+ADVISORY_LOCK_KEY = 4711004
+
+# Espera máxima pelas escritas em andamento em responses antes da reconstrução
+REBUILD_LOCK_TIMEOUT = '10s'
+
+# Mesma agregação dos triggers, sobre todas as respostas
+REBUILD_SQL = """
+    INSERT INTO diagnosis_aggregates (diagnosis_id, level, node_id, score_sum, valid_count, answered_count)
+    SELECT r.diagnosis_id, node.level, node.node_id,
+           sum(CASE WHEN r.valid THEN r.evaluation_value ELSE 0 END), sum(r.valid::int), count(*)
+    FROM (
+        SELECT diagnosis_id, assessment_item_id, evaluation_value,
+               evaluation <> 'Não se aplica' AND evaluation_value > 0 AS valid
+        FROM responses
+    ) r
+    JOIN assessment_items ai ON ai.id = r.assessment_item_id
+    JOIN criteria c ON c.id = ai.criteria_id
+    JOIN themes t ON t.id = c.theme_id
+    CROSS JOIN LATERAL (VALUES ('criteria', c.id), ('theme', t.id), ('pillar', t.pillar_id))
+        AS node (level, node_id)
+    GROUP BY 1, 2, 3;
+"""
+
+# Detalhamento de um diagnóstico: framework, versão em dia e agregados em uma consulta
+READ_SQL = """
+    SELECT d.framework,
+           s.rebuilt_at IS NOT NULL AND s.catalogue_version IS NOT DISTINCT FROM v.version,
+           a.level, a.node_id, a.score_sum, a.valid_count, a.answered_count
+    FROM diagnoses d
+    CROSS JOIN diagnosis_aggregate_state s
+    LEFT JOIN catalogue_version v ON true
+    LEFT JOIN diagnosis_aggregates a ON a.diagnosis_id = d.id
+    WHERE d.id = %s;
+"""
+
+
+def rebuild(conn, force=True):
+    """
+    Recalcula todos os agregados a partir de responses; devolve o número de
+    linhas. Sem `force`, desiste (None) se outro processo já reconstruiu com a
+    versão atual enquanto este esperava o advisory lock.
+    """
+    cursor = conn.cursor()
+    conn.commit()
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s);", (ADVISORY_LOCK_KEY,))
+        if not force and is_current(cursor):
+            conn.commit()
+            return None
+        cursor.execute("SET LOCAL lock_timeout = %s;", (REBUILD_LOCK_TIMEOUT,))
+        # Sem escritas em responses até o commit: nenhum delta se perde nem conta duas vezes
+        cursor.execute("LOCK TABLE responses IN SHARE MODE;")
+        cursor.execute("TRUNCATE diagnosis_aggregates;")
+        cursor.execute(REBUILD_SQL)
+        rows = cursor.rowcount
+        cursor.execute("""
+            UPDATE diagnosis_aggregate_state
+            SET catalogue_version = (SELECT version FROM catalogue_version), rebuilt_at = CURRENT_TIMESTAMP;
+        """)
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def is_current(cursor):
+    """True se os agregados foram montados com a versão atual do catálogo"""
+    cursor.execute("""
+        SELECT s.rebuilt_at IS NOT NULL AND s.catalogue_version IS NOT DISTINCT FROM v.version
+        FROM diagnosis_aggregate_state s LEFT JOIN catalogue_version v ON true;
+    """)
+    return cursor.fetchone()[0]
+
+
+def ensure_current(conn):
+    """Reconstrói se o catálogo mudou desde a última reconstrução; devolve as linhas ou None"""
+    cursor = conn.cursor()
+    try:
+        current = is_current(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+    return None if current else rebuild(conn, force=False)
+
+
+def raw_percentage(score_sum, valid_count):
+    """Regra do backend sem arredondar: soma / (válidas × 5) × 100; 0 sem válidas"""
+    if not valid_count:
+        return 0.0
+    return float(np.float64(score_sum) / (valid_count * 5) * 100)
+
+
+def percentage(score_sum, valid_count):
+    """raw_percentage com o Math.round a 2 casas do backend"""
+    return float(js_round(np.float64(raw_percentage(score_sum, valid_count))))
+
+
+def _node_scores(aggregates, level, node_id, questions):
+    """Pontos, máximo, percentual, questões e respondidas de um tema ou critério"""
+    score_sum, valid, answered = aggregates.get((level, node_id), (0, 0, 0))
+    return {
+        'score': score_sum,
+        'maxScore': valid * 5,
+        'percentage': percentage(score_sum, valid),
+        'questionsCount': questions,
+        'answeredCount': answered,
+    }
+
+
+@lru_cache(maxsize=4)
+def _tree(catalogue):
+    """
+    [(pilar: id, código, nome, framework, [(tema: id, nome, questões,
+    [(critério: id, nome, questões)])])] na ordem do catálogo. Montada uma vez
+    por catálogo: os textos do snapshot são decodificados a cada acesso.
+    """
+    criteria_questions = np.bincount(np.asarray(catalogue.item_criteria, dtype=np.int64),
+                                     minlength=len(catalogue.criteria_ids))
+    theme_questions = np.bincount(np.asarray(catalogue.criteria_theme, dtype=np.int64),
+                                  weights=criteria_questions, minlength=len(catalogue.theme_ids))
+    criteria = [[] for _ in catalogue.theme_ids]
+    for position, (criteria_id, name, theme) in enumerate(zip(catalogue.criteria_ids, catalogue.criteria_names,
+                                                               catalogue.criteria_theme)):
+        criteria[theme].append((criteria_id, name, int(criteria_questions[position])))
+    themes = [[] for _ in catalogue.pillar_ids]
+    for position, (theme_id, name, pillar) in enumerate(zip(catalogue.theme_ids, catalogue.theme_names,
+                                                             catalogue.theme_pillar)):
+        themes[pillar].append((theme_id, name, int(theme_questions[position]), criteria[position]))
+    return [(pillar_id, code, name, framework, themes[position])
+            for position, (pillar_id, code, name, framework) in enumerate(zip(
+                catalogue.pillar_ids, catalogue.pillar_codes, catalogue.pillar_names, catalogue.pillar_frameworks))]
+
+
+def read_aggregates(cursor, diagnosis_id):
+    """(framework, em dia, {(level, node_id): (soma, válidas, respondidas)}); framework None se não existe"""
+    cursor.execute(READ_SQL, (diagnosis_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None, True, {}
+    aggregates = {(level, node_id): (score_sum, valid, answered)
+                  for _, _, level, node_id, score_sum, valid, answered in rows if level is not None}
+    return rows[0][0] or 'ESG', rows[0][1], aggregates
+
+
+def pillar_breakdowns(conn, diagnosis_id, catalogue=None):
+    """
+    Mesmo formato de getPillarBreakdowns (pilares do framework do diagnóstico,
+    temas com pontos, máximo, percentual, questões e respondidas, pontos fortes
+    e fracos), com o detalhamento por critério em cada tema. None se o
+    diagnóstico não existe.
+
+    Só lê: com o catálogo mais novo que os agregados, responde com o último
+    estado materializado até a reconstrução do seed ou do job.
+    """
+    if catalogue is None:
+        catalogue = open_catalogue(conn)
+    cursor = conn.cursor()
+    try:
+        framework, _, aggregates = read_aggregates(cursor, diagnosis_id)
+        conn.commit()
+    finally:
+        cursor.close()
+    if framework is None:
+        return None
+
+    frameworks = DIAGNOSIS_FRAMEWORKS.get(framework, ('ESG',))
+    breakdowns = []
+    for pillar_id, code, name, pillar_framework, themes in _tree(catalogue):
+        if pillar_framework not in frameworks:
+            continue
+        theme_scores, strengths, weaknesses = [], [], []
+        for theme_id, theme_name, questions, criteria in themes:
+            theme = {'themeId': theme_id, 'themeName': theme_name,
+                     **_node_scores(aggregates, 'theme', theme_id, questions)}
+            theme['criteria'] = [{'criteriaId': criteria_id, 'criteriaName': criteria_name,
+                                  **_node_scores(aggregates, 'criteria', criteria_id, criteria_questions)}
+                                 for criteria_id, criteria_name, criteria_questions in criteria]
+            theme_scores.append(theme)
+            # Como o backend: faixas comparadas antes do arredondamento
+            theme_percentage = raw_percentage(*aggregates.get(('theme', theme_id), (0, 0, 0))[:2])
+            if theme_percentage >= STRENGTH_THRESHOLD:
+                strengths.append(theme_name)
+            elif theme_percentage < WEAKNESS_THRESHOLD:
+                weaknesses.append(theme_name)
+
+        score_sum, valid, _ = aggregates.get(('pillar', pillar_id), (0, 0, 0))
+        breakdowns.append({
+            'pillarId': pillar_id,
+            'pillarCode': code,
+            'pillarName': name,
+            'score': percentage(score_sum, valid),
+            'themes': theme_scores,
+            'strengths': strengths,
+            'weaknesses': weaknesses,
+        })
+    return breakdowns
+
+
+def _deep_join_themes(cursor, diagnosis_id):
+    """{theme_id: (soma, válidas, respondidas)} relendo as respostas, como o relatório faz hoje (--compare)"""
+    cursor.execute("""
+        SELECT t.id,
+               sum(CASE WHEN r.evaluation <> 'Não se aplica' AND r.evaluation_value > 0
+                        THEN r.evaluation_value ELSE 0 END),
+               count(*) FILTER (WHERE r.evaluation <> 'Não se aplica' AND r.evaluation_value > 0),
+               count(*)
+        FROM responses r
+        JOIN assessment_items ai ON ai.id = r.assessment_item_id
+        JOIN criteria c ON c.id = ai.criteria_id
+        JOIN themes t ON t.id = c.theme_id
+        JOIN pillars p ON p.id = t.pillar_id
+        WHERE r.diagnosis_id = %s
+        GROUP BY t.id;
+    """, (diagnosis_id,))
+    return {theme_id: (int(score_sum), valid, answered) for theme_id, score_sum, valid, answered in cursor.fetchall()}
+
+
+def verify(conn):
+    """Linhas que divergem do recálculo completo: (só nos agregados, só no recálculo)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE TEMP TABLE expected_aggregates (LIKE diagnosis_aggregates) ON COMMIT DROP;")
+        cursor.execute(REBUILD_SQL.replace('INSERT INTO diagnosis_aggregates', 'INSERT INTO expected_aggregates', 1))
+        cursor.execute("SELECT count(*) FROM (TABLE diagnosis_aggregates EXCEPT TABLE expected_aggregates) x;")
+        extra = cursor.fetchone()[0]
+        cursor.execute("SELECT count(*) FROM (TABLE expected_aggregates EXCEPT TABLE diagnosis_aggregates) x;")
+        missing = cursor.fetchone()[0]
+        conn.rollback()
+        return extra, missing
+    finally:
+        cursor.close()
+
+
+def benchmark(conn, upserts):
+    """
+    Upserts de respostas isoladas (como o salvamento do questionário), cada um
+    com seus triggers, numa transação desfeita no fim. Devolve (latências em
+    ms, divergências dos agregados dos diagnósticos tocados).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT r.diagnosis_id, r.assessment_item_id FROM responses r
+            WHERE r.id IN (SELECT id FROM responses TABLESAMPLE SYSTEM (5) LIMIT %s);
+        """, (upserts,))
+        targets = cursor.fetchall()
+        rng = random.Random(42)
+        latencies = []
+        for diagnosis_id, item_id in targets:
+            value = rng.randint(0, 5)
+            started = time.perf_counter()
+            cursor.execute("""
+                INSERT INTO responses (diagnosis_id, assessment_item_id, evaluation, evaluation_value, score)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (diagnosis_id, assessment_item_id) DO UPDATE SET
+                    evaluation = EXCLUDED.evaluation, evaluation_value = EXCLUDED.evaluation_value,
+                    score = EXCLUDED.score;
+            """, (diagnosis_id, item_id, EVALUATION_LABELS[value], value, value * 20))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        cursor.execute("CREATE TEMP TABLE expected_aggregates (LIKE diagnosis_aggregates) ON COMMIT DROP;")
+        cursor.execute(REBUILD_SQL.replace('INSERT INTO diagnosis_aggregates', 'INSERT INTO expected_aggregates', 1)
+                       .replace('FROM responses', 'FROM responses WHERE diagnosis_id = ANY(%s)', 1),
+                       ([target[0] for target in targets],))
+        cursor.execute("""
+            SELECT count(*) FROM (
+                (SELECT * FROM diagnosis_aggregates WHERE diagnosis_id = ANY(%s) EXCEPT TABLE expected_aggregates)
+                UNION ALL
+                (TABLE expected_aggregates EXCEPT SELECT * FROM diagnosis_aggregates WHERE diagnosis_id = ANY(%s))
+            ) x;
+        """, ([target[0] for target in targets],) * 2)
+        mismatches = cursor.fetchone()[0]
+        return latencies, mismatches
+    finally:
+        conn.rollback()
+        cursor.close()
+
+
+def print_breakdowns(breakdowns):
+    for pillar in breakdowns:
+        print(f"\n🌱 {pillar['pillarCode']} {pillar['pillarName']}: {pillar['score']:.2f}")
+        for theme in pillar['themes']:
+            print(f"  - {theme['themeName'][:48]:<48} {theme['percentage']:6.2f}%  "
+                  f"{theme['score']}/{theme['maxScore']}  {theme['answeredCount']}/{theme['questionsCount']} questões")
+        if pillar['strengths']:
+            print(f"  💪 Fortes: {', '.join(pillar['strengths'])}")
+        if pillar['weaknesses']:
+            print(f"  ⚠️  Fracos: {', '.join(pillar['weaknesses'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agregados por diagnóstico em critério, tema e pilar')
+    parser.add_argument('--rebuild', action='store_true', help='Recalcula todos os agregados a partir de responses')
+    parser.add_argument('--verify', action='store_true', help='Compara os agregados com o recálculo completo')
+    parser.add_argument('--diagnosis', metavar='ID', help='Mostra o detalhamento de um diagnóstico')
+    parser.add_argument('--compare', action='store_true',
+                        help='Com --diagnosis, compara com a releitura das respostas (join completo)')
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='Mede N upserts de respostas com os triggers (desfeitos no fim)')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🧮 GREENA - Agregados por Critério, Tema e Pilar")
+    print("="*60)
+
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            migrate(conn)
+            catalogue = open_catalogue(conn)
+            started = time.perf_counter()
+            try:
+                rows = rebuild(conn) if args.rebuild else ensure_current(conn)
+            except psycopg2.errors.LockNotAvailable:
+                print(f"❌ Escritas em responses por mais de {REBUILD_LOCK_TIMEOUT}; tente de novo")
+                return
+            if rows is not None:
+                print(f"✅ Agregados reconstruídos: {rows} linhas em {(time.perf_counter() - started) * 1000:.1f} ms")
+            else:
+                print("✅ Agregados em dia com o catálogo")
+
+            if args.verify:
+                started = time.perf_counter()
+                extra, missing = verify(conn)
+                status = '✅' if extra == missing == 0 else '❌'
+                print(f"{status} Verificação: {extra} linhas divergentes nos agregados, {missing} faltando "
+                      f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+            if args.benchmark:
+                latencies, mismatches = benchmark(conn, args.benchmark)
+                if latencies:
+                    print(f"⏱️  {len(latencies)} upserts de resposta: p50 {np.percentile(latencies, 50):.2f} ms, "
+                          f"p95 {np.percentile(latencies, 95):.2f} ms")
+                print(f"{'✅' if mismatches == 0 else '❌'} Agregados dos diagnósticos tocados: "
+                      f"{mismatches} divergências (transação desfeita)")
+
+            if args.diagnosis:
+                started = time.perf_counter()
+                breakdowns = pillar_breakdowns(conn, args.diagnosis, catalogue)
+                elapsed = (time.perf_counter() - started) * 1000
+                if breakdowns is None:
+                    print(f"❌ Diagnóstico {args.diagnosis} não encontrado")
+                    return
+                print_breakdowns(breakdowns)
+                print(f"\n⏱️  Detalhamento em {elapsed:.1f} ms a partir dos agregados")
+                if args.compare:
+                    with conn.cursor() as cursor:
+                        started = time.perf_counter()
+                        expected = _deep_join_themes(cursor, args.diagnosis)
+                        elapsed = (time.perf_counter() - started) * 1000
+                    conn.commit()
+                    differences = [theme['themeName'] for pillar in breakdowns for theme in pillar['themes']
+                                   if expected.get(theme['themeId'], (0, 0, 0))
+                                   != (theme['score'], theme['maxScore'] // 5, theme['answeredCount'])]
+                    status = '✅' if not differences else '❌'
+                    print(f"{status} Releitura das respostas ({elapsed:.1f} ms): {len(differences)} temas divergentes"
+                          + (f": {', '.join(differences)}" if differences else ''))
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Exportação colunar (Parquet) de diagnósticos, respostas e pontuações
+Substitui o SQL ad hoc dos estudos de tendência ESG contra o banco de
+produção: os dados saem uma vez, em lotes, por cursores do lado do servidor
+(ou de uma réplica, com --dsn / EXPORT_DATABASE_URL), e as análises rodam
+sobre os arquivos (pyarrow.dataset, DuckDB, pandas, Spark...).
+
+Layout (particionamento Hive por framework e mês de conclusão):
+  <saída>/dimensions/{pillars,themes,criteria,assessment_items}.parquet
+  <saída>/diagnoses/framework=ESG/month=2026-05/part-<execução>.parquet
+  <saída>/responses/framework=ESG/month=2026-05/part-<execução>.parquet
+  <saída>/diagnosis_scores/framework=ESG/month=2026-05/part-<execução>.parquet
+  <saída>/_state.json          marca d'água e histórico das execuções
+
+- Só diagnósticos concluídos; respostas e pontuações acompanham o diagnóstico
+- pillar, theme e criteria das respostas (e pillar das pontuações) vêm do
+  catálogo em memória, como colunas dictionary (índices int32 + valores)
+- Incremental: cada execução exporta os diagnósticos concluídos desde a marca
+  d'água, em novos arquivos part-*; --full reescreve tudo em uma pasta
+  temporária e troca no fim
+- Memória limitada: EXPORT_BATCH_ROWS linhas por lote e um arquivo aberto por
+  vez (cada lote vira um row group)
+- Tudo em uma transação REPEATABLE READ READ ONLY: tabelas coerentes entre si
+
+Diagnósticos recalculados depois de exportados (score_diagnoses.py) só são
+atualizados com --full.
+
+INSTRUÇÕES DE USO:
+1. Instale as dependências: pip install psycopg2-binary python-dotenv numpy pyarrow
+2. Execute: python export_parquet.py --output exports
+
+EXEMPLOS:
+  python export_parquet.py --output exports --full
+  EXPORT_DATABASE_URL=postgresql://...replica... python export_parquet.py --output exports
+  python -c "import pyarrow.dataset as ds; print(ds.dataset('exports/responses', partitioning='hive').to_table().num_rows)"
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from catalogue_snapshot import open_catalogue
+from db_pool import DATABASE_URL, get_pool
+
+EXPORT_BATCH_ROWS = 50000
+EXPORT_COMPRESSION = 'zstd'
+STATE_FILE = '_state.json'
+
+# Diagnósticos concluídos há menos que isso ficam para a próxima execução
+# (a transação que grava completed_at pode ainda não ter feito commit)
+EXPORT_SETTLE = '5 minutes'
+
+# Tipos Arrow pelos OIDs do PostgreSQL (demais: texto)
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp('ms'),
+}
+NUMERIC_OID = 1700
+
+DIMENSIONS = {
+    'pillars': "SELECT id, code, name, framework, sort_order FROM pillars ORDER BY id",
+    'themes': "SELECT id, pillar_id, name, order_index FROM themes ORDER BY id",
+    'criteria': "SELECT id, theme_id, name, order_index FROM criteria ORDER BY id",
+    'assessment_items': """
+        SELECT id, criteria_id, question, order_index, gri_code, framework_tag
+        FROM assessment_items ORDER BY id
+    """,
+}
+
+# Janela: diagnósticos concluídos em (%(since)s, %(until)s] da partição
+PARTITIONS_SQL = """
+    SELECT framework, to_char(date_trunc('month', completed_at), 'YYYY-MM'), count(*)
+    FROM diagnoses
+    WHERE status = 'completed' AND completed_at > %(since)s AND completed_at <= %(until)s
+    GROUP BY 1, 2 ORDER BY 1, 2
+"""
+PARTITION_FILTER = """
+    d.status = 'completed' AND d.framework = %(framework)s
+    AND d.completed_at >= %(month)s::date AND d.completed_at < %(month)s::date + interval '1 month'
+    AND d.completed_at > %(since)s AND d.completed_at <= %(until)s
+"""
+FACTS = {
+    'diagnoses': """
+        SELECT d.id, d.user_id, u.sector, u.company_size, d.type, d.overall_score,
+               d.environmental_score, d.social_score, d.governance_score, d.ranking_position,
+               d.started_at, d.completed_at, d.created_at
+        FROM diagnoses d JOIN users u ON u.id = d.user_id
+        WHERE """ + PARTITION_FILTER,
+    'responses': """
+        SELECT r.id, r.diagnosis_id, r.assessment_item_id, r.evaluation, r.evaluation_value, r.score,
+               r.observations, r.data::text AS data, r.created_at
+        FROM responses r JOIN diagnoses d ON d.id = r.diagnosis_id
+        WHERE """ + PARTITION_FILTER,
+    'diagnosis_scores': """
+        SELECT s.diagnosis_id, s.pillar_id, s.score, s.created_at
+        FROM diagnosis_scores s JOIN diagnoses d ON d.id = s.diagnosis_id
+        WHERE """ + PARTITION_FILTER,
+}
+
+# Colunas de texto com poucos valores distintos, gravadas como dictionary
+DICTIONARY_COLUMNS = {'sector', 'company_size', 'type', 'evaluation', 'code', 'framework', 'framework_tag'}
+
+
+class CatalogueDimensions:
+    """Posições de pilar/tema/critério por id de questão (arrays densos) e os valores dos dicionários"""
+
+    def __init__(self, catalogue):
+        item_ids = np.asarray(catalogue.item_ids, dtype=np.int64)
+        item_criteria = np.asarray(catalogue.item_criteria, dtype=np.int32)
+        item_themes = np.asarray(catalogue.criteria_theme, dtype=np.int32)[item_criteria]
+        item_pillars = np.asarray(catalogue.theme_pillar, dtype=np.int32)[item_themes]
+        size = int(item_ids.max(initial=0)) + 1
+        # -1: questão fora do catálogo (coluna nula)
+        self.item_positions = {}
+        for column, positions in (('pillar', item_pillars), ('theme', item_themes), ('criteria', item_criteria)):
+            dense = np.full(size, -1, dtype=np.int32)
+            dense[item_ids] = positions
+            self.item_positions[column] = dense
+
+        pillar_ids = np.asarray(catalogue.pillar_ids, dtype=np.int64)
+        self.pillar_position = np.full(int(pillar_ids.max(initial=0)) + 1, -1, dtype=np.int32)
+        self.pillar_position[pillar_ids] = np.arange(len(pillar_ids), dtype=np.int32)
+
+        self.values = {
+            'pillar': pa.array(list(catalogue.pillar_codes), pa.string()),
+            'theme': pa.array(list(catalogue.theme_names), pa.string()),
+            'criteria': pa.array(list(catalogue.criteria_names), pa.string()),
+        }
+
+    def _encode(self, column, dense, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        inside = (ids >= 0) & (ids < len(dense))
+        positions = np.full(len(ids), -1, dtype=np.int32)
+        positions[inside] = dense[ids[inside]]
+        indices = pa.array(positions, pa.int32(), mask=positions < 0)
+        return pa.DictionaryArray.from_arrays(indices, self.values[column])
+
+    def item_columns(self, item_ids):
+        """pillar, theme e criteria (dictionary) das questões"""
+        return {column: self._encode(column, self.item_positions[column], item_ids)
+                for column in ('pillar', 'theme', 'criteria')}
+
+    def pillar_column(self, pillar_ids):
+        return self._encode('pillar', self.pillar_position, pillar_ids)
+
+
+def arrow_type(column):
+    """Tipo Arrow de uma coluna do cursor.description"""
+    if column.type_code == NUMERIC_OID and column.precision and column.precision > 0:
+        return pa.decimal128(column.precision, max(column.scale or 0, 0))
+    if column.type_code == NUMERIC_OID:
+        return pa.float64()
+    return ARROW_TYPES.get(column.type_code, pa.string())
+
+
+def batch_table(description, rows, dimensions=None):
+    """Lote de tuplas → pa.Table (colunas de texto repetitivas como dictionary)"""
+    names = [column.name for column in description]
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    arrays = {}
+    for column, values in zip(description, columns):
+        array = pa.array(values, arrow_type(column))
+        if column.name in DICTIONARY_COLUMNS:
+            array = array.dictionary_encode()
+        arrays[column.name] = array
+    if dimensions is not None:
+        if 'assessment_item_id' in arrays:
+            arrays.update(dimensions.item_columns(columns[names.index('assessment_item_id')]))
+        elif 'pillar_id' in arrays:
+            arrays['pillar'] = dimensions.pillar_column(columns[names.index('pillar_id')])
+    return pa.table(arrays)
+
+
+def stream_query(conn, name, query, params, path, dimensions=None, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Executa `query` em um cursor do servidor e grava o resultado em `path`,
+    um row group por lote. Nenhum arquivo é criado se não houver linhas.
+    Devolve o número de linhas.
+    """
+    writer = None
+    rows_written = 0
+    with conn.cursor(name=name) as cursor:
+        cursor.itersize = batch_rows
+        cursor.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                table = batch_table(cursor.description, rows, dimensions)
+                if writer is None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = pq.ParquetWriter(path + '.tmp', table.schema, compression=EXPORT_COMPRESSION)
+                writer.write_table(table.cast(writer.schema))
+                rows_written += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+    if writer is not None:
+        os.replace(path + '.tmp', path)
+    return rows_written
+
+
+def load_state(output):
+    path = os.path.join(output, STATE_FILE)
+    if not os.path.exists(path):
+        return {'watermark': None, 'runs': []}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(output, state):
+    path = os.path.join(output, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def export(conn, output, full=False, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Exporta dimensões e os diagnósticos concluídos desde a marca d'água.
+    Devolve {tabela: linhas} e a nova marca d'água.
+    """
+    state = {'watermark': None, 'runs': []} if full else load_state(output)
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    target = os.path.join(output, f".staging-{run_id}") if full else output
+
+    # Antes da transação de leitura (o carregamento do catálogo faz commit)
+    dimensions = CatalogueDimensions(open_catalogue(conn))
+    cursor = conn.cursor()
+    conn.commit()
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+    cursor.execute(f"SELECT (now() AT TIME ZONE 'UTC') - interval '{EXPORT_SETTLE}';")
+    until = cursor.fetchone()[0]
+    since = state['watermark'] or '-infinity'
+    try:
+        counts = {}
+        for table, query in DIMENSIONS.items():
+            counts[table] = stream_query(conn, f"export_{table}", query, None,
+                                         os.path.join(target, 'dimensions', f"{table}.parquet"),
+                                         batch_rows=batch_rows)
+
+        cursor.execute(PARTITIONS_SQL, {'since': since, 'until': until})
+        partitions = cursor.fetchall()
+        for table in FACTS:
+            counts[table] = 0
+        for framework, month, diagnoses in partitions:
+            params = {'framework': framework, 'month': f"{month}-01", 'since': since, 'until': until}
+            for table, query in FACTS.items():
+                path = os.path.join(target, table, f"framework={framework}", f"month={month}",
+                                    f"part-{run_id}.parquet")
+                counts[table] += stream_query(conn, f"export_{table}", query, params, path,
+                                              dimensions, batch_rows)
+            print(f"   📦 {framework} {month}: {diagnoses} diagnósticos")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if full:
+            shutil.rmtree(target, ignore_errors=True)
+        raise
+    finally:
+        cursor.close()
+
+    if full:
+        # Troca as pastas exportadas pelas novas (arquivos antigos saem de uma vez)
+        for name in ('dimensions', *FACTS):
+            if os.path.exists(os.path.join(output, name)):
+                shutil.rmtree(os.path.join(output, name))
+            if os.path.exists(os.path.join(target, name)):
+                os.replace(os.path.join(target, name), os.path.join(output, name))
+        shutil.rmtree(target)
+
+    state['watermark'] = until.isoformat(sep=' ')
+    state['runs'].append({'run': run_id, 'full': full, 'since': None if since == '-infinity' else since,
+                          'until': state['watermark'], 'rows': counts})
+    save_state(output, state)
+    return counts, state['watermark']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exportação Parquet de diagnósticos, respostas e pontuações')
+    parser.add_argument('--output', default='exports', help='Pasta de saída')
+    parser.add_argument('--full', action='store_true', help='Reexporta tudo (ignora a marca d\'água)')
+    parser.add_argument('--batch-rows', type=int, default=EXPORT_BATCH_ROWS, help='Linhas por lote/row group')
+    parser.add_argument('--dsn', default=os.getenv('EXPORT_DATABASE_URL', DATABASE_URL),
+                        help='Banco de origem (padrão: EXPORT_DATABASE_URL ou DATABASE_URL; use uma réplica)')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("📤 GREENA - Exportação Parquet")
+    print("="*60)
+
+    os.makedirs(args.output, exist_ok=True)
+    pool = get_pool(args.dsn)
+    try:
+        with pool.connection() as conn:
+            started = time.perf_counter()
+            counts, watermark = export(conn, args.output, full=args.full, batch_rows=args.batch_rows)
+            elapsed = time.perf_counter() - started
+        print(f"\n✅ Exportação concluída em {elapsed:.1f}s (marca d'água {watermark}):")
+        for table, rows in counts.items():
+            print(f"   {table}: {rows} linhas")
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+Gerador de carga sintética: usuários, diagnósticos e respostas
+Produz diagnósticos realistas contra o catálogo carregado pelo seed_database.py,
+para testar pontuação e consultas analíticas em escala de produção localmente.
+
+As respostas seguem a escala de maturidade do backend (evaluationValue 0-5):
+0 = 'Não se aplica' (não entra na pontuação), 1 = 'Não iniciado' ... 5 = 'Totalmente implementado'.
+A maturidade de cada empresa depende do porte, do setor e do pilar (ver DEFAULT_PROFILE).
+
+INSTRUÇÕES DE USO:
+1. Rode o seed do catálogo (python seed_database.py)
+2. Execute: python generate_diagnoses.py --diagnoses 100000 --workers 4
+
+EXEMPLOS:
+  python generate_diagnoses.py --diagnoses 1000000 --seed 7        # mesma semente = mesmos dados
+  python generate_diagnoses.py --reset                              # remove a carga sintética anterior
+  python generate_diagnoses.py --profile perfil.json                # distribuições customizadas
+  python generate_diagnoses.py --create-schema                      # banco local sem as migrations do Prisma
+
+Os dados gerados são determinísticos a partir de --seed e --end-date,
+independentemente do número de workers. Usuários sintéticos usam e-mails
+@loadtest.greena, o que permite removê-los com --reset.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from catalogue_snapshot import open_catalogue
+from db_pool import get_pool
+
+# Usuários por unidade de trabalho (cada uma com seu próprio gerador aleatório)
+USERS_PER_CHUNK = 500
+
+SYNTHETIC_EMAIL_DOMAIN = 'loadtest.greena'
+
+# Escala de maturidade (validators.ts)
+EVALUATION_LABELS = {
+    0: 'Não se aplica',
+    1: 'Não iniciado',
+    2: 'Planejado',
+    3: 'Em andamento',
+    4: 'Implementado parcialmente',
+    5: 'Totalmente implementado',
+}
+
+EMPLOYEES_BY_SIZE = {
+    'Microempresa': '1-9',
+    'Pequena I': '10-49',
+    'Pequena II': '10-49',
+    'Pequena III': '50-99',
+    'Média': '100-499',
+    'Grande I': '500+',
+    'Grande II': '500+',
+}
+
+# Distribuições padrão; --profile sobrescreve qualquer chave
+DEFAULT_PROFILE = {
+    # Peso de cada porte na base de clientes
+    'company_sizes': {
+        'Microempresa': 0.30, 'Pequena I': 0.18, 'Pequena II': 0.14, 'Pequena III': 0.10,
+        'Média': 0.14, 'Grande I': 0.09, 'Grande II': 0.05,
+    },
+    # Maturidade média (escala 1-5) por porte
+    'size_maturity': {
+        'Microempresa': 2.1, 'Pequena I': 2.4, 'Pequena II': 2.6, 'Pequena III': 2.8,
+        'Média': 3.1, 'Grande I': 3.5, 'Grande II': 3.8,
+    },
+    'sectors': {
+        'Agronegócio': 0.12, 'Alimentação e Bebidas': 0.08, 'Comércio': 0.12, 'Construção Civil': 0.07,
+        'Educação': 0.05, 'Energia': 0.04, 'Indústria': 0.12, 'Logística e Transporte': 0.06,
+        'Mineração': 0.03, 'Saúde': 0.05, 'Serviços': 0.11, 'Tecnologia': 0.08, 'Têxtil': 0.03,
+        'Turismo': 0.02, 'Outro': 0.02,
+    },
+    # Ajuste de maturidade por setor e pilar (código do pilar)
+    'sector_pillar_shift': {
+        'Agronegócio': {'E': -0.3, 'GRI-E': -0.3},
+        'Mineração': {'E': -0.4, 'S': -0.2, 'GRI-E': -0.4},
+        'Energia': {'E': 0.3, 'GRI-E': 0.3},
+        'Tecnologia': {'G': 0.3, 'E': 0.2, 'GRI-U': 0.2},
+        'Serviços': {'S': 0.2},
+        'Construção Civil': {'S': -0.2},
+    },
+    # Ajuste de maturidade por pilar
+    'pillar_shift': {'E': -0.2, 'S': 0.1, 'G': 0.0, 'GRI-EC': 0.2},
+    # Probabilidade de 'Não se aplica' por pilar ('default' para os demais)
+    'not_applicable_rate': {'default': 0.06, 'E': 0.10, 'GRI-E': 0.12},
+    # Desvio entre empresas do mesmo perfil, entre questões e por resposta
+    'company_spread': 0.6,
+    'item_spread': 0.4,
+    'response_spread': 0.9,
+    # Framework escolhido no diagnóstico
+    'frameworks': {'ESG': 0.8, 'GRI': 0.1, 'ESG_GRI': 0.1},
+    # Fração de diagnósticos concluídos (os demais ficam em andamento, com parte das respostas)
+    'completed_rate': 0.7,
+}
+
+
+def load_profile(path):
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile.update(json.load(f))
+    return profile
+
+
+def ensure_schema(conn):
+    """
+    Cria as tabelas do Prisma usadas pelo gerador quando não existem
+    (banco local sem `prisma migrate`), com os mesmos nomes e índices.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            email TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            name TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            company_name TEXT,
+            cnpj TEXT,
+            city TEXT,
+            founding_year INTEGER,
+            responsible_person TEXT,
+            responsible_contact TEXT,
+            company_size TEXT,
+            sector TEXT,
+            employees_range TEXT,
+            esg_pain_point TEXT,
+            slug TEXT UNIQUE,
+            is_public_profile BOOLEAN NOT NULL DEFAULT false,
+            is_active BOOLEAN NOT NULL DEFAULT true,
+            asaas_customer_id TEXT UNIQUE,
+            created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP(3) NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS diagnoses (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL REFERENCES users(id) ON DELETE RESTRICT ON UPDATE CASCADE,
+            status TEXT NOT NULL DEFAULT 'in_progress',
+            type TEXT NOT NULL DEFAULT 'full',
+            framework TEXT NOT NULL DEFAULT 'ESG',
+            overall_score DECIMAL(5,2),
+            environmental_score DECIMAL(5,2),
+            social_score DECIMAL(5,2),
+            governance_score DECIMAL(5,2),
+            ranking_position INTEGER,
+            started_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP(3),
+            created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS responses (
+            id SERIAL PRIMARY KEY,
+            diagnosis_id TEXT NOT NULL REFERENCES diagnoses(id) ON DELETE RESTRICT ON UPDATE CASCADE,
+            assessment_item_id INTEGER NOT NULL REFERENCES assessment_items(id) ON DELETE RESTRICT ON UPDATE CASCADE,
+            importance TEXT,
+            importance_value INTEGER,
+            evaluation TEXT NOT NULL,
+            evaluation_value INTEGER NOT NULL,
+            score DECIMAL(5,2) NOT NULL,
+            observations TEXT,
+            data JSONB,
+            created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS responses_diagnosis_id_assessment_item_id_key
+            ON responses (diagnosis_id, assessment_item_id);
+        CREATE TABLE IF NOT EXISTS diagnosis_scores (
+            id SERIAL PRIMARY KEY,
+            diagnosis_id TEXT NOT NULL REFERENCES diagnoses(id) ON DELETE RESTRICT ON UPDATE CASCADE,
+            pillar_id INTEGER NOT NULL REFERENCES pillars(id) ON DELETE RESTRICT ON UPDATE CASCADE,
+            score DECIMAL(5,2) NOT NULL,
+            created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS diagnosis_scores_diagnosis_id_pillar_id_key
+            ON diagnosis_scores (diagnosis_id, pillar_id);
+    """)
+    conn.commit()
+    cursor.close()
+    print("✅ Tabelas de usuários, diagnósticos e respostas criadas/verificadas!")
+
+
+def reset_synthetic_data(conn):
+    """Remove usuários sintéticos (e-mail @loadtest.greena) e tudo que depende deles"""
+    cursor = conn.cursor()
+    pattern = (f'%@{SYNTHETIC_EMAIL_DOMAIN}',)
+    synthetic = """
+        SELECT d.id FROM diagnoses d JOIN users u ON u.id = d.user_id
+        WHERE u.email LIKE %s
+    """
+    cursor.execute("SELECT to_regclass('diagnosis_scores') IS NOT NULL;")
+    if cursor.fetchone()[0]:
+        cursor.execute(f"DELETE FROM diagnosis_scores WHERE diagnosis_id IN ({synthetic});", pattern)
+    cursor.execute(f"DELETE FROM responses WHERE diagnosis_id IN ({synthetic});", pattern)
+    responses = cursor.rowcount
+    cursor.execute(f"DELETE FROM diagnoses WHERE id IN ({synthetic});", pattern)
+    diagnoses = cursor.rowcount
+    cursor.execute("DELETE FROM users WHERE email LIKE %s;", pattern)
+    users = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    print(f"🧹 Removidos: {users} usuários, {diagnoses} diagnósticos, {responses} respostas sintéticas")
+
+
+def load_catalogue_items(conn):
+    """(id, código do pilar, framework) de todas as questões, ordenadas por id"""
+    catalogue = open_catalogue(conn)
+    items = []
+    for item_id in sorted(catalogue.item_ids):
+        _, code, _, framework = catalogue.pillar(catalogue.item_path(item_id)[2])
+        items.append((item_id, code, framework))
+    return items
+
+
+def _weighted_choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate_chunk(chunk_index, config):
+    """
+    Gera e grava (COPY, uma transação) os usuários do bloco `chunk_index`
+    com seus diagnósticos e respostas. Roda em um processo worker.
+    """
+    profile = config['profile']
+    seed = config['seed']
+    rng = random.Random(f"{seed}:{chunk_index}")
+
+    # Dificuldade de cada questão: igual em todos os blocos/workers
+    item_rng = random.Random(f"{seed}:items")
+    items_by_framework = {}
+    for item_id, pillar_code, framework in config['items']:
+        difficulty = item_rng.gauss(0, profile['item_spread'])
+        items_by_framework.setdefault(framework, []).append((item_id, pillar_code, difficulty))
+    items_by_framework['ESG_GRI'] = items_by_framework.get('ESG', []) + items_by_framework.get('GRI', [])
+    frameworks = {name: weight for name, weight in profile['frameworks'].items()
+                  if items_by_framework.get(name)}
+
+    na_rates = profile['not_applicable_rate']
+    end = datetime.combine(date.fromisoformat(config['end_date']), datetime.min.time())
+    first_user = chunk_index * USERS_PER_CHUNK
+    last_user = min(first_user + USERS_PER_CHUNK, config['users'])
+
+    users, diagnoses, responses = io.StringIO(), io.StringIO(), io.StringIO()
+    counts = {'users': 0, 'diagnoses': 0, 'responses': 0}
+
+    for user_index in range(first_user, last_user):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        size = _weighted_choice(rng, profile['company_sizes'])
+        sector = _weighted_choice(rng, profile['sectors'])
+        created = end - timedelta(days=config['days'], seconds=rng.randrange(86400 * config['days']))
+        # Campos livres: só caracteres que dispensam escape no COPY
+        users.write(f"{user_id}\tloadtest-{seed}-{user_index}@{SYNTHETIC_EMAIL_DOMAIN}\t-\t"
+                    f"Usuário {user_index}\tEmpresa {user_index}\t{size}\t{sector}\t"
+                    f"{EMPLOYEES_BY_SIZE.get(size, '1-9')}\t{_timestamp(created)}\t{_timestamp(created)}\n")
+        counts['users'] += 1
+
+        company_maturity = profile['size_maturity'].get(size, 2.5) + rng.gauss(0, profile['company_spread'])
+        sector_shift = profile['sector_pillar_shift'].get(sector, {})
+        first_diagnosis = user_index * config['per_user']
+        for diagnosis_index in range(first_diagnosis, min(first_diagnosis + config['per_user'], config['diagnoses'])):
+            diagnosis_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            framework = _weighted_choice(rng, frameworks)
+            started = created + timedelta(seconds=rng.randrange(max(1, int((end - created).total_seconds()))))
+            completed = rng.random() < profile['completed_rate']
+            items = items_by_framework[framework]
+            if completed:
+                finished = min(end, started + timedelta(minutes=rng.randrange(15, 60 * 24 * 14)))
+                answered = items
+                diagnoses.write(f"{diagnosis_id}\t{user_id}\tcompleted\tfull\t{framework}\t"
+                                f"{_timestamp(started)}\t{_timestamp(finished)}\t{_timestamp(started)}\n")
+            else:
+                finished = started
+                answered = items[:rng.randrange(len(items))]
+                diagnoses.write(f"{diagnosis_id}\t{user_id}\tin_progress\tfull\t{framework}\t"
+                                f"{_timestamp(started)}\t\\N\t{_timestamp(started)}\n")
+            counts['diagnoses'] += 1
+
+            answered_at = _timestamp(finished)
+            for item_id, pillar_code, difficulty in answered:
+                if rng.random() < na_rates.get(pillar_code, na_rates['default']):
+                    value = 0
+                else:
+                    mean = (company_maturity + profile['pillar_shift'].get(pillar_code, 0.0)
+                            + sector_shift.get(pillar_code, 0.0) - difficulty)
+                    value = min(5, max(1, round(rng.gauss(mean, profile['response_spread']))))
+                responses.write(f"{diagnosis_id}\t{item_id}\t{EVALUATION_LABELS[value]}\t{value}\t"
+                                f"{value}\t{answered_at}\n")
+            counts['responses'] += len(answered)
+
+    started = time.perf_counter()
+    with get_pool(config['dsn'], minconn=1, maxconn=1).connection() as conn:
+        cursor = conn.cursor()
+        for table, columns, buffer in (
+            ('users', 'id, email, password_hash, name, company_name, company_size, sector, '
+                      'employees_range, created_at, updated_at', users),
+            ('diagnoses', 'id, user_id, status, type, framework, started_at, completed_at, created_at', diagnoses),
+            ('responses', 'diagnosis_id, assessment_item_id, evaluation, evaluation_value, score, created_at',
+             responses),
+        ):
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+        conn.commit()
+        cursor.close()
+    counts['copy_seconds'] = time.perf_counter() - started
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gerador de diagnósticos e respostas sintéticos')
+    parser.add_argument('--diagnoses', type=int, default=10000, help='Total de diagnósticos')
+    parser.add_argument('--diagnoses-per-user', type=int, default=2, help='Diagnósticos por usuário')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processos em paralelo')
+    parser.add_argument('--seed', type=int, default=42, help='Semente (mesma semente = mesmos dados)')
+    parser.add_argument('--end-date', default=date.today().isoformat(),
+                        help='Data final dos diagnósticos (AAAA-MM-DD); entra na determinística')
+    parser.add_argument('--days', type=int, default=365, help='Janela de datas dos cadastros, em dias')
+    parser.add_argument('--profile', help='JSON com distribuições (sobrescreve DEFAULT_PROFILE)')
+    parser.add_argument('--create-schema', action='store_true',
+                        help='Cria users/diagnoses/responses/diagnosis_scores se não existirem')
+    parser.add_argument('--reset', action='store_true', help='Remove a carga sintética anterior antes de gerar')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🧪 GREENA - Gerador de Carga Sintética")
+    print("="*60 + "\n")
+
+    pool = get_pool()
+    with pool.connection() as conn:
+        if args.create_schema:
+            ensure_schema(conn)
+        if args.reset:
+            reset_synthetic_data(conn)
+        items = load_catalogue_items(conn)
+
+    if not items:
+        print("❌ Nenhuma questão no catálogo. Rode o seed_database.py antes.")
+        return
+    if args.diagnoses <= 0:
+        return
+
+    users = -(-args.diagnoses // args.diagnoses_per_user)
+    chunks = -(-users // USERS_PER_CHUNK)
+    config = {
+        'dsn': pool.dsn,
+        'seed': args.seed,
+        'profile': load_profile(args.profile),
+        'items': items,
+        'users': users,
+        'diagnoses': args.diagnoses,
+        'per_user': args.diagnoses_per_user,
+        'end_date': args.end_date,
+        'days': args.days,
+    }
+    print(f"📋 Catálogo: {len(items)} questões; gerando {args.diagnoses} diagnósticos de {users} usuários "
+          f"em {chunks} blocos ({args.workers} workers, semente {args.seed})")
+
+    totals = {'users': 0, 'diagnoses': 0, 'responses': 0}
+    started = time.perf_counter()
+    # spawn: os workers não herdam sockets do processo principal
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as executor:
+        futures = [executor.submit(generate_chunk, chunk, config) for chunk in range(chunks)]
+        for done, future in enumerate(as_completed(futures), 1):
+            counts = future.result()
+            for key in totals:
+                totals[key] += counts[key]
+            elapsed = time.perf_counter() - started
+            print(f"   ⚙️  bloco {done}/{chunks}: {totals['diagnoses']} diagnósticos, "
+                  f"{totals['responses']} respostas ({totals['responses'] / elapsed:,.0f} respostas/s)")
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        for table in ('users', 'diagnoses', 'responses'):
+            cursor.execute(f"ANALYZE {table};")
+        conn.commit()
+        cursor.close()
+    pool.closeall()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n🎉 TOTAL: {totals['users']} usuários, {totals['diagnoses']} diagnósticos e "
+          f"{totals['responses']} respostas em {elapsed:.1f}s\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+"""
+Serviço de ingestão de page views e eventos (asyncio + COPY em lote)
+Tira do caminho da requisição o INSERT síncrono do analytics.service
+(trackPageView/trackEvent): os eventos chegam por HTTP ou por um socket Unix,
+entram em uma fila limitada e são gravados com COPY em lotes disparados por
+tamanho (--batch-size) ou tempo (--flush-interval).
+
+- Backpressure: com a fila cheia o HTTP responde 503 (Retry-After) depois de
+  BACKPRESSURE_TIMEOUT; no socket a leitura simplesmente para até haver espaço
+- Falha do banco: o lote é reenviado com backoff (a fila enche e o
+  backpressure entra em ação, nada é descartado)
+- Encerramento (SIGTERM/SIGINT): para de aceitar conexões, esvazia a fila e
+  grava o último lote; o que não puder ser gravado vai para o arquivo de
+  spool, reenviado na próxima inicialização
+- activity_logs: eventos de usuários inexistentes são descartados (contados
+  nas métricas) em vez de derrubar o lote inteiro pela FK
+
+ENDPOINTS HTTP:
+  POST /page-views   {"path", "sessionId", "userId"?, "referrer"?, "userAgent"?, "ip"?} ou lista
+  POST /events       {"userId", "actionType", "description"?} ou lista
+  GET  /metrics      vazão, latência de flush (p50/p95), fila, descartes
+  GET  /health
+
+SOCKET UNIX (--socket): uma linha JSON por evento, com "type": "page_view" ou "event".
+
+INSTRUÇÕES DE USO:
+1. Configure DATABASE_URL no .env (ver db_pool.py)
+2. Execute: python ingest_events.py --port 8787
+3. Aponte o backend para http://127.0.0.1:8787/page-views (e /events)
+
+EXEMPLOS:
+  python ingest_events.py --batch-size 2000 --flush-interval 1
+  python ingest_events.py --socket /tmp/greena-ingest.sock
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from db_pool import backoff_delay, get_pool
+from seed_database import copy_rows
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 0.5           # segundos entre o primeiro evento do lote e o flush
+BACKPRESSURE_TIMEOUT = 0.5     # espera por espaço na fila antes do 503
+MAX_BODY_BYTES = 1024 * 1024
+SPOOL_PATH = os.getenv('INGEST_SPOOL', 'ingest_spool.jsonl')
+
+PAGE_VIEW_COLUMNS = ('path', 'user_id', 'session_id', 'referrer', 'user_agent', 'ip', 'created_at')
+ACTIVITY_COLUMNS = ('user_id', 'action_type', 'description', 'created_at')
+
+HTTP_STATUS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+               413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+def _now():
+    """Horário UTC no formato TIMESTAMP(3) do Prisma"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def _text(data, key, required=False):
+    value = data.get(key)
+    if value is None or value == '':
+        if required:
+            raise ValueError(f"campo obrigatório ausente: {key}")
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"campo {key} deve ser texto")
+    return value
+
+
+def parse_page_view(data):
+    if not isinstance(data, dict):
+        raise ValueError("page view deve ser um objeto JSON")
+    return ('page_view', (_text(data, 'path', True), _text(data, 'userId'), _text(data, 'sessionId', True),
+                          _text(data, 'referrer'), _text(data, 'userAgent'), _text(data, 'ip'), _now()))
+
+
+def parse_event(data):
+    if not isinstance(data, dict):
+        raise ValueError("evento deve ser um objeto JSON")
+    action_type = _text(data, 'actionType', True)
+    return ('event', (_text(data, 'userId', True), action_type,
+                      _text(data, 'description') or action_type, _now()))
+
+
+PARSERS = {'page_view': parse_page_view, 'event': parse_event}
+
+
+def write_batch(batch):
+    """
+    Grava um lote (lista de (tipo, linha)) em uma transação: COPY direto em
+    page_views; activity_logs via tabela temporária, só com usuários
+    existentes. Devolve (page views, eventos gravados, eventos descartados).
+    """
+    page_views = [row for kind, row in batch if kind == 'page_view']
+    events = [row for kind, row in batch if kind == 'event']
+    dropped = 0
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        if page_views:
+            copy_rows(cursor, 'page_views', PAGE_VIEW_COLUMNS, page_views)
+        if events:
+            cursor.execute("""
+                CREATE TEMP TABLE ingest_activity (
+                    user_id TEXT, action_type TEXT, description TEXT, created_at TIMESTAMP(3)
+                ) ON COMMIT DROP;
+            """)
+            copy_rows(cursor, 'ingest_activity', ACTIVITY_COLUMNS, events)
+            cursor.execute(f"""
+                INSERT INTO activity_logs ({', '.join(ACTIVITY_COLUMNS)})
+                SELECT a.user_id, a.action_type, a.description, a.created_at
+                FROM ingest_activity a JOIN users u ON u.id = a.user_id;
+            """)
+            dropped = len(events) - cursor.rowcount
+        conn.commit()
+        cursor.close()
+    return len(page_views), len(events) - dropped, dropped
+
+
+class IngestMetrics:
+    """Contadores e latência de flush (janela das últimas `window` gravações)"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._flush_seconds = deque(maxlen=window)
+        self._recent = deque(maxlen=window)    # (instante, linhas) para a vazão recente
+        self.started = time.monotonic()
+        self.received = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.page_views = 0
+        self.events = 0
+        self.dropped_events = 0
+        self.batches = 0
+        self.flush_failures = 0
+        self.spooled = 0
+
+    def record_flush(self, seconds, page_views, events, dropped):
+        with self._lock:
+            self.batches += 1
+            self.page_views += page_views
+            self.events += events
+            self.dropped_events += dropped
+            self._flush_seconds.append(seconds)
+            self._recent.append((time.monotonic(), page_views + events))
+
+    def snapshot(self, queue_depth=0):
+        with self._lock:
+            samples = sorted(self._flush_seconds)
+            recent = list(self._recent)
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] * 1000
+
+        now = time.monotonic()
+        last_minute = sum(rows for moment, rows in recent if now - moment <= 60)
+        uptime = now - self.started
+        return {
+            'uptime_seconds': round(uptime, 1),
+            'received': self.received,
+            'rejected_backpressure': self.rejected,
+            'invalid': self.invalid,
+            'written_page_views': self.page_views,
+            'written_events': self.events,
+            'dropped_events_unknown_user': self.dropped_events,
+            'batches': self.batches,
+            'flush_failures': self.flush_failures,
+            'spooled': self.spooled,
+            'queue_depth': queue_depth,
+            'rows_per_second': round((self.page_views + self.events) / uptime, 1) if uptime else 0.0,
+            'rows_per_second_last_minute': round(last_minute / min(60.0, uptime or 1.0), 1),
+            'flush_p50_ms': round(percentile(50), 2),
+            'flush_p95_ms': round(percentile(95), 2),
+            'flush_max_ms': round(samples[-1] * 1000, 2) if samples else 0.0,
+        }
+
+    def print_report(self, queue_depth=0):
+        data = self.snapshot(queue_depth)
+        print(f"📈 Ingestão: {data['received']} recebidos, {data['written_page_views']} page views e "
+              f"{data['written_events']} eventos gravados em {data['batches']} lotes "
+              f"({data['rows_per_second_last_minute']:.0f}/s no último minuto), flush p50 "
+              f"{data['flush_p50_ms']:.1f} ms / p95 {data['flush_p95_ms']:.1f} ms, "
+              f"{data['rejected_backpressure']} recusados (fila cheia), {data['invalid']} inválidos, "
+              f"{data['dropped_events_unknown_user']} eventos sem usuário, fila {data['queue_depth']}")
+
+
+class IngestService:
+    """Fila limitada + um flusher que grava lotes por tamanho ou tempo"""
+
+    def __init__(self, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 spool_path=SPOOL_PATH):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.metrics = IngestMetrics()
+        self.closing = False
+
+    async def submit(self, event, timeout=BACKPRESSURE_TIMEOUT):
+        """Enfileira o evento; False se a fila continuar cheia após `timeout` (None: espera)"""
+        try:
+            if timeout is None:
+                await self.queue.put(event)
+            else:
+                await asyncio.wait_for(self.queue.put(event), timeout)
+        except asyncio.TimeoutError:
+            self.metrics.rejected += 1
+            return False
+        self.metrics.received += 1
+        return True
+
+    async def _next_batch(self):
+        """Espera o primeiro evento e junta os seguintes até o tamanho ou o prazo do lote"""
+        loop = asyncio.get_running_loop()
+        try:
+            batch = [await asyncio.wait_for(self.queue.get(), self.flush_interval)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self.closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch):
+        """
+        Grava o lote. Durante a operação as falhas são repetidas com backoff
+        (a fila enche e o backpressure segura os clientes); no encerramento o
+        lote vai para o spool. Devolve False se o lote foi para o spool.
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                written = await asyncio.to_thread(write_batch, batch)
+            except Exception as e:
+                self.metrics.flush_failures += 1
+                if self.closing:
+                    self._spool(batch)
+                    print(f"❌ Lote de {len(batch)} eventos não gravado ({str(e).strip()}); salvo em {self.spool_path}")
+                    return False
+                delay = backoff_delay(min(attempt, 6))
+                attempt += 1
+                print(f"⚠️  Flush falhou ({str(e).strip()}); nova tentativa em {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.metrics.record_flush(time.perf_counter() - started, *written)
+            return True
+
+    async def run_flusher(self):
+        while not (self.closing and self.queue.empty()):
+            batch = await self._next_batch()
+            if batch and not await self._flush(batch):
+                # Banco indisponível no encerramento: o resto da fila vai direto para o spool
+                remaining = []
+                while not self.queue.empty():
+                    remaining.append(self.queue.get_nowait())
+                if remaining:
+                    self._spool(remaining)
+                    print(f"❌ {len(remaining)} eventos restantes salvos em {self.spool_path}")
+
+    def _spool(self, batch):
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            for kind, row in batch:
+                f.write(json.dumps([kind, row], ensure_ascii=False) + '\n')
+        self.metrics.spooled += len(batch)
+
+    def load_spool(self):
+        """Reenfileira os eventos salvos no último encerramento (antes de aceitar conexões)"""
+        if not os.path.exists(self.spool_path):
+            return 0
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            events = [tuple(json.loads(line)) for line in f if line.strip()]
+        os.remove(self.spool_path)
+        for kind, row in events:
+            # Sem limite aqui: o spool pode passar do tamanho da fila
+            self.queue._queue.append((kind, tuple(row)))
+        return len(events)
+
+    # HTTP -----------------------------------------------------------------
+
+    async def _route(self, method, path, body):
+        if method == 'GET' and path == '/metrics':
+            return 200, self.metrics.snapshot(self.queue.qsize())
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'closing' if self.closing else 'ok', 'queue_depth': self.queue.qsize()}
+        parser = {'/page-views': parse_page_view, '/events': parse_event}.get(path)
+        if method != 'POST' or parser is None:
+            return 404, {'error': 'rota não encontrada'}
+        if self.closing:
+            return 503, {'error': 'serviço encerrando'}
+        try:
+            data = json.loads(body or b'null')
+            events = [parser(item) for item in (data if isinstance(data, list) else [data])]
+        except ValueError as e:
+            self.metrics.invalid += 1
+            return 400, {'error': str(e)}
+        for accepted, event in enumerate(events):
+            if not await self.submit(event):
+                return 503, {'error': 'fila cheia', 'accepted': accepted}
+        return 202, {'accepted': len(events)}
+
+    async def handle_http(self, reader, writer):
+        """HTTP/1.1 mínimo com keep-alive (o suficiente para o backend e curl)"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = 413, {'error': 'corpo muito grande'}, False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self._route(method, target.split('?', 1)[0], body)
+                    keep_alive = headers.get('connection', '').lower() != 'close' and not self.closing
+                content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                extra = 'Retry-After: 1\r\n' if status == 503 else ''
+                writer.write((f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+                              f"Content-Type: application/json; charset=utf-8\r\n"
+                              f"Content-Length: {len(content)}\r\n{extra}"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1')
+                             + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # Socket Unix ----------------------------------------------------------
+
+    async def handle_socket(self, reader, writer):
+        """Uma linha JSON por evento; com a fila cheia a leitura espera (backpressure do socket)"""
+        try:
+            async for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                    event = PARSERS[data.get('type')](data)
+                except (ValueError, KeyError, AttributeError):
+                    self.metrics.invalid += 1
+                    continue
+                await self.submit(event, timeout=None)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    service = IngestService(args.queue_size, args.batch_size, args.flush_interval)
+    restored = service.load_spool()
+    if restored:
+        print(f"♻️  {restored} eventos recuperados do spool")
+
+    servers = [await asyncio.start_server(service.handle_http, args.host, args.port)]
+    print(f"✅ HTTP em http://{args.host}:{args.port} (POST /page-views, POST /events, GET /metrics)")
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        servers.append(await asyncio.start_unix_server(service.handle_socket, args.socket))
+        print(f"✅ Socket Unix em {args.socket}")
+
+    flusher = asyncio.create_task(service.run_flusher())
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.report_interval)
+            service.metrics.print_report(service.queue.qsize())
+
+    reporter = asyncio.create_task(report()) if args.report_interval else None
+    await stop.wait()
+
+    print("\n🛑 Encerrando: novas conexões recusadas, esvaziando a fila...")
+    service.closing = True
+    for server in servers:
+        server.close()
+    for server in servers:
+        await server.wait_closed()
+    await flusher
+    if reporter:
+        reporter.cancel()
+    if args.socket and os.path.exists(args.socket):
+        os.remove(args.socket)
+    service.metrics.print_report(service.queue.qsize())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestão de page views e eventos em lote')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--socket', help='Também aceita eventos (JSON por linha) neste socket Unix')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='Eventos na fila antes do backpressure')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Eventos por COPY')
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL,
+                        help='Segundos máximos de espera para completar um lote')
+    parser.add_argument('--report-interval', type=float, default=60,
+                        help='Segundos entre resumos de métricas no log (0 desliga)')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("📥 GREENA - Ingestão de Page Views e Eventos")
+    print("="*60)
+
+    try:
+        asyncio.run(serve(args))
+    finally:
+        get_pool().metrics.print_report()
+        get_pool().closeall()
+        print("Conexão com banco encerrada.\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+"""
+Pontuação ao vivo: consumidor das mudanças de responses (CDC)
+Hoje as pontuações só são calculadas ao finalizar o diagnóstico, e o progresso
+e as pontuações parciais (getProgress / calculatePartialScores) refazem as
+contas sobre todas as respostas a cada requisição. Aqui um consumidor de longa
+duração recebe as mudanças em tempo real e mantém as pontuações prontas:
+
+- triggers em responses (migrações 0011 e 0012 de schema_migrations.py; os
+  mesmos que atualizam diagnosis_aggregates) gravam cada mudança (valor
+  antigo e novo) na fila response_changes e fazem NOTIFY
+- o consumidor escuta o canal (LISTEN, conexão direta: o PgBouncer do Neon
+  não entrega notificações) e, no máximo a cada CHECKPOINT_INTERVAL
+  segundos, grava o checkpoint: lê as linhas de pilar e tema de
+  diagnosis_aggregates dos diagnósticos que saíram da fila (os triggers já
+  as atualizaram na mesma transação da mudança) e grava diagnosis_scores e
+  diagnosis_theme_scores (mesma regra e mesma gravação do
+  score_diagnoses.py); as colunas legadas de diagnoses só mudam para
+  diagnósticos concluídos, nunca com parciais
+- as linhas da fila são apagadas na mesma transação do checkpoint: se o
+  processo cair, a próxima execução retoma do último checkpoint. Cada
+  checkpoint recalcula os diagnósticos a partir dos agregados (não soma
+  deltas), então reprocessar uma mudança não altera o resultado
+- live_scores() responde progresso e pontuações parciais lendo só os valores
+  prontos (detalhe por tema: diagnosis_aggregates.pillar_breakdowns)
+
+Replicação lógica (pgoutput/test_decoding) exigiria wal_level=logical e uma
+conexão de replicação, que o endpoint -pooler do Neon não aceita; a fila com
+triggers dá a mesma retomada pelo último checkpoint (id da fila no lugar do
+LSN) pela conexão comum. Um consumidor por banco (advisory lock de sessão).
+
+Quando o catálogo muda (catalogue_version), os agregados são reconstruídos
+(diagnosis_aggregates.py) e todas as pontuações são recalculadas em lote
+(score_diagnoses).
+
+INSTRUÇÕES DE USO:
+  python live_scoring.py                        # consumidor contínuo
+  python live_scoring.py --diagnosis <id>       # progresso e parciais prontos
+
+  from live_scoring import live_scores
+  scores = live_scores(conn, diagnosis_id)
+
+EXEMPLOS:
+  python live_scoring.py --once                 # processa a fila e sai
+  python live_scoring.py --rebuild --once       # reconstrói os agregados e recalcula tudo
+  python live_scoring.py --verify               # compara os agregados com as respostas
+  python live_scoring.py --probe 20             # com o consumidor rodando: mede o atraso ponta a ponta
+"""
+
+import argparse
+import select
+import time
+from functools import lru_cache
+
+import numpy as np
+import psycopg2
+
+from catalogue_snapshot import open_catalogue
+from db_pool import TRANSIENT_ERRORS, ConnectionPool, PoolTimeout, backoff_delay, direct_dsn, get_pool
+from diagnosis_aggregates import ensure_current
+from diagnosis_aggregates import rebuild as rebuild_aggregates
+from diagnosis_aggregates import verify as verify_aggregates
+from generate_diagnoses import EVALUATION_LABELS
+from schema_migrations import migrate
+from score_diagnoses import (DIAGNOSIS_FRAMEWORKS, LEGACY_PILLAR_COLUMNS, CatalogueIndex, compute_scores,
+                             js_round, rule_score, score_pillars, write_scores)
+from seed_database import SeedReport
+
+CHANNEL = 'response_changes'
+
+# Intervalo mínimo entre checkpoints: mudanças nesse intervalo são gravadas juntas
+CHECKPOINT_INTERVAL = 0.25
+
+# Sem NOTIFY nesse tempo, confere a fila assim mesmo (notificação perdida numa reconexão)
+IDLE_POLL = 5.0
+
+# Mudanças lidas da fila por comando
+DRAIN_BATCH = 50000
+
+# Chave do advisory lock: um consumidor por banco (diagnosis_aggregates usa 4711004)
+ADVISORY_LOCK_KEY = 4711005
+
+
+def is_current(cursor):
+    """True se os totais foram montados com a versão atual do catálogo"""
+    cursor.execute("""
+        SELECT c.checkpointed_at IS NOT NULL AND c.catalogue_version IS NOT DISTINCT FROM v.version
+        FROM live_scoring_checkpoint c LEFT JOIN catalogue_version v ON true;
+    """)
+    return cursor.fetchone()[0]
+
+
+def rebuild(conn, report, force=False):
+    """
+    Agregados em dia com o catálogo (reconstruídos se ele mudou ou com
+    `force`) e pontuações de todos os diagnósticos recalculadas em lote. A
+    fila é esvaziada na mesma transação: o recálculo lê responses depois e
+    já inclui essas mudanças. Devolve o número de diagnósticos.
+    """
+    with report.phase('agregados'):
+        if force:
+            rebuild_aggregates(conn)
+        else:
+            ensure_current(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM response_changes;")
+        cursor.execute("""
+            UPDATE live_scoring_checkpoint
+            SET catalogue_version = (SELECT catalogue_version FROM diagnosis_aggregate_state),
+                checkpointed_at = CURRENT_TIMESTAMP;
+        """)
+        result = compute_scores(conn, report)
+        write_scores(conn, report, result)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(result['diagnosis_ids'])
+
+
+def aggregate_scores(index, diagnoses, aggregates):
+    """
+    Pontuações no formato do compute_scores (entrada do write_scores) a partir
+    de diagnosis_aggregates: `diagnoses` = [(id, framework)] e `aggregates` =
+    [(id, nível, nó, soma, válidas)] dos níveis 'pillar' e 'theme'. Nós fora
+    do catálogo atual são ignorados.
+    """
+    diagnosis_ids = [diagnosis_id for diagnosis_id, _ in diagnoses]
+    frameworks = [framework or 'ESG' for _, framework in diagnoses]
+    row_of = {diagnosis_id: row for row, diagnosis_id in enumerate(diagnosis_ids)}
+    pillar_position = {pillar_id: column for column, pillar_id in enumerate(index.pillar_ids.tolist())}
+    theme_position = {theme_id: column for column, theme_id in enumerate(index.theme_ids.tolist())}
+    pillars, themes = len(pillar_position), len(theme_position)
+
+    sums = np.zeros(len(diagnosis_ids) * pillars, dtype=np.int64)
+    valid = np.zeros(len(diagnosis_ids) * pillars, dtype=np.int64)
+    found = []
+    for diagnosis_id, level, node_id, score_sum, valid_count in aggregates:
+        row = row_of.get(diagnosis_id)
+        if row is None:
+            continue
+        if level == 'pillar' and node_id in pillar_position:
+            key = row * pillars + pillar_position[node_id]
+            sums[key], valid[key] = score_sum, valid_count
+        elif level == 'theme' and node_id in theme_position:
+            found.append((row * themes + theme_position[node_id], score_sum, valid_count))
+    found.sort()
+    theme_keys = np.array([entry[0] for entry in found], dtype=np.int64)
+    theme_sums = np.array([entry[1] for entry in found], dtype=np.int64)
+    theme_valid = np.array([entry[2] for entry in found], dtype=np.int64)
+
+    pillar_scores, mask, overall = score_pillars(index, frameworks, sums, valid)
+    return {
+        'index': index,
+        'diagnosis_ids': diagnosis_ids,
+        'frameworks': frameworks,
+        'pillar_scores': pillar_scores,
+        'mask': mask,
+        'overall': overall,
+        'theme_keys': theme_keys,
+        'theme_scores': rule_score(theme_sums, theme_valid),
+    }
+
+
+def checkpoint(conn, report, index, diagnosis_ids, last_change_id, changes):
+    """
+    Grava, na transação que apagou as mudanças da fila, as pontuações (pilares
+    e temas) dos diagnósticos alterados, lidas dos agregados; o commit fica
+    com write_scores. Devolve o número de diagnósticos gravados.
+    """
+    cursor = conn.cursor()
+    with report.phase('leitura diagnosis_aggregates'):
+        cursor.execute("SELECT id, framework FROM diagnoses WHERE id = ANY(%s) ORDER BY id;", (diagnosis_ids,))
+        diagnoses = cursor.fetchall()
+        cursor.execute("""
+            SELECT diagnosis_id, level, node_id, score_sum, valid_count
+            FROM diagnosis_aggregates
+            WHERE diagnosis_id = ANY(%s) AND level IN ('pillar', 'theme');
+        """, (diagnosis_ids,))
+        aggregates = cursor.fetchall()
+        cursor.execute("""
+            UPDATE live_scoring_checkpoint SET
+                last_change_id = greatest(last_change_id, %s), changes = changes + %s,
+                checkpointed_at = CURRENT_TIMESTAMP;
+        """, (last_change_id, changes))
+    cursor.close()
+    result = aggregate_scores(index, diagnoses, aggregates)
+    write_scores(conn, report, result)
+    return len(result['diagnosis_ids'])
+
+
+def consume(conn, index, report, batch=DRAIN_BATCH):
+    """
+    Esvazia a fila em lotes e grava o checkpoint dos diagnósticos alterados
+    (uma transação). Devolve (mudanças, diagnósticos gravados).
+    """
+    cursor = conn.cursor()
+    changes, last_change_id = 0, 0
+    diagnosis_ids = set()
+    try:
+        with report.phase('leitura da fila'):
+            while True:
+                cursor.execute("""
+                    DELETE FROM response_changes
+                    WHERE id IN (SELECT id FROM response_changes ORDER BY id LIMIT %s)
+                    RETURNING id, diagnosis_id;
+                """, (batch,))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                changes += len(rows)
+                last_change_id = max(last_change_id, max(row[0] for row in rows))
+                diagnosis_ids.update(row[1] for row in rows)
+                if len(rows) < batch:
+                    break
+        if not changes:
+            conn.rollback()
+            return 0, 0
+        return changes, checkpoint(conn, report, index, sorted(diagnosis_ids), last_change_id, changes)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _listen(listener_pool):
+    """Conexão direta em autocommit com o advisory lock do consumidor e LISTEN; None se outro consumidor roda"""
+    conn = listener_pool.acquire()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s);", (ADVISORY_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            listener_pool.release(conn, discard=True)
+            return None
+        cursor.execute(f"LISTEN {CHANNEL};")
+    return conn
+
+
+def _wait(listener, timeout):
+    """Espera um NOTIFY (ou o timeout); descarta os acumulados"""
+    if not listener.notifies:
+        select.select([listener], [], [], timeout)
+    listener.poll()
+    listener.notifies.clear()
+
+
+def run(pool, once=False, force_rebuild=False, interval=CHECKPOINT_INTERVAL):
+    """Laço do consumidor: processa a fila a cada NOTIFY (no máximo a cada `interval` segundos)"""
+    listener_pool = ConnectionPool(direct_dsn(pool.dsn), minconn=1, maxconn=1,
+                                   application_name='greena-live-scoring')
+    listener = _listen(listener_pool)
+    if listener is None:
+        print("❌ Outro consumidor já está processando a fila (advisory lock ocupado)")
+        return
+    index = None
+    last_checkpoint = 0.0
+    failures = 0
+    try:
+        while True:
+            report = SeedReport('live_scoring')
+            try:
+                with pool.connection() as conn:
+                    cursor = conn.cursor()
+                    current = is_current(cursor)
+                    conn.commit()
+                    cursor.close()
+                    if force_rebuild or not current:
+                        started = time.perf_counter()
+                        diagnoses = rebuild(conn, report, force_rebuild)
+                        index = None
+                        force_rebuild = False
+                        print(f"✅ Agregados em dia e pontuações de {diagnoses} diagnósticos recalculadas em "
+                              f"{time.perf_counter() - started:.1f}s")
+                    if index is None:
+                        index = CatalogueIndex(open_catalogue(conn))
+
+                    started = time.perf_counter()
+                    changes, written = consume(conn, index, report)
+                    if changes:
+                        last_checkpoint = time.monotonic()
+                        print(f"✅ {changes} mudanças, {written} diagnósticos gravados em "
+                              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+                failures = 0
+            except (psycopg2.Error, PoolTimeout) as e:
+                delay = backoff_delay(failures)
+                failures += 1
+                print(f"⚠️  Ciclo falhou ({str(e).strip()}); retomando do último checkpoint em {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if once:
+                return
+            try:
+                _wait(listener, IDLE_POLL)
+            except TRANSIENT_ERRORS:
+                listener_pool.release(listener, discard=True)
+                listener = None
+                while listener is None:
+                    time.sleep(backoff_delay(0))
+                    listener = _listen(listener_pool)
+            # Agrupa as mudanças que chegarem até o próximo checkpoint permitido
+            wait = last_checkpoint + interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+    finally:
+        if listener is not None:
+            listener_pool.release(listener, discard=True)
+        listener_pool.closeall()
+
+
+@lru_cache(maxsize=4)
+def _pillars(catalogue):
+    """[(id, código, nome, framework, questões)] na ordem do catálogo"""
+    questions = np.bincount(
+        np.asarray(catalogue.theme_pillar, dtype=np.int64)[
+            np.asarray(catalogue.criteria_theme, dtype=np.int64)[np.asarray(catalogue.item_criteria, dtype=np.int64)]],
+        minlength=len(catalogue.pillar_ids))
+    return [(pillar_id, code, name, framework, int(count))
+            for pillar_id, code, name, framework, count in zip(catalogue.pillar_ids, catalogue.pillar_codes,
+                                                               catalogue.pillar_names, catalogue.pillar_frameworks,
+                                                               questions.tolist())]
+
+
+def live_scores(conn, diagnosis_id, catalogue=None):
+    """
+    Progresso (mesmo formato de getProgress) e pontuações parciais (de
+    calculatePartialScores, sem themeScores) a partir do último checkpoint,
+    em uma consulta. None se o diagnóstico não existe.
+    """
+    if catalogue is None:
+        catalogue = open_catalogue(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT d.framework, d.status, a.answered, s.pillar_ids, s.scores, c.checkpointed_at
+            FROM diagnoses d
+            CROSS JOIN live_scoring_checkpoint c
+            CROSS JOIN LATERAL (
+                SELECT coalesce(sum(answered_count), 0)::int AS answered
+                FROM diagnosis_aggregates WHERE diagnosis_id = d.id AND level = 'pillar'
+            ) a
+            CROSS JOIN LATERAL (
+                SELECT array_agg(pillar_id) AS pillar_ids, array_agg(score) AS scores
+                FROM diagnosis_scores WHERE diagnosis_id = d.id
+            ) s
+            WHERE d.id = %s;
+        """, (diagnosis_id,))
+        row = cursor.fetchone()
+        conn.commit()
+    finally:
+        cursor.close()
+    if row is None:
+        return None
+
+    framework, status, answered, pillar_ids, scores, checkpointed_at = row
+    framework = framework or 'ESG'
+    stored = dict(zip(pillar_ids or [], scores or []))
+    pillars = [pillar for pillar in _pillars(catalogue) if pillar[3] in DIAGNOSIS_FRAMEWORKS.get(framework, ('ESG',))]
+    total = sum(pillar[4] for pillar in pillars)
+    pillar_scores = {code: float(stored.get(pillar_id, 0)) for pillar_id, code, _, _, _ in pillars}
+    # Geral pelas pontuações de pilar (diagnoses.overall_score só é gravado ao concluir)
+    overall = float(js_round(np.mean(list(pillar_scores.values())))) if pillar_scores else 0.0
+    partial = {
+        'overall': overall,
+        'answeredCount': answered,
+        'totalCount': total,
+        'pillarScores': [{'code': code, 'name': name, 'score': pillar_scores[code]}
+                         for _, code, name, _, _ in pillars],
+        'isPartial': status != 'completed',
+    }
+    if framework in ('ESG', 'ESG_GRI'):
+        for code, column in LEGACY_PILLAR_COLUMNS.items():
+            partial[column.replace('_score', '')] = pillar_scores.get(code, 0)
+    return {
+        'progress': {
+            'total': total,
+            'answered': answered,
+            'remaining': total - answered,
+            'progress': int(np.floor(answered / total * 100 + 0.5)) if total else 0,
+        },
+        'partialScores': partial,
+        'checkpointedAt': checkpointed_at.isoformat() if checkpointed_at else None,
+    }
+
+
+def verify(conn):
+    """Agregados comparados com as respostas: (divergentes, faltando, mudanças ainda na fila)"""
+    extra, missing = verify_aggregates(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT count(*) FROM response_changes;")
+        return extra, missing, cursor.fetchone()[0]
+    finally:
+        conn.rollback()
+        cursor.close()
+
+
+def probe(conn, rounds):
+    """
+    Com o consumidor rodando: alterna o valor de uma resposta de um diagnóstico
+    em andamento e mede, a cada commit, quanto tempo até a mudança sair da
+    fila (checkpoint gravado). A resposta volta ao valor original no fim.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.id, r.evaluation_value FROM responses r
+        JOIN diagnoses d ON d.id = r.diagnosis_id
+        WHERE d.status = 'in_progress' AND r.evaluation_value > 0
+        LIMIT 1;
+    """)
+    row = cursor.fetchone()
+    conn.commit()
+    if row is None:
+        cursor.close()
+        return []
+    response_id, original = row
+    latencies = []
+    try:
+        for round_number in range(rounds):
+            value = original % 5 + 1 if round_number % 2 == 0 else original
+            cursor.execute("""
+                UPDATE responses SET evaluation = %s, evaluation_value = %s, score = %s WHERE id = %s;
+            """, (EVALUATION_LABELS[value], value, value * 20, response_id))
+            cursor.execute("SELECT currval('response_changes_id_seq');")
+            change_id = cursor.fetchone()[0]
+            conn.commit()
+            started = time.perf_counter()
+            while True:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM response_changes WHERE id = %s);", (change_id,))
+                pending = cursor.fetchone()[0]
+                conn.commit()
+                if not pending:
+                    break
+                if time.perf_counter() - started > 30:
+                    raise TimeoutError("a mudança não saiu da fila em 30s: o consumidor está rodando?")
+                time.sleep(0.005)
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        conn.rollback()
+        cursor.execute("""
+            UPDATE responses SET evaluation = %s, evaluation_value = %s, score = %s
+            WHERE id = %s AND evaluation_value <> %s;
+        """, (EVALUATION_LABELS[original], original, original * 20, response_id, original))
+        conn.commit()
+        cursor.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pontuação ao vivo a partir das mudanças de responses')
+    parser.add_argument('--once', action='store_true', help='Processa a fila uma vez e sai')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Reconstrói os agregados e recalcula todas as pontuações')
+    parser.add_argument('--interval', type=float, default=CHECKPOINT_INTERVAL,
+                        help=f'Segundos mínimos entre checkpoints (padrão: {CHECKPOINT_INTERVAL})')
+    parser.add_argument('--verify', action='store_true', help='Compara diagnosis_aggregates com as respostas')
+    parser.add_argument('--diagnosis', metavar='ID', help='Mostra progresso e parciais prontos de um diagnóstico')
+    parser.add_argument('--probe', type=int, metavar='N',
+                        help='Mede o atraso de N mudanças até o checkpoint (consumidor rodando em outro processo)')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("📡 GREENA - Pontuação ao Vivo (mudanças de responses)")
+    print("="*60)
+
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            migrate(conn)
+            if args.verify:
+                extra, missing, queued = verify(conn)
+                status = '✅' if extra == missing == 0 else ('⚠️ ' if queued else '❌')
+                print(f"{status} diagnosis_aggregates: {extra} linhas divergentes, {missing} faltando "
+                      f"({queued} mudanças ainda na fila)")
+            if args.probe:
+                latencies = probe(conn, args.probe)
+                if latencies:
+                    print(f"⏱️  {len(latencies)} mudanças até o checkpoint: p50 {np.percentile(latencies, 50):.0f} ms, "
+                          f"p95 {np.percentile(latencies, 95):.0f} ms, máx {max(latencies):.0f} ms")
+                else:
+                    print("⚠️  Nenhuma resposta de diagnóstico em andamento para a medição")
+            if args.diagnosis:
+                started = time.perf_counter()
+                scores = live_scores(conn, args.diagnosis)
+                elapsed = (time.perf_counter() - started) * 1000
+                if scores is None:
+                    print(f"❌ Diagnóstico {args.diagnosis} não encontrado")
+                else:
+                    progress, partial = scores['progress'], scores['partialScores']
+                    print(f"\n📋 {progress['answered']}/{progress['total']} questões ({progress['progress']}%), "
+                          f"geral {partial['overall']:.2f}{' (parcial)' if partial['isPartial'] else ''}")
+                    for pillar in partial['pillarScores']:
+                        print(f"  - {pillar['code']:<7} {pillar['score']:6.2f}  {pillar['name']}")
+                    print(f"⏱️  {elapsed:.1f} ms, checkpoint de {scores['checkpointedAt']}")
+        if args.verify or args.probe or args.diagnosis:
+            return
+
+        print(f"🔌 Escutando '{CHANNEL}' (checkpoint a cada {args.interval}s no máximo)...")
+        run(pool, once=args.once, force_rebuild=args.rebuild, interval=args.interval)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrompido (a fila retoma do último checkpoint)")
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Cliente compartilhado da API GraphQL do Railway
+Usado pelo railway_reconcile.py (e, por ele, pelo railway_deploy.py e pelo
+setup_railway_services.py) no lugar de um
+requests.post por operação (conexão nova, sem timeout e sem nova tentativa).
+
+- requests.Session com pool de conexões (keep-alive) e timeouts
+- novas tentativas com backoff exponencial e jitter em 429/5xx e falhas de
+  rede, respeitando Retry-After. Mutações que não são idempotentes
+  (projectCreate, serviceCreate) só repetem quando a requisição com certeza
+  não foi processada (falha ao conectar, 429); timeout de leitura e 5xx viram
+  RailwayUncertainError e quem chamou procura o recurso antes de repetir
+- limite de taxa no cliente (token bucket, RAILWAY_RATE_LIMIT req/s) para
+  não provocar o 429
+- execute_many: operações independentes (ex.: upsert de variáveis de vários
+  serviços) em paralelo, dentro do limite de taxa
+- MockRailway: servidor GraphQL local com latência e falhas configuráveis,
+  para testar o provisionamento sem tocar no Railway (--mock nos scripts)
+
+INSTRUÇÕES DE USO:
+  from railway_client import RailwayClient, get_railway_token
+  with RailwayClient(get_railway_token()) as client:
+      data = client.query("query { projects { edges { node { id name } } } }")
+
+EXEMPLOS:
+  python railway_client.py --mock                      # provisionamento de exemplo contra o mock
+  python railway_client.py --mock --latency 0.2 --error-rate 0.2
+  python railway_client.py --mock --lost-rate 0.3     # criações aplicadas com resposta 503
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+RAILWAY_API = "https://backboard.railway.app/graphql/v2"
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+MAX_RETRIES = int(os.getenv('RAILWAY_MAX_RETRIES', '5'))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Mutações que podem ser repetidas sem efeito extra (as demais, como
+# projectCreate e serviceCreate, criariam duplicatas)
+IDEMPOTENT_MUTATIONS = {'variableUpsert', 'variableCollectionUpsert', 'variableDelete'}
+
+# Limite de taxa do cliente (requisições/s e rajada) e operações simultâneas
+RATE_LIMIT = float(os.getenv('RAILWAY_RATE_LIMIT', '10'))
+RATE_BURST = 10
+MAX_WORKERS = 8
+
+
+class RailwayError(Exception):
+    """Erro HTTP não recuperável, erro GraphQL ou tentativas esgotadas"""
+
+
+class RailwayUncertainError(RailwayError):
+    """Mutação não idempotente sem resposta (timeout, 5xx): pode ter sido aplicada"""
+
+
+def get_railway_token():
+    """Obtém o token do Railway"""
+    token = os.environ.get('RAILWAY_TOKEN')
+    if not token:
+        print("❌ RAILWAY_TOKEN não encontrado!")
+        print("\n📋 Para obter o token:")
+        print("1. Acesse: https://railway.app/account/tokens")
+        print("2. Clique em 'Create Token'")
+        print("3. Copie o token")
+        print("4. Execute: set RAILWAY_TOKEN=seu_token_aqui")
+        print("5. Execute este script novamente")
+        sys.exit(1)
+    return token
+
+
+def retry_delay(attempt):
+    """Espera antes da tentativa `attempt` (0, 1, 2...): backoff exponencial com jitter total"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def is_idempotent(query):
+    """Queries e as mutações de IDEMPOTENT_MUTATIONS podem ser repetidas às cegas"""
+    text = query.strip()
+    if not text.startswith('mutation'):
+        return True
+    fields = re.search(r'\{\s*(\w+)', text)
+    return fields is not None and fields.group(1) in IDEMPOTENT_MUTATIONS
+
+
+def _not_sent(error):
+    """A falha aconteceu antes de a requisição chegar ao servidor (conexão não abriu)"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def create_or_find(client, label, operation, extract, lookup, failure=None):
+    """
+    Criação não idempotente: executa `operation` e devolve extract(data). Se o
+    resultado ficar incerto (RailwayUncertainError, ou `failure` de uma
+    tentativa anterior), procura o recurso com lookup() (pelo nome) e o
+    devolve quando já existe; só então tenta de novo.
+    """
+    for attempt in range(client.max_retries + 1):
+        if failure is None:
+            try:
+                return extract(client.query(*operation))
+            except RailwayUncertainError as e:
+                failure = e
+        found = lookup()
+        if found:
+            print(f"✅ {label} já existia (a resposta da criação se perdeu: {failure})")
+            return found
+        if attempt == client.max_retries:
+            raise RailwayError(f"{label}: {failure}")
+        delay = retry_delay(attempt)
+        print(f"⚠️  {label} não foi criado ({failure}); nova tentativa em {delay:.1f}s")
+        time.sleep(delay)
+        failure = None
+
+
+class RateLimiter:
+    """Token bucket: `rate` requisições/s com rajadas de até `burst`"""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver uma ficha; devolve os segundos esperados"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ClientMetrics:
+    """Requisições, novas tentativas, espera no limitador e latência (janela das últimas `window`)"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def record(self, seconds, throttled):
+        with self._lock:
+            self.requests += 1
+            self.throttled_seconds += throttled
+            self._latencies.append(seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] * 1000
+
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'failures': self.failures,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+            'latency_p50_ms': round(percentile(50), 2),
+            'latency_p95_ms': round(percentile(95), 2),
+        }
+
+    def print_report(self):
+        data = self.snapshot()
+        print(f"🔌 Railway: {data['requests']} requisições (p50 {data['latency_p50_ms']:.0f} ms, "
+              f"p95 {data['latency_p95_ms']:.0f} ms), {data['retries']} novas tentativas, "
+              f"{data['failures']} falhas, {data['throttled_seconds']:.1f}s no limite de taxa")
+
+
+class RailwayClient:
+    """Sessão HTTP compartilhada com timeouts, novas tentativas e limite de taxa"""
+
+    def __init__(self, token, api=RAILWAY_API, rate=RATE_LIMIT, burst=RATE_BURST, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        self.api = api
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate, burst)
+        self.metrics = ClientMetrics()
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def query(self, query, variables=None, idempotent=None):
+        """
+        Executa a operação GraphQL e devolve `data`; RailwayError em erro
+        definitivo. `idempotent` (padrão: is_idempotent(query)) decide se
+        timeouts de leitura e 5xx são repetidos ou viram RailwayUncertainError.
+        """
+        payload = {"query": query}
+        if variables:
+            payload["variables"] = variables
+        if idempotent is None:
+            idempotent = is_idempotent(query)
+
+        for attempt in range(self.max_retries + 1):
+            throttled = self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.api, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent and not _not_sent(e):
+                    self.metrics.record_failure()
+                    raise RailwayUncertainError(f"Sem resposta da mutação: {e}")
+                problem, delay = str(e), retry_delay(attempt)
+            else:
+                self.metrics.record(time.perf_counter() - started, throttled)
+                if response.status_code == 200:
+                    data = response.json()
+                    if data.get('errors'):
+                        self.metrics.record_failure()
+                        raise RailwayError(f"Erro GraphQL: {data['errors']}")
+                    return data.get('data')
+                if response.status_code not in RETRY_STATUS:
+                    self.metrics.record_failure()
+                    raise RailwayError(f"Erro API: {response.status_code} {response.text[:500]}")
+                if not idempotent and response.status_code != 429:
+                    self.metrics.record_failure()
+                    raise RailwayUncertainError(f"HTTP {response.status_code} na mutação")
+                problem, delay = f"HTTP {response.status_code}", retry_delay(attempt)
+                retry_after = response.headers.get('Retry-After')
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+            if attempt == self.max_retries:
+                self.metrics.record_failure()
+                raise RailwayError(f"{problem} após {self.max_retries + 1} tentativas")
+            self.metrics.record_retry()
+            print(f"⚠️  Railway: {problem}; nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+
+    def execute_many(self, operations):
+        """
+        Executa em paralelo as operações (query, variables) independentes.
+        Devolve, na mesma ordem, o `data` de cada uma ou o RailwayError.
+        """
+        def run(operation):
+            try:
+                return self.query(*operation)
+            except RailwayError as e:
+                return e
+
+        if len(operations) <= 1:
+            return [run(operation) for operation in operations]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(operations))) as executor:
+            return list(executor.map(run, operations))
+
+
+# Servidor de teste ------------------------------------------------------------
+
+OPERATIONS = ('variableCollectionUpsert', 'variableUpsert', 'variableDelete', 'serviceCreate', 'projectCreate',
+              'variables', 'projects')
+
+
+class MockRailway:
+    """
+    Servidor GraphQL local que imita as operações usadas pelos scripts
+    (projects, projectCreate, serviceCreate, variables, variableUpsert,
+    variableCollectionUpsert, variableDelete), com latência fixa e falhas
+    429/503 sorteadas. `lost_rate`: fração das operações aplicadas que ainda
+    assim respondem 503 (resposta perdida). Cada projeto nasce com o ambiente
+    production; como no Railway, as variáveis são de (ambiente, serviço) e
+    só são lidas com variables(projectId, environmentId, serviceId).
+    """
+
+    def __init__(self, latency=0.05, error_rate=0.0, rate_limit_rate=0.0, lost_rate=0.0, port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.lost_rate = lost_rate
+        self.projects = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/graphql/v2"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def variables(self, project_id, environment_id, service_id):
+        """Variáveis do serviço no ambiente (None se o projeto, ambiente ou serviço não existir)"""
+        project = self.projects.get(project_id)
+        if project is None or environment_id not in project['environments'] or service_id not in project['services']:
+            return None
+        return project['variables'].setdefault((environment_id, service_id), {})
+
+    def _project(self, project_id):
+        project = self.projects[project_id]
+        return {
+            'id': project_id,
+            'name': project['name'],
+            'environments': {'edges': [{'node': {'id': environment_id, 'name': name}}
+                                       for environment_id, name in project['environments'].items()]},
+            'services': {'edges': [{'node': {'id': service_id, 'name': service['name']}}
+                                   for service_id, service in project['services'].items()]},
+        }
+
+    def _resolve(self, query, variables):
+        operation = next((name for name in OPERATIONS if re.search(rf"\b{name}\b", query)), None)
+        inputs = variables.get('input', variables)
+        with self._lock:
+            if operation == 'projects':
+                return {'projects': {'edges': [{'node': self._project(project_id)} for project_id in self.projects]}}
+            if operation == 'projectCreate':
+                name = inputs.get('name') or re.search(r'name:\s*"([^"]*)"', query).group(1)
+                project_id = str(uuid.uuid4())
+                self.projects[project_id] = {'name': name, 'services': {}, 'variables': {},
+                                             'environments': {str(uuid.uuid4()): 'production'}}
+                return {'projectCreate': self._project(project_id)}
+            if operation == 'serviceCreate':
+                project = self.projects.get(inputs.get('projectId'))
+                if project is None:
+                    raise KeyError('projeto não encontrado')
+                service_id = str(uuid.uuid4())
+                project['services'][service_id] = {'name': inputs.get('name')}
+                return {'serviceCreate': {'id': service_id, 'name': inputs.get('name')}}
+            if operation in ('variables', 'variableUpsert', 'variableCollectionUpsert', 'variableDelete'):
+                target = self.variables(inputs.get('projectId'), inputs.get('environmentId'), inputs.get('serviceId'))
+                if target is None:
+                    raise KeyError('projeto, ambiente ou serviço não encontrado')
+                if operation == 'variables':
+                    return {'variables': dict(target)}
+                if operation == 'variableUpsert':
+                    target[inputs.get('name') or inputs.get('key')] = inputs.get('value')
+                    return {'variableUpsert': {'id': str(uuid.uuid4())}}
+                if operation == 'variableDelete':
+                    target.pop(inputs.get('name'), None)
+                    return {'variableDelete': True}
+                target.update(inputs.get('variables', {}))
+                return {'variableCollectionUpsert': True}
+        raise KeyError('operação não suportada pelo mock')
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                with mock._lock:
+                    mock.requests += 1
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                time.sleep(mock.latency)
+                if random.random() < mock.rate_limit_rate:
+                    return self._send(429, {'error': 'rate limited'}, {'Retry-After': '0.1'})
+                if random.random() < mock.error_rate:
+                    return self._send(503, {'error': 'unavailable'})
+                try:
+                    data = mock._resolve(body.get('query', ''), body.get('variables') or {})
+                except (KeyError, AttributeError) as e:
+                    return self._send(200, {'data': None, 'errors': [{'message': str(e)}]})
+                if random.random() < mock.lost_rate:
+                    return self._send(503, {'error': 'unavailable'})
+                self._send(200, {'data': data})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cliente da API do Railway (demonstração com servidor mock)')
+    parser.add_argument('--mock', action='store_true', help='Provisionamento de exemplo contra o MockRailway')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latência do mock (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de respostas 503 do mock')
+    parser.add_argument('--lost-rate', type=float, default=0.0,
+                        help='Fração de operações aplicadas que respondem 503 no mock')
+    parser.add_argument('--variables', type=int, default=20, help='Variáveis por serviço')
+    parser.add_argument('--services', type=int, default=4, help='Serviços criados')
+    parser.add_argument('--rate', type=float, default=RATE_LIMIT, help='Limite de taxa do cliente (req/s)')
+    args = parser.parse_args()
+
+    if not args.mock:
+        parser.error('use --mock (os scripts railway_deploy.py e setup_railway_services.py usam o cliente)')
+
+    print("\n" + "="*60)
+    print("🚂 GREENA - Cliente Railway (mock)")
+    print("="*60)
+
+    upsert = """
+    mutation VariableUpsert($input: VariableUpsertInput!) {
+        variableUpsert(input: $input) { id }
+    }
+    """
+    with MockRailway(latency=args.latency, error_rate=args.error_rate, lost_rate=args.lost_rate) as mock, \
+            RailwayClient('mock-token', api=mock.url, rate=args.rate) as client:
+        started = time.perf_counter()
+        environments = 'environments { edges { node { id } } }'
+        def find_project():
+            edges = client.query(f'query {{ projects {{ edges {{ node {{ id name {environments} }} }} }} }}')
+            return next((edge['node'] for edge in edges['projects']['edges']
+                         if edge['node']['name'] == 'GREENA ESG Platform'), None)
+
+        project = create_or_find(
+            client, 'Projeto GREENA ESG Platform',
+            (f'mutation($name: String!) {{ projectCreate(input: {{ name: $name }}) {{ id {environments} }} }}',
+             {'name': 'GREENA ESG Platform'}),
+            lambda data: data['projectCreate'], find_project)
+        project_id = project['id']
+        environment_id = project['environments']['edges'][0]['node']['id']
+        create_service = 'mutation ServiceCreate($input: ServiceCreateInput!) { serviceCreate(input: $input) { id } }'
+        names = [f"service-{i}" for i in range(args.services)]
+        creations = [(create_service, {'input': {'projectId': project_id, 'name': name}}) for name in names]
+        service_ids = []
+        for name, operation, result in zip(names, creations, client.execute_many(creations)):
+            if isinstance(result, RailwayUncertainError):
+                def find_service(name=name):
+                    edges = client.query('query { projects { edges { node { id services { edges { node { id name } } } } } } }')
+                    return next((service['node']['id'] for edge in edges['projects']['edges']
+                                 if edge['node']['id'] == project_id
+                                 for service in edge['node']['services']['edges']
+                                 if service['node']['name'] == name), None)
+                result = {'serviceCreate': {'id': create_or_find(
+                    client, f"Serviço {name}", operation, lambda data: data['serviceCreate']['id'],
+                    find_service, failure=result)}}
+            elif isinstance(result, RailwayError):
+                raise result
+            service_ids.append(result['serviceCreate']['id'])
+        operations = [(upsert, {'input': {'projectId': project_id, 'environmentId': environment_id,
+                                          'serviceId': service_id, 'name': f"VAR_{n}", 'value': str(n)}})
+                      for service_id in service_ids for n in range(args.variables)]
+        results = client.execute_many(operations)
+        elapsed = time.perf_counter() - started
+
+        failed = sum(isinstance(result, RailwayError) for result in results)
+        serial = (2 + args.services + len(operations)) * args.latency
+        print(f"✅ {args.services} serviços e {len(operations)} variáveis em {elapsed:.2f}s "
+              f"(serial: ~{serial:.2f}s só de latência), {failed} falhas")
+        client.metrics.print_report()
+        print(f"📦 Mock: {mock.requests} requisições recebidas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Reconciliador declarativo do ambiente Railway
+Lê o estado desejado (railway.services.json: projeto, ambiente, serviços e
+variáveis), busca o estado atual do projeto (uma query para projeto, ambientes
+e serviços e, em paralelo, as variáveis de cada serviço no ambiente), calcula
+a diferença e aplica só as mutações necessárias, em paralelo.
+
+- sem mudanças: 1 + N leituras (N = serviços do arquivo) e 0 escritas
+- projeto e serviços ausentes são criados; variáveis novas ou alteradas vão
+  num único variableCollectionUpsert por serviço (um redeploy por serviço)
+- variáveis que existem no Railway mas não no arquivo só são removidas com
+  --prune (as do próprio Railway, RAILWAY_*, nunca)
+- --dry-run mostra o plano sem escrever nada
+- criação de projeto/serviço sem resposta (timeout, 5xx) não é repetida às
+  cegas: o estado é relido e o recurso procurado pelo nome antes
+- segredos não ficam no arquivo: valores como "${DATABASE_URL}" são
+  preenchidos com as variáveis de ambiente (ou do .env) ao carregar
+
+INSTRUÇÕES DE USO:
+  export RAILWAY_TOKEN=seu_token
+  export DATABASE_URL=... JWT_SECRET=... JWT_REFRESH_SECRET=...
+  python railway_reconcile.py --dry-run                # mostra o plano
+  python railway_reconcile.py                          # aplica
+
+  from railway_reconcile import load_desired_state, reconcile
+  service_ids = reconcile(client, load_desired_state(), dry_run=True)
+
+EXEMPLOS:
+  python railway_reconcile.py --file railway.services.json --prune
+  python railway_reconcile.py --mock                   # cria tudo e reexecuta contra o MockRailway
+  python railway_reconcile.py --mock --lost-rate 0.5   # respostas perdidas nas criações
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from railway_client import (RAILWAY_API, MockRailway, RailwayClient, RailwayError, RailwayUncertainError,
+                            create_or_find, get_railway_token)
+
+# Carregar variáveis de ambiente (valores dos placeholders)
+load_dotenv()
+
+DESIRED_STATE = 'railway.services.json'
+
+# Placeholder de segredo no arquivo: "${NOME}" vem da variável de ambiente NOME
+PLACEHOLDER = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+# Variáveis geridas pelo próprio Railway: nunca removidas pelo --prune
+RESERVED_PREFIX = 'RAILWAY_'
+
+STATE_QUERY = """
+query {
+    projects {
+        edges {
+            node {
+                id
+                name
+                environments {
+                    edges {
+                        node {
+                            id
+                            name
+                        }
+                    }
+                }
+                services {
+                    edges {
+                        node {
+                            id
+                            name
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+# As variáveis no Railway são de (ambiente, serviço)
+VARIABLES_QUERY = """
+query($projectId: String!, $environmentId: String!, $serviceId: String) {
+    variables(projectId: $projectId, environmentId: $environmentId, serviceId: $serviceId)
+}
+"""
+
+PROJECT_CREATE = """
+mutation($name: String!) {
+    projectCreate(input: { name: $name }) {
+        id
+        name
+        environments {
+            edges {
+                node {
+                    id
+                    name
+                }
+            }
+        }
+    }
+}
+"""
+
+SERVICE_CREATE = """
+mutation($input: ServiceCreateInput!) {
+    serviceCreate(input: $input) {
+        id
+        name
+    }
+}
+"""
+
+VARIABLE_COLLECTION_UPSERT = """
+mutation($input: VariableCollectionUpsertInput!) {
+    variableCollectionUpsert(input: $input)
+}
+"""
+
+VARIABLE_DELETE = """
+mutation($input: VariableDeleteInput!) {
+    variableDelete(input: $input)
+}
+"""
+
+
+def load_desired_state(path=DESIRED_STATE, environ=None):
+    """
+    Lê e valida o arquivo de estado desejado e preenche os placeholders
+    ${NOME} com `environ` (padrão: os.environ). ValueError se estiver
+    incompleto ou se faltar alguma variável.
+    """
+    environ = os.environ if environ is None else environ
+    with open(path, encoding='utf-8') as f:
+        desired = json.load(f)
+
+    for key in ('project', 'environment', 'repo', 'services'):
+        if key not in desired:
+            raise ValueError(f"{path}: campo obrigatório ausente: {key}")
+    missing = set()
+    for name, service in desired['services'].items():
+        if 'rootDirectory' not in service:
+            raise ValueError(f"{path}: serviço {name} sem rootDirectory")
+        variables = service.setdefault('variables', {})
+        for key, value in variables.items():
+            if not isinstance(value, str):
+                raise ValueError(f"{path}: {name}.{key} deve ser texto (use \"{value}\")")
+            missing.update(placeholder for placeholder in PLACEHOLDER.findall(value) if placeholder not in environ)
+            variables[key] = PLACEHOLDER.sub(lambda match: environ.get(match.group(1), match.group(0)), value)
+    if missing:
+        raise ValueError(f"{path}: defina as variáveis de ambiente: {', '.join(sorted(missing))}")
+    return desired
+
+
+class MockEnvironment(dict):
+    """Ambiente do --mock: placeholders sem variável viram valores fictícios"""
+
+    def __contains__(self, key):
+        return True
+
+    def __missing__(self, key):
+        return f'mock-{key.lower()}'
+
+    def get(self, key, default=None):
+        return self[key]
+
+
+def fetch_current_state(client, desired, variables=True):
+    """
+    Estado atual: projeto (mesma regra de nome do setup_railway_services.py),
+    id do ambiente e {serviço: {id, variables}}. As variáveis dos serviços do
+    arquivo são lidas em paralelo no ambiente resolvido (variables=False
+    pula essas leituras e deixa {}).
+    """
+    data = client.query(STATE_QUERY)
+    for edge in data['projects']['edges']:
+        project = edge['node']
+        if desired['project'].lower() in project['name'].lower():
+            state = {
+                'project_id': project['id'],
+                'environment_id': _environment_id(project, desired['environment']),
+                'services': {
+                    service['node']['name']: {'id': service['node']['id'], 'variables': {}}
+                    for service in project['services']['edges']
+                },
+            }
+            if variables and state['environment_id']:
+                _fetch_variables(client, state, desired)
+            return state
+    return {'project_id': None, 'environment_id': None, 'services': {}}
+
+
+def _fetch_variables(client, state, desired):
+    names = [name for name in desired['services'] if name in state['services']]
+    operations = [(VARIABLES_QUERY, {'projectId': state['project_id'], 'environmentId': state['environment_id'],
+                                     'serviceId': state['services'][name]['id']})
+                  for name in names]
+    for name, result in zip(names, client.execute_many(operations)):
+        if isinstance(result, RailwayError):
+            raise RailwayError(f"Variáveis de {name} não puderam ser lidas: {result}")
+        state['services'][name]['variables'] = result['variables'] or {}
+
+
+def _environment_id(project, environment):
+    for edge in project['environments']['edges']:
+        if edge['node']['name'] == environment:
+            return edge['node']['id']
+    return None
+
+
+class Plan:
+    """Diferença entre o estado desejado e o atual"""
+
+    def __init__(self):
+        self.create_project = False
+        self.create_services = []
+        self.added = {}      # serviço -> {chave: valor}
+        self.changed = {}    # serviço -> {chave: valor}
+        self.removed = {}    # serviço -> [chave]
+        self.extra = {}      # serviço -> [chave] fora do arquivo, mantidas (sem --prune)
+
+    def upserts(self, service):
+        return {**self.added.get(service, {}), **self.changed.get(service, {})}
+
+    @property
+    def writes(self):
+        """Número de mutações que o plano vai executar"""
+        services = set(self.added) | set(self.changed)
+        return (int(self.create_project) + len(self.create_services) + len(services)
+                + sum(len(keys) for keys in self.removed.values()))
+
+    @property
+    def empty(self):
+        return self.writes == 0
+
+
+def diff_state(desired, current, prune=False):
+    """Calcula o Plan que leva o estado atual ao desejado"""
+    plan = Plan()
+    plan.create_project = current['project_id'] is None
+
+    for name, service in desired['services'].items():
+        wanted = service['variables']
+        existing = current['services'].get(name)
+        if existing is None:
+            plan.create_services.append(name)
+            if wanted:
+                plan.added[name] = dict(wanted)
+            continue
+
+        have = existing['variables']
+        added = {key: value for key, value in wanted.items() if key not in have}
+        changed = {key: value for key, value in wanted.items() if key in have and have[key] != value}
+        extra = sorted(key for key in have if key not in wanted and not key.startswith(RESERVED_PREFIX))
+        if added:
+            plan.added[name] = added
+        if changed:
+            plan.changed[name] = changed
+        if extra:
+            if prune:
+                plan.removed[name] = extra
+            else:
+                plan.extra[name] = extra
+    return plan
+
+
+def print_plan(desired, plan):
+    """Mostra o plano (só as chaves: os valores podem ser segredos)"""
+    print(f"\n📋 Plano para {desired['project']} ({desired['environment']}):")
+    if plan.create_project:
+        print(f"  + projeto {desired['project']}")
+    for name in desired['services']:
+        if name in plan.create_services:
+            print(f"  + serviço {name} ({desired['services'][name]['rootDirectory']})")
+        for key in sorted(plan.added.get(name, {})):
+            print(f"  + {name}.{key}")
+        for key in sorted(plan.changed.get(name, {})):
+            print(f"  ~ {name}.{key}")
+        for key in plan.removed.get(name, []):
+            print(f"  - {name}.{key}")
+        for key in plan.extra.get(name, []):
+            print(f"  ! {name}.{key} não está no arquivo (mantida; use --prune para remover)")
+    if plan.empty:
+        print("  ✅ Nenhuma mudança")
+    else:
+        print(f"  {plan.writes} mutação(ões)")
+
+
+def _create_or_find(client, desired, label, operation, extract, find, failure=None):
+    """create_or_find procurando o recurso no estado atual relido: find(estado)"""
+    return create_or_find(client, label, operation, extract,
+                          lambda: find(fetch_current_state(client, desired, variables=False)), failure)
+
+
+def apply_plan(client, desired, current, plan):
+    """
+    Aplica o plano: projeto (se faltar), serviços novos em paralelo e depois
+    upserts/remoções de variáveis de todos os serviços em paralelo.
+    Devolve {serviço: id ou None se a criação falhou}.
+    """
+    project_id = current['project_id']
+    environment_id = current['environment_id']
+    if plan.create_project:
+        print(f"📦 Criando projeto {desired['project']}...")
+        project_id, environment_id = _create_or_find(
+            client, desired, f"Projeto {desired['project']}",
+            (PROJECT_CREATE, {'name': desired['project']}),
+            lambda data: (data['projectCreate']['id'],
+                          _environment_id(data['projectCreate'], desired['environment'])),
+            lambda state: state['project_id'] and (state['project_id'], state['environment_id']))
+    if environment_id is None:
+        raise RailwayError(f"Ambiente {desired['environment']} não encontrado no projeto")
+
+    service_ids = {name: service['id'] for name, service in current['services'].items()
+                   if name in desired['services']}
+    if plan.create_services:
+        print(f"🔧 Criando serviços: {', '.join(plan.create_services)}")
+        operations = [
+            (SERVICE_CREATE, {'input': {
+                'projectId': project_id,
+                'name': name,
+                'source': {'repo': desired['repo'], 'rootDirectory': desired['services'][name]['rootDirectory']},
+            }})
+            for name in plan.create_services
+        ]
+        results = client.execute_many(operations)
+        for name, operation, result in zip(plan.create_services, operations, results):
+            if isinstance(result, RailwayUncertainError):
+                try:
+                    service_ids[name] = _create_or_find(
+                        client, desired, f"Serviço {name}", operation,
+                        lambda data: data['serviceCreate']['id'],
+                        lambda state, name=name: state['services'].get(name, {}).get('id'), failure=result)
+                    continue
+                except RailwayError as e:
+                    result = e
+            if isinstance(result, RailwayError):
+                print(f"❌ Erro ao criar serviço {name}: {result}")
+                service_ids[name] = None
+            else:
+                service_ids[name] = result['serviceCreate']['id']
+                print(f"✅ Serviço criado: {name} ({service_ids[name]})")
+
+    labels, operations = [], []
+    for name in desired['services']:
+        if not service_ids.get(name):
+            continue
+        scope = {'projectId': project_id, 'environmentId': environment_id, 'serviceId': service_ids[name]}
+        variables = plan.upserts(name)
+        if variables:
+            labels.append(f"{name}: {len(variables)} variável(is)")
+            operations.append((VARIABLE_COLLECTION_UPSERT, {'input': {**scope, 'variables': variables}}))
+        for key in plan.removed.get(name, []):
+            labels.append(f"{name}.{key} removida")
+            operations.append((VARIABLE_DELETE, {'input': {**scope, 'name': key}}))
+
+    if operations:
+        print("📝 Atualizando variáveis...")
+        for label, result in zip(labels, client.execute_many(operations)):
+            if isinstance(result, RailwayError):
+                print(f"  ✗ {label}: {result}")
+            else:
+                print(f"  ✓ {label}")
+    return service_ids
+
+
+def reconcile(client, desired, dry_run=False, prune=False):
+    """Lê o estado atual, mostra o plano e (sem dry_run) aplica. Devolve {serviço: id}"""
+    current = fetch_current_state(client, desired)
+    plan = diff_state(desired, current, prune)
+    print_plan(desired, plan)
+    if dry_run or plan.empty:
+        return {name: current['services'].get(name, {}).get('id') for name in desired['services']}
+    return apply_plan(client, desired, current, plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcilia o ambiente Railway com o estado desejado')
+    parser.add_argument('--file', default=DESIRED_STATE, help=f'Estado desejado (padrão: {DESIRED_STATE})')
+    parser.add_argument('--dry-run', action='store_true', help='Só mostra o plano, sem escrever')
+    parser.add_argument('--prune', action='store_true', help='Remove variáveis que não estão no arquivo')
+    parser.add_argument('--api', default=RAILWAY_API, help='Endpoint GraphQL do Railway')
+    parser.add_argument('--mock', action='store_true',
+                        help='Executa contra o MockRailway: aplica e reexecuta para mostrar o caso sem mudanças')
+    parser.add_argument('--lost-rate', type=float, default=0.0,
+                        help='Com --mock: fração de operações aplicadas que respondem 503')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🚂 GREENA - Reconciliação do ambiente Railway")
+    print("="*60)
+
+    try:
+        desired = load_desired_state(args.file, MockEnvironment(os.environ) if args.mock else None)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        if args.mock:
+            with MockRailway(lost_rate=args.lost_rate) as mock, RailwayClient('mock-token', api=mock.url) as client:
+                passes = 1 if args.dry_run else 2
+                for run in range(passes):
+                    before = mock.requests
+                    reconcile(client, desired, args.dry_run, args.prune)
+                    print(f"📦 Mock: execução {run + 1} com {mock.requests - before} requisição(ões)")
+                client.metrics.print_report()
+        else:
+            with RailwayClient(get_railway_token(), api=args.api) as client:
+                reconcile(client, desired, args.dry_run, args.prune)
+                client.metrics.print_report()
+    except RailwayError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"⏱️  {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,794 @@
+"""
+Migrações versionadas do schema (caminho de bootstrap em Python)
+Substitui o CREATE TABLE IF NOT EXISTS do create_tables, que não consegue
+alterar colunas, criar índices nem preencher dados em bancos já existentes.
+
+Cada migração tem versão, nome e passos; o checksum dos passos fica gravado em
+schema_migrations e uma migração aplicada que mudou depois é recusada (drift).
+As migrações rodam sob advisory lock (uma execução por vez; pelo endpoint
+-pooler do Neon o lock fica numa conexão direta, já que o PgBouncer não mantém
+a sessão) e os passos usam padrões online:
+  sql       DDL/DML curto em uma transação, com lock_timeout e novas tentativas
+            (nunca espera atrás de uma transação longa segurando a fila de locks)
+  index     CREATE INDEX CONCURRENTLY (não bloqueia escritas), sem statement_timeout
+  backfill  UPDATE em lotes, um commit por lote, sem statement_timeout e com
+            novas tentativas por lote
+
+Os passos devem ser idempotentes: se a execução cair no meio, a migração não é
+registrada e roda de novo inteira. Migrações que dependem de tabelas do Prisma
+(responses...) ficam pendentes até a tabela existir, e as que dependem de uma
+extensão ('extension:pg_trgm') até ela estar disponível no servidor.
+
+INSTRUÇÕES DE USO:
+1. Configure DATABASE_URL no .env (ver db_pool.py)
+2. Execute: python schema_migrations.py   (o seed_database.py já aplica ao iniciar)
+
+EXEMPLOS:
+  python schema_migrations.py --status    # aplicadas, pendentes e divergentes
+  python schema_migrations.py --to 3      # aplica até a versão 3
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.errors
+
+from db_pool import backoff_delay, direct_dsn, get_pool, is_pooler_dsn
+
+# Chave do advisory lock (sector_benchmarks usa 4711001, analytics_rollups 4711003)
+MIGRATION_LOCK_KEY = 4711002
+
+# Passos 'sql' desistem do lock depois disso e tentam de novo
+MIGRATION_LOCK_TIMEOUT = '2s'
+MIGRATION_ATTEMPTS = 10
+
+BACKFILL_BATCH_SIZE = 5000
+
+Migration = namedtuple('Migration', 'version name steps requires')
+
+
+def sql(statement):
+    return ('sql', statement)
+
+
+def index(name, table, definition):
+    """Índice criado com CONCURRENTLY; `definition` é o trecho após ON <tabela>"""
+    return ('index', name, table, definition)
+
+
+def backfill(table, statement, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    UPDATE em lotes: `statement` recebe %(batch)s e deve alterar no máximo
+    esse número de linhas por execução (ex.: WHERE id IN (SELECT ... LIMIT
+    %(batch)s)), parando quando não houver mais linhas a alterar.
+    """
+    return ('backfill', table, statement, batch_size)
+
+
+MIGRATIONS = [
+    Migration(1, 'catalogue_tables', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS pillars (
+                id SERIAL PRIMARY KEY,
+                code VARCHAR(10) UNIQUE NOT NULL,
+                name VARCHAR(100) NOT NULL,
+                description TEXT,
+                icon VARCHAR(50),
+                color VARCHAR(50)
+            );
+            CREATE TABLE IF NOT EXISTS themes (
+                id SERIAL PRIMARY KEY,
+                pillar_id INTEGER REFERENCES pillars(id) ON DELETE CASCADE,
+                name VARCHAR(200) NOT NULL,
+                order_index INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS criteria (
+                id SERIAL PRIMARY KEY,
+                theme_id INTEGER REFERENCES themes(id) ON DELETE CASCADE,
+                name TEXT NOT NULL,
+                order_index INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS assessment_items (
+                id SERIAL PRIMARY KEY,
+                criteria_id INTEGER REFERENCES criteria(id) ON DELETE CASCADE,
+                question TEXT NOT NULL,
+                order_index INTEGER
+            );
+        """),
+    ], ()),
+    # Colunas de múltiplos frameworks que o Prisma já tinha (framework,
+    # sortOrder, macroCategory...). Com default constante o ADD COLUMN não
+    # reescreve a tabela
+    Migration(2, 'framework_columns', [
+        sql("""
+            ALTER TABLE pillars
+                ADD COLUMN IF NOT EXISTS framework VARCHAR(20) NOT NULL DEFAULT 'ESG',
+                ADD COLUMN IF NOT EXISTS sort_order INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS macro_category VARCHAR(50);
+            ALTER TABLE assessment_items
+                ADD COLUMN IF NOT EXISTS gri_code VARCHAR(20),
+                ADD COLUMN IF NOT EXISTS framework_tag VARCHAR(20) NOT NULL DEFAULT 'ESG',
+                ADD COLUMN IF NOT EXISTS data_fields JSONB;
+        """),
+        sql("""
+            UPDATE pillars SET sort_order = CASE code WHEN 'E' THEN 1 WHEN 'S' THEN 2 ELSE 3 END
+            WHERE framework = 'ESG' AND sort_order = 0 AND code IN ('E', 'S', 'G');
+        """),
+    ], ()),
+    Migration(3, 'catalogue_auxiliary_tables', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS framework_mappings (
+                id SERIAL PRIMARY KEY,
+                esg_assessment_item_id INTEGER NOT NULL REFERENCES assessment_items(id) ON DELETE CASCADE,
+                gri_assessment_item_id INTEGER NOT NULL REFERENCES assessment_items(id) ON DELETE CASCADE,
+                compatibility_level VARCHAR(10) NOT NULL,
+                UNIQUE (esg_assessment_item_id, gri_assessment_item_id)
+            );
+            CREATE TABLE IF NOT EXISTS catalogue_hashes (
+                node_key TEXT PRIMARY KEY,
+                node_type VARCHAR(10) NOT NULL,
+                db_id INTEGER,
+                content_hash CHAR(64) NOT NULL
+            );
+        """),
+    ], ()),
+    # Mesmos tipos do Prisma (TEXT). VARCHAR -> TEXT não reescreve a tabela nem
+    # os índices, só troca o tipo no catálogo
+    Migration(4, 'catalogue_text_columns', [
+        sql("""
+            ALTER TABLE pillars
+                ALTER COLUMN code TYPE TEXT, ALTER COLUMN name TYPE TEXT,
+                ALTER COLUMN icon TYPE TEXT, ALTER COLUMN color TYPE TEXT,
+                ALTER COLUMN framework TYPE TEXT, ALTER COLUMN macro_category TYPE TEXT;
+            ALTER TABLE themes ALTER COLUMN name TYPE TEXT;
+            ALTER TABLE assessment_items
+                ALTER COLUMN gri_code TYPE TEXT, ALTER COLUMN framework_tag TYPE TEXT;
+            ALTER TABLE framework_mappings ALTER COLUMN compatibility_level TYPE TEXT;
+        """),
+    ], ()),
+    # Sem índice em assessment_item_id, cada DELETE em assessment_items (swap,
+    # sync) varre responses inteira para checar a FK
+    Migration(5, 'responses_assessment_item_index', [
+        index('responses_assessment_item_id_idx', 'responses', '(assessment_item_id)'),
+    ], ('responses',)),
+    # Versão do catálogo: incrementada pelo seed a cada carga ou sync com
+    # alterações, invalida os caches em memória (catalogue_cache.py)
+    Migration(6, 'catalogue_version', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS catalogue_version (
+                id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+                version BIGINT NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            INSERT INTO catalogue_version (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+        """),
+    ], ()),
+    # Agregados por hora/dia de page_views e activity_logs (analytics_rollups.py);
+    # *_hll são sketches HyperLogLog de sessões/usuários únicos; pending_ids são
+    # ids abaixo da marca d'água ainda não visíveis (INSERTs em andamento), que
+    # o analytics_rollups.py confere de novo em vez de travar a tabela
+    Migration(7, 'analytics_rollups', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS page_view_rollups (
+                granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day')),
+                bucket TIMESTAMP(3) NOT NULL,
+                views BIGINT NOT NULL,
+                sessions_hll BYTEA NOT NULL,
+                users_hll BYTEA NOT NULL,
+                views_by_hour BIGINT[],
+                PRIMARY KEY (granularity, bucket)
+            );
+            CREATE TABLE IF NOT EXISTS page_view_path_rollups (
+                granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day')),
+                bucket TIMESTAMP(3) NOT NULL,
+                path TEXT NOT NULL,
+                views BIGINT NOT NULL,
+                PRIMARY KEY (granularity, bucket, path)
+            );
+            CREATE TABLE IF NOT EXISTS page_view_referrer_rollups (
+                granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day')),
+                bucket TIMESTAMP(3) NOT NULL,
+                referrer TEXT NOT NULL,
+                views BIGINT NOT NULL,
+                PRIMARY KEY (granularity, bucket, referrer)
+            );
+            CREATE TABLE IF NOT EXISTS activity_rollups (
+                granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day')),
+                bucket TIMESTAMP(3) NOT NULL,
+                action_type TEXT NOT NULL,
+                events BIGINT NOT NULL,
+                users_hll BYTEA NOT NULL,
+                PRIMARY KEY (granularity, bucket, action_type)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+                source TEXT PRIMARY KEY,
+                last_id BIGINT NOT NULL DEFAULT 0,
+                pending_ids BIGINT[] NOT NULL DEFAULT '{}',
+                updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """),
+    ], ('page_views', 'activity_logs')),
+    # Índice de busca do catálogo (catalogue_search.py), mantido pelo seed.
+    # fastupdate = off: escrito só na carga, a pending list do GIN só deixaria
+    # as buscas seguintes mais lentas. catalogue_unaccent é IMMUTABLE (unaccent() é só STABLE e não entra em
+    # índice); sem a extensão unaccent, cobre os acentos do português
+    Migration(8, 'catalogue_search', [
+        sql("""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent') THEN
+                    CREATE EXTENSION IF NOT EXISTS unaccent;
+                    CREATE OR REPLACE FUNCTION catalogue_unaccent(text) RETURNS text
+                        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                        AS $f$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $f$;
+                ELSE
+                    CREATE OR REPLACE FUNCTION catalogue_unaccent(text) RETURNS text
+                        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                        AS $f$ SELECT translate($1,
+                            'áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑ',
+                            'aaaaaeeeeiiiiooooouuuucnAAAAAEEEEIIIIOOOOOUUUUCN') $f$;
+                END IF;
+            END
+            $$;
+            CREATE TABLE IF NOT EXISTS catalogue_search (
+                item_id INTEGER PRIMARY KEY,
+                framework TEXT NOT NULL,
+                pillar_code TEXT NOT NULL,
+                theme TEXT NOT NULL,
+                criteria TEXT NOT NULL,
+                question TEXT NOT NULL,
+                gri_code TEXT,
+                document TSVECTOR NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS catalogue_search_document_idx ON catalogue_search USING gin (document)
+                WITH (fastupdate = off);
+        """),
+    ], ()),
+    # Busca aproximada (erros de digitação) por trigramas na questão, no
+    # critério e no tema
+    Migration(9, 'catalogue_search_trigram', [
+        sql("CREATE EXTENSION IF NOT EXISTS pg_trgm;"),
+        index('catalogue_search_question_trgm_idx', 'catalogue_search',
+              'USING gin (lower(catalogue_unaccent(question)) gin_trgm_ops)'),
+        index('catalogue_search_criteria_trgm_idx', 'catalogue_search',
+              'USING gin (lower(catalogue_unaccent(criteria)) gin_trgm_ops)'),
+        index('catalogue_search_theme_trgm_idx', 'catalogue_search',
+              'USING gin (lower(catalogue_unaccent(theme)) gin_trgm_ops)'),
+    ], ('extension:pg_trgm',)),
+    # Pontuações estimadas no outro framework (crosswalk.py): diagnóstico ESG
+    # projetado nos pilares GRI e vice-versa. Pilar pelo código, sem FK: a
+    # troca do catálogo (seed --mode swap) muda os ids
+    Migration(10, 'crosswalk_scores', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS crosswalk_scores (
+                diagnosis_id TEXT NOT NULL REFERENCES diagnoses(id) ON DELETE CASCADE,
+                pillar_code TEXT NOT NULL,
+                framework TEXT NOT NULL,
+                score DECIMAL(5,2) NOT NULL,
+                confidence REAL NOT NULL,
+                updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (diagnosis_id, pillar_code)
+            );
+        """),
+    ], ('diagnoses',)),
+    # Somas e contagens por diagnóstico em critério, tema e pilar
+    # (diagnosis_aggregates.py), mantidas por delta pelos triggers de
+    # responses (responses_changes_*): um por evento, em nível de statement com
+    # tabela de transição, então um COPY de milhares de respostas vira um único
+    # upsert agregado. Ficam vazias (versão NULL) até a primeira reconstrução
+    Migration(11, 'diagnosis_aggregates', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS diagnosis_aggregates (
+                diagnosis_id TEXT NOT NULL REFERENCES diagnoses(id) ON DELETE CASCADE,
+                level TEXT NOT NULL CHECK (level IN ('criteria', 'theme', 'pillar')),
+                node_id INTEGER NOT NULL,
+                score_sum BIGINT NOT NULL,
+                valid_count INTEGER NOT NULL,
+                answered_count INTEGER NOT NULL,
+                PRIMARY KEY (diagnosis_id, level, node_id)
+            );
+            CREATE TABLE IF NOT EXISTS diagnosis_aggregate_state (
+                id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+                catalogue_version BIGINT,
+                rebuilt_at TIMESTAMP(3)
+            );
+            INSERT INTO diagnosis_aggregate_state (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+            CREATE OR REPLACE FUNCTION responses_changes_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $f$
+            DECLARE
+                changes TEXT := CASE TG_OP
+                    WHEN 'INSERT' THEN 'SELECT 1 AS sign, * FROM new_rows'
+                    WHEN 'DELETE' THEN 'SELECT -1 AS sign, * FROM old_rows'
+                    ELSE 'SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1, * FROM old_rows'
+                END;
+            BEGIN
+                -- Mesma regra do backend: 'Não se aplica' e valor 0 não entram na média
+                EXECUTE format($q$
+                    INSERT INTO diagnosis_aggregates
+                        (diagnosis_id, level, node_id, score_sum, valid_count, answered_count)
+                    SELECT r.diagnosis_id, node.level, node.node_id,
+                           sum(r.sign * CASE WHEN r.valid THEN r.evaluation_value ELSE 0 END),
+                           sum(r.sign * r.valid::int), sum(r.sign)
+                    FROM (
+                        SELECT sign, diagnosis_id, assessment_item_id, evaluation_value,
+                               evaluation <> 'Não se aplica' AND evaluation_value > 0 AS valid
+                        FROM (%s) changes
+                    ) r
+                    JOIN assessment_items ai ON ai.id = r.assessment_item_id
+                    JOIN criteria c ON c.id = ai.criteria_id
+                    JOIN themes t ON t.id = c.theme_id
+                    CROSS JOIN LATERAL (VALUES ('criteria', c.id), ('theme', t.id), ('pillar', t.pillar_id))
+                        AS node (level, node_id)
+                    GROUP BY 1, 2, 3
+                    HAVING sum(r.sign) <> 0
+                        OR sum(r.sign * r.valid::int) <> 0
+                        OR sum(r.sign * CASE WHEN r.valid THEN r.evaluation_value ELSE 0 END) <> 0
+                    ORDER BY 1, 2, 3
+                    ON CONFLICT (diagnosis_id, level, node_id) DO UPDATE SET
+                        score_sum = diagnosis_aggregates.score_sum + EXCLUDED.score_sum,
+                        valid_count = diagnosis_aggregates.valid_count + EXCLUDED.valid_count,
+                        answered_count = diagnosis_aggregates.answered_count + EXCLUDED.answered_count
+                $q$, changes);
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM diagnosis_aggregates a
+                    WHERE a.answered_count = 0
+                      AND a.diagnosis_id IN (SELECT diagnosis_id FROM old_rows);
+                END IF;
+                RETURN NULL;
+            END
+            $f$;
+
+            CREATE OR REPLACE FUNCTION responses_changes_truncate() RETURNS trigger
+            LANGUAGE plpgsql AS $f$
+            BEGIN
+                TRUNCATE diagnosis_aggregates;
+                RETURN NULL;
+            END
+            $f$;
+
+            DROP TRIGGER IF EXISTS responses_changes_insert ON responses;
+            DROP TRIGGER IF EXISTS responses_changes_update ON responses;
+            DROP TRIGGER IF EXISTS responses_changes_delete ON responses;
+            DROP TRIGGER IF EXISTS responses_changes_truncate ON responses;
+            CREATE TRIGGER responses_changes_insert AFTER INSERT ON responses
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION responses_changes_apply();
+            CREATE TRIGGER responses_changes_update AFTER UPDATE ON responses
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION responses_changes_apply();
+            CREATE TRIGGER responses_changes_delete AFTER DELETE ON responses
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION responses_changes_apply();
+            CREATE TRIGGER responses_changes_truncate AFTER TRUNCATE ON responses
+                FOR EACH STATEMENT EXECUTE FUNCTION responses_changes_truncate();
+        """),
+    ], ('responses',)),
+    # Fila de mudanças de responses para a pontuação ao vivo (live_scoring.py):
+    # a função dos triggers da migração 11 passa a gravar valor antigo/novo de
+    # cada resposta alterada e, a partir das mesmas linhas capturadas (antigo
+    # com sinal -1, novo com +1), atualizar diagnosis_aggregates: cada escrita
+    # em responses lê as tabelas de transição uma vez só. NOTIFY avisa o
+    # consumidor (entregue no commit, um por transação), que apaga o que
+    # processou na mesma transação do checkpoint (diagnosis_scores). TRUNCATE
+    # em responses zera a fila e os agregados e força o recálculo
+    # (catalogue_version NULL)
+    Migration(12, 'response_changes', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS response_changes (
+                id BIGSERIAL PRIMARY KEY,
+                diagnosis_id TEXT NOT NULL,
+                assessment_item_id INTEGER NOT NULL,
+                old_value INTEGER,
+                old_not_applicable BOOLEAN,
+                new_value INTEGER,
+                new_not_applicable BOOLEAN,
+                changed_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS live_scoring_checkpoint (
+                id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+                last_change_id BIGINT NOT NULL DEFAULT 0,
+                changes BIGINT NOT NULL DEFAULT 0,
+                catalogue_version BIGINT,
+                checkpointed_at TIMESTAMP(3)
+            );
+            INSERT INTO live_scoring_checkpoint (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+            CREATE OR REPLACE FUNCTION responses_changes_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $f$
+            DECLARE
+                changes TEXT := CASE TG_OP
+                    WHEN 'INSERT' THEN $c$
+                        SELECT diagnosis_id, assessment_item_id, NULL::int, NULL::boolean,
+                               evaluation_value, evaluation = 'Não se aplica'
+                        FROM new_rows
+                    $c$
+                    WHEN 'DELETE' THEN $c$
+                        SELECT diagnosis_id, assessment_item_id, evaluation_value, evaluation = 'Não se aplica',
+                               NULL::int, NULL::boolean
+                        FROM old_rows
+                    $c$
+                    -- Só o que muda a pontuação; troca de diagnóstico/questão vira remoção + inclusão
+                    ELSE $c$
+                        SELECT n.diagnosis_id, n.assessment_item_id, o.evaluation_value, o.evaluation = 'Não se aplica',
+                               n.evaluation_value, n.evaluation = 'Não se aplica'
+                        FROM old_rows o JOIN new_rows n USING (id)
+                        WHERE (o.diagnosis_id, o.assessment_item_id) = (n.diagnosis_id, n.assessment_item_id)
+                          AND (o.evaluation_value, o.evaluation) IS DISTINCT FROM (n.evaluation_value, n.evaluation)
+                        UNION ALL
+                        SELECT o.diagnosis_id, o.assessment_item_id, o.evaluation_value,
+                               o.evaluation = 'Não se aplica', NULL, NULL
+                        FROM old_rows o JOIN new_rows n USING (id)
+                        WHERE (o.diagnosis_id, o.assessment_item_id) <> (n.diagnosis_id, n.assessment_item_id)
+                        UNION ALL
+                        SELECT n.diagnosis_id, n.assessment_item_id, NULL, NULL,
+                               n.evaluation_value, n.evaluation = 'Não se aplica'
+                        FROM old_rows o JOIN new_rows n USING (id)
+                        WHERE (o.diagnosis_id, o.assessment_item_id) <> (n.diagnosis_id, n.assessment_item_id)
+                    $c$
+                END;
+                captured BIGINT;
+            BEGIN
+                -- Mesma regra do backend: 'Não se aplica' e valor 0 não entram na média
+                EXECUTE format($q$
+                    WITH captured AS (
+                        INSERT INTO response_changes (diagnosis_id, assessment_item_id, old_value, old_not_applicable,
+                                                      new_value, new_not_applicable)
+                        %s
+                        RETURNING diagnosis_id, assessment_item_id, old_value, old_not_applicable,
+                                  new_value, new_not_applicable
+                    ), applied AS (
+                        INSERT INTO diagnosis_aggregates
+                            (diagnosis_id, level, node_id, score_sum, valid_count, answered_count)
+                        SELECT r.diagnosis_id, node.level, node.node_id,
+                               sum(r.sign * CASE WHEN r.valid THEN r.evaluation_value ELSE 0 END),
+                               sum(r.sign * r.valid::int), sum(r.sign)
+                        FROM (
+                            SELECT -1 AS sign, diagnosis_id, assessment_item_id, old_value AS evaluation_value,
+                                   NOT old_not_applicable AND old_value > 0 AS valid
+                            FROM captured WHERE old_not_applicable IS NOT NULL
+                            UNION ALL
+                            SELECT 1, diagnosis_id, assessment_item_id, new_value,
+                                   NOT new_not_applicable AND new_value > 0
+                            FROM captured WHERE new_not_applicable IS NOT NULL
+                        ) r
+                        JOIN assessment_items ai ON ai.id = r.assessment_item_id
+                        JOIN criteria c ON c.id = ai.criteria_id
+                        JOIN themes t ON t.id = c.theme_id
+                        CROSS JOIN LATERAL (VALUES ('criteria', c.id), ('theme', t.id), ('pillar', t.pillar_id))
+                            AS node (level, node_id)
+                        GROUP BY 1, 2, 3
+                        HAVING sum(r.sign) <> 0
+                            OR sum(r.sign * r.valid::int) <> 0
+                            OR sum(r.sign * CASE WHEN r.valid THEN r.evaluation_value ELSE 0 END) <> 0
+                        ORDER BY 1, 2, 3
+                        ON CONFLICT (diagnosis_id, level, node_id) DO UPDATE SET
+                            score_sum = diagnosis_aggregates.score_sum + EXCLUDED.score_sum,
+                            valid_count = diagnosis_aggregates.valid_count + EXCLUDED.valid_count,
+                            answered_count = diagnosis_aggregates.answered_count + EXCLUDED.answered_count
+                    )
+                    SELECT count(*) FROM captured
+                $q$, changes) INTO captured;
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM diagnosis_aggregates a
+                    WHERE a.answered_count = 0
+                      AND a.diagnosis_id IN (SELECT diagnosis_id FROM old_rows);
+                END IF;
+                IF captured > 0 THEN
+                    PERFORM pg_notify('response_changes', '');
+                END IF;
+                RETURN NULL;
+            END
+            $f$;
+
+            CREATE OR REPLACE FUNCTION responses_changes_truncate() RETURNS trigger
+            LANGUAGE plpgsql AS $f$
+            BEGIN
+                TRUNCATE diagnosis_aggregates, response_changes;
+                UPDATE live_scoring_checkpoint SET catalogue_version = NULL;
+                PERFORM pg_notify('response_changes', '');
+                RETURN NULL;
+            END
+            $f$;
+        """),
+    ], ('responses', 'diagnosis_aggregates')),
+    # Pontuações por tema (score_diagnoses.py e live_scoring.py); as de pilar
+    # ficam em diagnosis_scores, do Prisma
+    Migration(13, 'diagnosis_theme_scores', [
+        sql("""
+            CREATE TABLE IF NOT EXISTS diagnosis_theme_scores (
+                diagnosis_id TEXT NOT NULL REFERENCES diagnoses(id) ON DELETE CASCADE,
+                theme_id INTEGER NOT NULL REFERENCES themes(id) ON DELETE CASCADE,
+                score DECIMAL(5,2) NOT NULL,
+                updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (diagnosis_id, theme_id)
+            );
+        """),
+    ], ('diagnoses',)),
+]
+
+
+def checksum(migration):
+    """SHA-256 do nome e dos passos (espaços normalizados)"""
+    steps = [[' '.join(str(part).split()) for part in step] for step in migration.steps]
+    return hashlib.sha256(json.dumps([migration.name, steps]).encode('utf-8')).hexdigest()
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+    return cursor.fetchone()[0]
+
+
+def _missing_requirements(cursor, migration):
+    """Tabelas ainda inexistentes e extensões indisponíveis ('extension:<nome>') exigidas pela migração"""
+    missing = []
+    for requirement in migration.requires:
+        if requirement.startswith('extension:'):
+            extension = requirement.split(':', 1)[1]
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = %s);",
+                           (extension,))
+            if not cursor.fetchone()[0]:
+                missing.append(f"extensão {extension}")
+        elif not _table_exists(cursor, requirement):
+            missing.append(requirement)
+    return missing
+
+
+def create_index_concurrently(conn, name, table, definition):
+    """
+    CREATE INDEX CONCURRENTLY fora de transação. Um índice inválido deixado
+    por uma tentativa interrompida é removido antes. Tabelas particionadas não
+    aceitam CONCURRENTLY: nelas o índice é criado normalmente (propaga às
+    partições).
+    """
+    conn.commit()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    # O statement_timeout do pool (ver db_pool.py) interromperia a criação em tabelas grandes
+    cursor.execute("SHOW statement_timeout;")
+    statement_timeout = cursor.fetchone()[0]
+    cursor.execute("SET statement_timeout = 0;")
+    try:
+        cursor.execute("""
+            SELECT i.indisvalid FROM pg_index i
+            WHERE i.indexrelid = to_regclass(%s);
+        """, (name,))
+        row = cursor.fetchone()
+        if row and row[0]:
+            return False
+        if row:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}";')
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass;", (table,))
+        concurrently = '' if cursor.fetchone()[0] == 'p' else 'CONCURRENTLY '
+        cursor.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS "{name}" ON {table} {definition};')
+        return True
+    finally:
+        if not conn.closed:
+            cursor.execute("SET statement_timeout = %s;", (statement_timeout,))
+        cursor.close()
+        conn.autocommit = False
+
+
+def _run_sql(conn, statement):
+    """Executa `statement` em uma transação, tentando de novo quando o lock não sai"""
+    cursor = conn.cursor()
+    try:
+        for attempt in range(MIGRATION_ATTEMPTS):
+            try:
+                cursor.execute(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}';")
+                cursor.execute(statement)
+                conn.commit()
+                return
+            except psycopg2.errors.LockNotAvailable:
+                conn.rollback()
+                delay = backoff_delay(attempt)
+                print(f"⚠️  Tabela ocupada, nova tentativa em {delay:.1f}s")
+                time.sleep(delay)
+        raise RuntimeError(f"Não foi possível obter os locks em {MIGRATION_ATTEMPTS} tentativas")
+    finally:
+        cursor.close()
+
+
+def _run_batch(cursor, statement, batch_size):
+    """Um lote do backfill em uma transação, tentando de novo quando o lock não sai"""
+    conn = cursor.connection
+    for attempt in range(MIGRATION_ATTEMPTS):
+        try:
+            cursor.execute(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}';")
+            cursor.execute("SET LOCAL statement_timeout = 0;")
+            cursor.execute(statement, {'batch': batch_size})
+            updated = cursor.rowcount
+            conn.commit()
+            return updated
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            delay = backoff_delay(attempt)
+            print(f"⚠️  Tabela ocupada, nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+    raise RuntimeError(f"Não foi possível obter os locks em {MIGRATION_ATTEMPTS} tentativas")
+
+
+def _run_backfill(conn, statement, batch_size):
+    """Repete o UPDATE em lotes (um commit por lote) até não alterar mais linhas"""
+    cursor = conn.cursor()
+    total = 0
+    try:
+        while True:
+            updated = _run_batch(cursor, statement, batch_size)
+            total += updated
+            if updated == 0:
+                return total
+    finally:
+        cursor.close()
+
+
+def apply_migration(conn, migration):
+    """Executa os passos de uma migração e a registra. Devolve a duração em segundos"""
+    started = time.perf_counter()
+    for step in migration.steps:
+        kind = step[0]
+        if kind == 'sql':
+            _run_sql(conn, step[1])
+        elif kind == 'index':
+            create_index_concurrently(conn, *step[1:])
+        elif kind == 'backfill':
+            updated = _run_backfill(conn, step[2], step[3])
+            print(f"   {step[1]}: {updated} linhas atualizadas em lotes de {step[3]}")
+        else:
+            raise ValueError(f"Passo desconhecido na migração {migration.version}: {kind}")
+    seconds = time.perf_counter() - started
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+        VALUES (%s, %s, %s, %s);
+    """, (migration.version, migration.name, checksum(migration), int(seconds * 1000)))
+    conn.commit()
+    cursor.close()
+    return seconds
+
+
+def applied_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            duration_ms INTEGER
+        );
+    """)
+    cursor.execute("SELECT version, name, checksum FROM schema_migrations ORDER BY version;")
+    return {version: (name, stored) for version, name, stored in cursor.fetchall()}
+
+
+def migration_status(conn, migrations=MIGRATIONS):
+    """(migração, 'aplicada' | 'pendente' | 'aguardando <tabela/extensão>' | 'divergente')"""
+    cursor = conn.cursor()
+    applied = applied_migrations(cursor)
+    conn.commit()
+    status = []
+    for migration in migrations:
+        if migration.version in applied:
+            state = 'aplicada' if applied[migration.version][1] == checksum(migration) else 'divergente'
+        else:
+            missing = _missing_requirements(cursor, migration)
+            state = f"aguardando {', '.join(missing)}" if missing else 'pendente'
+        status.append((migration, state))
+    cursor.close()
+    return status
+
+
+@contextmanager
+def migration_lock(conn):
+    """
+    Advisory lock de sessão durante toda a execução (os passos CONCURRENTLY e
+    os lotes do backfill fazem vários commits, então um lock de transação não
+    serve). No endpoint -pooler do Neon o PgBouncer em modo transação troca a
+    conexão do servidor a cada transação, e o lock ficaria numa sessão
+    qualquer: ele é tomado numa conexão direta ao mesmo banco.
+    """
+    if is_pooler_dsn(conn.info.host or ''):
+        parameters = {key: value for key, value in conn.info.dsn_parameters.items() if value}
+        parameters['host'] = direct_dsn(parameters['host'])
+        lock_conn = psycopg2.connect(password=conn.info.password, **parameters)
+        lock_conn.autocommit = True
+    else:
+        lock_conn = conn
+        conn.commit()
+    cursor = lock_conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+        if lock_conn is conn:
+            conn.commit()
+        yield
+    finally:
+        if lock_conn is not conn:
+            lock_conn.close()
+        elif not conn.closed:
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+            cursor.close()
+
+
+def migrate(conn, migrations=MIGRATIONS, target=None):
+    """
+    Aplica em ordem as migrações pendentes (até `target`), sob advisory lock.
+    Recusa seguir se uma migração já aplicada teve os passos alterados.
+    Devolve as versões aplicadas.
+    """
+    with migration_lock(conn):
+        return _apply_pending(conn, migrations, target)
+
+
+def _apply_pending(conn, migrations, target):
+    cursor = conn.cursor()
+    try:
+        applied = applied_migrations(cursor)
+        conn.commit()
+        for version, (name, stored) in applied.items():
+            migration = next((m for m in migrations if m.version == version), None)
+            if migration and stored != checksum(migration):
+                raise RuntimeError(f"Migração {version} ({name}) foi alterada depois de aplicada "
+                                   f"(checksum divergente); crie uma nova migração")
+
+        done = []
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            missing = _missing_requirements(cursor, migration)
+            conn.commit()
+            if missing:
+                continue
+            seconds = apply_migration(conn, migration)
+            print(f"✅ Migração {migration.version:04d} {migration.name} aplicada ({seconds * 1000:.0f} ms)")
+            done.append(migration.version)
+        return done
+    finally:
+        cursor.close()
+
+
+def print_status(status):
+    print("\n" + "="*60)
+    print("📋 MIGRAÇÕES DO SCHEMA")
+    print("="*60)
+    icons = {'aplicada': '✅', 'pendente': '⏳', 'divergente': '❌'}
+    for migration, state in status:
+        print(f"  {icons.get(state, '⏸️ ')} {migration.version:04d} {migration.name:<36} {state}")
+    print("="*60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrações versionadas do schema')
+    parser.add_argument('--status', action='store_true', help='Só mostra o estado das migrações')
+    parser.add_argument('--to', type=int, default=None, help='Aplica até esta versão')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🧱 GREENA - Migrações do Schema")
+    print("="*60 + "\n")
+
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            if not args.status:
+                applied = migrate(conn, target=args.to)
+                if not applied:
+                    print("✅ Schema atualizado, nenhuma migração pendente")
+            print_status(migration_status(conn))
+    except Exception as e:
+        print(f"\n❌ Erro nas migrações: {e}")
+        sys.exit(1)
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Recálculo em lote das pontuações de todos os diagnósticos (NumPy)
+Aplica a mesma regra do ScoringService do backend, de forma vetorizada:
+
+- pilar: média dos evaluationValue (ignorando 'Não se aplica') × 20,
+  ou seja, soma / (respostas válidas × 5) × 100; pilar sem respostas válidas = 0
+- tema: mesma regra, sobre as questões do tema
+- geral: média das pontuações dos pilares do framework do diagnóstico
+  (ESG, GRI ou ESG_GRI)
+
+As respostas são lidas com COPY binário em blocos e acumuladas por
+(diagnóstico, pilar) e (diagnóstico, tema) com um índice questão→pilar/tema
+montado uma vez a partir do catálogo (snapshot mapeado ou catalogue_cache). A gravação também usa COPY + upsert:
+diagnosis_scores, as colunas legadas de diagnoses (overall/environmental/
+social/governance, só de diagnósticos concluídos: o backend as preenche ao
+finalizar) e diagnosis_theme_scores (temas sem respostas saem).
+
+INSTRUÇÕES DE USO:
+1. Instale as dependências: pip install psycopg2-binary python-dotenv numpy
+2. Execute: python score_diagnoses.py
+
+EXEMPLOS:
+  python score_diagnoses.py --status completed   # só diagnósticos concluídos
+  python score_diagnoses.py --dry-run            # calcula e mostra o resumo, sem gravar
+"""
+
+import argparse
+import io
+
+import numpy as np
+
+from catalogue_snapshot import open_catalogue
+from db_pool import get_pool
+from schema_migrations import migrate
+from seed_database import CountingCursor, SeedReport
+
+# Bytes lidos do COPY antes de cada acumulação vetorizada (~1M respostas)
+CHUNK_BYTES = 32 * 1024 * 1024
+
+# Colunas legadas de diagnoses preenchidas para ESG e ESG_GRI (LEGACY_PILLAR_MAP)
+LEGACY_PILLAR_COLUMNS = {'E': 'environmental_score', 'S': 'social_score', 'G': 'governance_score'}
+
+# Pilares considerados por framework do diagnóstico
+DIAGNOSIS_FRAMEWORKS = {'ESG': ('ESG',), 'GRI': ('GRI',), 'ESG_GRI': ('ESG', 'GRI')}
+
+# Tupla do COPY binário com 4 colunas int4: contagem de campos + (tamanho, valor) por coluna
+_RESPONSE_DTYPE = np.dtype([
+    ('fields', '>i2'),
+    ('len_diagnosis', '>i4'), ('diagnosis', '>i4'),
+    ('len_item', '>i4'), ('item', '>i4'),
+    ('len_value', '>i4'), ('value', '>i4'),
+    ('len_na', '>i4'), ('na', '>i4'),
+])
+_COPY_HEADER_SIZE = 19  # assinatura (11) + flags (4) + extensão (4)
+
+
+def js_round(values):
+    """Math.round(x * 100) / 100 do backend (meio para cima, não bancário)"""
+    return np.floor(values * 100 + 0.5) / 100
+
+
+def rule_score(sums, valid):
+    """Pontuação 0-100 a partir da soma e do número de respostas válidas"""
+    scores = np.zeros(len(sums), dtype=np.float64)
+    answered = valid > 0
+    scores[answered] = (sums[answered] / (valid[answered] * 5)) * 100
+    return js_round(scores)
+
+
+class CatalogueIndex:
+    """Índice denso questão → pilar/tema, montado uma vez a partir do catálogo (snapshot ou cache)"""
+
+    def __init__(self, catalogue):
+        self.pillar_ids = np.asarray(catalogue.pillar_ids, dtype=np.int32)
+        self.pillar_codes = catalogue.pillar_codes
+        self.pillar_frameworks = catalogue.pillar_frameworks
+        self.theme_ids = np.asarray(catalogue.theme_ids, dtype=np.int32)
+
+        item_ids = np.asarray(catalogue.item_ids, dtype=np.int32)
+        item_themes = np.asarray(catalogue.criteria_theme, dtype=np.int32)[
+            np.asarray(catalogue.item_criteria, dtype=np.int32)]
+        size = int(item_ids.max(initial=0)) + 1
+        # -1: questão fora do catálogo atual (resposta ignorada)
+        self.item_theme = np.full(size, -1, dtype=np.int32)
+        self.item_pillar = np.full(size, -1, dtype=np.int32)
+        self.item_theme[item_ids] = item_themes
+        self.item_pillar[item_ids] = np.asarray(catalogue.theme_pillar, dtype=np.int32)[item_themes]
+        self.items = len(item_ids)
+
+    def framework_mask(self, frameworks):
+        """Matriz (diagnósticos × pilares): pilar conta para o framework do diagnóstico"""
+        codes = sorted(set(frameworks))
+        per_code = np.array([[fw in DIAGNOSIS_FRAMEWORKS.get(code, (code,)) for fw in self.pillar_frameworks]
+                             for code in codes], dtype=bool).reshape(len(codes), len(self.pillar_frameworks))
+        position = {code: i for i, code in enumerate(codes)}
+        return per_code[np.array([position[code] for code in frameworks], dtype=np.int64)]
+
+
+class ScoreAccumulator:
+    """
+    Recebe o COPY binário das respostas (via write) e acumula, por bloco,
+    somas e contagens válidas por (diagnóstico, pilar) e (diagnóstico, tema).
+    """
+
+    def __init__(self, index, diagnoses, chunk_bytes=CHUNK_BYTES):
+        self.index = index
+        self.diagnoses = diagnoses
+        self.chunk_bytes = chunk_bytes
+        pillars = len(index.pillar_ids)
+        self.pillar_sums = np.zeros(diagnoses * pillars, dtype=np.int64)
+        self.pillar_valid = np.zeros(diagnoses * pillars, dtype=np.int64)
+        self._theme_parts = []
+        self._buffer = bytearray()
+        self._header_skipped = False
+        self.responses = 0
+        self.ignored = 0
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_bytes:
+            self._consume()
+        return len(data)
+
+    def _consume(self, final=False):
+        if not self._header_skipped:
+            if len(self._buffer) < _COPY_HEADER_SIZE:
+                return
+            del self._buffer[:_COPY_HEADER_SIZE]
+            self._header_skipped = True
+        tuples = len(self._buffer) // _RESPONSE_DTYPE.itemsize
+        if final and len(self._buffer) % _RESPONSE_DTYPE.itemsize == 2:
+            # Trailer do COPY binário (int16 -1)
+            tuples = (len(self._buffer) - 2) // _RESPONSE_DTYPE.itemsize
+        if tuples == 0:
+            return
+        size = tuples * _RESPONSE_DTYPE.itemsize
+        rows = np.frombuffer(bytes(self._buffer[:size]), dtype=_RESPONSE_DTYPE)
+        del self._buffer[:size]
+        self._accumulate(rows['diagnosis'].astype(np.int64), rows['item'].astype(np.int64),
+                         rows['value'].astype(np.int64), rows['na'].astype(bool))
+
+    def _accumulate(self, diagnosis, item, value, not_applicable):
+        self.responses += len(item)
+        known = (item < len(self.index.item_pillar))
+        known[known] = self.index.item_pillar[item[known]] >= 0
+        self.ignored += int((~known).sum())
+        diagnosis, item, value, not_applicable = diagnosis[known], item[known], value[known], not_applicable[known]
+
+        # Mesma regra do backend: 'Não se aplica' ou valor 0 não entram na média
+        valid = ~not_applicable & (value != 0)
+        weights = np.where(valid, value, 0)
+
+        pillars = len(self.index.pillar_ids)
+        key = diagnosis * pillars + self.index.item_pillar[item]
+        minlength = len(self.pillar_sums)
+        self.pillar_sums += np.bincount(key, weights=weights, minlength=minlength).astype(np.int64)
+        self.pillar_valid += np.bincount(key, weights=valid, minlength=minlength).astype(np.int64)
+
+        # Temas: matriz densa seria grande demais com catálogos grandes; reduz o bloco por chave
+        theme_key = diagnosis * len(self.index.theme_ids) + self.index.item_theme[item]
+        keys, inverse = np.unique(theme_key, return_inverse=True)
+        self._theme_parts.append((keys,
+                                  np.bincount(inverse, weights=weights).astype(np.int64),
+                                  np.bincount(inverse, weights=valid).astype(np.int64)))
+
+    def finish(self):
+        self._consume(final=True)
+        if bytes(self._buffer) != b'\xff\xff':
+            raise ValueError(f"COPY binário inesperado: {len(self._buffer)} bytes após a última resposta")
+        if self._theme_parts:
+            keys = np.concatenate([part[0] for part in self._theme_parts])
+            sums = np.concatenate([part[1] for part in self._theme_parts])
+            valid = np.concatenate([part[2] for part in self._theme_parts])
+            self.theme_keys, inverse = np.unique(keys, return_inverse=True)
+            self.theme_sums = np.bincount(inverse, weights=sums).astype(np.int64)
+            self.theme_valid = np.bincount(inverse, weights=valid).astype(np.int64)
+        else:
+            self.theme_keys = self.theme_sums = self.theme_valid = np.zeros(0, dtype=np.int64)
+        self._theme_parts = []
+
+
+def load_diagnoses(cursor, status=None):
+    """
+    Numera os diagnósticos em uma tabela temporária (índice denso usado no
+    COPY das respostas) e devolve (ids, frameworks) na ordem do índice.
+    """
+    cursor.execute(f"""
+        CREATE TEMP TABLE scoring_diagnoses ON COMMIT DROP AS
+        SELECT (row_number() OVER (ORDER BY id) - 1)::int AS idx, id, framework
+        FROM diagnoses
+        {'WHERE status = %s' if status else ''};
+    """, (status,) if status else None)
+    cursor.execute("CREATE UNIQUE INDEX ON scoring_diagnoses (id);")
+    cursor.execute("SELECT id, framework FROM scoring_diagnoses ORDER BY idx;")
+    rows = cursor.fetchall()
+    return [row[0] for row in rows], [row[1] or 'ESG' for row in rows]
+
+
+def score_pillars(index, frameworks, sums, valid):
+    """
+    Pontuações (diagnósticos × pilares), máscara dos pilares do framework e
+    geral a partir das somas e contagens válidas achatadas por (diagnóstico, pilar)
+    """
+    pillars = len(index.pillar_ids)
+    pillar_scores = rule_score(sums, valid).reshape(-1, pillars)
+    mask = index.framework_mask(frameworks) if frameworks else np.zeros((0, pillars), dtype=bool)
+    counted = mask.sum(axis=1)
+    overall = np.zeros(len(frameworks))
+    has_pillars = counted > 0
+    overall[has_pillars] = js_round(
+        np.where(mask, pillar_scores, 0).sum(axis=1)[has_pillars] / counted[has_pillars])
+    return pillar_scores, mask, overall
+
+
+def compute_scores(conn, report, status=None, chunk_bytes=CHUNK_BYTES):
+    """Lê catálogo e respostas e calcula todas as pontuações em memória"""
+    cursor = conn.cursor()
+    with report.phase('índice do catálogo'):
+        index = CatalogueIndex(open_catalogue(conn))
+    with report.phase('diagnósticos'):
+        diagnosis_ids, frameworks = load_diagnoses(cursor, status)
+
+    accumulator = ScoreAccumulator(index, len(diagnosis_ids), chunk_bytes)
+    with report.phase('COPY respostas + acumulação'):
+        cursor.copy_expert("""
+            COPY (
+                SELECT d.idx, r.assessment_item_id, r.evaluation_value,
+                       (r.evaluation = 'Não se aplica')::int
+                FROM responses r
+                JOIN scoring_diagnoses d ON d.id = r.diagnosis_id
+            ) TO STDOUT (FORMAT binary)
+        """, accumulator)
+        accumulator.finish()
+
+    with report.phase('pontuações (vetorizado)'):
+        pillar_scores, mask, overall = score_pillars(index, frameworks, accumulator.pillar_sums,
+                                                     accumulator.pillar_valid)
+        theme_scores = rule_score(accumulator.theme_sums, accumulator.theme_valid)
+    cursor.close()
+
+    return {
+        'index': index,
+        'diagnosis_ids': diagnosis_ids,
+        'frameworks': frameworks,
+        'pillar_scores': pillar_scores,
+        'mask': mask,
+        'overall': overall,
+        'theme_keys': accumulator.theme_keys,
+        'theme_scores': theme_scores,
+        'responses': accumulator.responses,
+        'ignored': accumulator.ignored,
+    }
+
+
+def _copy_lines(cursor, table, columns, lines):
+    buffer = io.StringIO()
+    buffer.writelines(lines)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def write_scores(conn, report, result):
+    """Grava tudo em uma transação: COPY em tabelas temporárias + upsert só do que mudou"""
+    index = result['index']
+    ids = result['diagnosis_ids']
+    cursor = conn.cursor()
+    written = {}
+
+    with report.phase('gravação diagnosis_scores'):
+        cursor.execute("""
+            CREATE TEMP TABLE new_pillar_scores (diagnosis_id TEXT, pillar_id INTEGER, score DECIMAL(5,2))
+            ON COMMIT DROP;
+        """)
+        rows, cols = np.nonzero(result['mask'])
+        pillar_ids = index.pillar_ids[cols].tolist()
+        scores = result['pillar_scores'][rows, cols].tolist()
+        _copy_lines(cursor, 'new_pillar_scores', ('diagnosis_id', 'pillar_id', 'score'),
+                    (f"{ids[row]}\t{pillar_id}\t{score:.2f}\n"
+                     for row, pillar_id, score in zip(rows.tolist(), pillar_ids, scores)))
+        cursor.execute("""
+            INSERT INTO diagnosis_scores (diagnosis_id, pillar_id, score)
+            SELECT diagnosis_id, pillar_id, score FROM new_pillar_scores
+            ON CONFLICT (diagnosis_id, pillar_id) DO UPDATE SET score = EXCLUDED.score
+            WHERE diagnosis_scores.score IS DISTINCT FROM EXCLUDED.score;
+        """)
+        written['diagnosis_scores'] = cursor.rowcount
+
+    with report.phase('gravação diagnoses'):
+        legacy = {code: index.pillar_codes.index(code) for code in LEGACY_PILLAR_COLUMNS
+                  if code in index.pillar_codes}
+        cursor.execute("""
+            CREATE TEMP TABLE new_overall_scores (
+                id TEXT, overall_score DECIMAL(5,2), environmental_score DECIMAL(5,2),
+                social_score DECIMAL(5,2), governance_score DECIMAL(5,2), legacy BOOLEAN
+            ) ON COMMIT DROP;
+        """)
+
+        def legacy_value(row, code):
+            column = legacy.get(code)
+            if column is None or not result['mask'][row, column]:
+                return '\\N'
+            return f"{result['pillar_scores'][row, column]:.2f}"
+
+        _copy_lines(cursor, 'new_overall_scores',
+                    ('id', 'overall_score', 'environmental_score', 'social_score', 'governance_score', 'legacy'),
+                    (f"{diagnosis_id}\t{overall:.2f}\t{legacy_value(row, 'E')}\t{legacy_value(row, 'S')}\t"
+                     f"{legacy_value(row, 'G')}\t{'t' if result['frameworks'][row] in ('ESG', 'ESG_GRI') else 'f'}\n"
+                     for row, (diagnosis_id, overall) in enumerate(zip(ids, result['overall'].tolist()))))
+        # Colunas legadas só para ESG/ESG_GRI e só de diagnósticos concluídos, como no
+        # calculateAllScores (parciais de diagnósticos em andamento ficam em diagnosis_scores)
+        cursor.execute("""
+            UPDATE diagnoses d SET
+                overall_score = n.overall_score,
+                environmental_score = CASE WHEN n.legacy THEN n.environmental_score ELSE d.environmental_score END,
+                social_score = CASE WHEN n.legacy THEN n.social_score ELSE d.social_score END,
+                governance_score = CASE WHEN n.legacy THEN n.governance_score ELSE d.governance_score END
+            FROM new_overall_scores n
+            WHERE d.id = n.id AND d.status = 'completed' AND (
+                d.overall_score IS DISTINCT FROM n.overall_score
+                OR (n.legacy AND (d.environmental_score, d.social_score, d.governance_score)
+                    IS DISTINCT FROM (n.environmental_score, n.social_score, n.governance_score))
+            );
+        """)
+        written['diagnoses'] = cursor.rowcount
+
+    with report.phase('gravação diagnosis_theme_scores'):
+        cursor.execute("""
+            CREATE TEMP TABLE new_theme_scores (diagnosis_id TEXT, theme_id INTEGER, score DECIMAL(5,2))
+            ON COMMIT DROP;
+        """)
+        themes = len(index.theme_ids)
+        rows = (result['theme_keys'] // themes).tolist()
+        theme_ids = index.theme_ids[result['theme_keys'] % themes].tolist() if themes else []
+        _copy_lines(cursor, 'new_theme_scores', ('diagnosis_id', 'theme_id', 'score'),
+                    (f"{ids[row]}\t{theme_id}\t{score:.2f}\n"
+                     for row, theme_id, score in zip(rows, theme_ids, result['theme_scores'].tolist())))
+        cursor.execute("""
+            INSERT INTO diagnosis_theme_scores (diagnosis_id, theme_id, score)
+            SELECT diagnosis_id, theme_id, score FROM new_theme_scores
+            ON CONFLICT (diagnosis_id, theme_id) DO UPDATE
+                SET score = EXCLUDED.score, updated_at = CURRENT_TIMESTAMP
+            WHERE diagnosis_theme_scores.score IS DISTINCT FROM EXCLUDED.score;
+        """)
+        written['diagnosis_theme_scores'] = cursor.rowcount
+        # Temas que ficaram sem respostas nos diagnósticos recalculados
+        cursor.execute("""
+            DELETE FROM diagnosis_theme_scores t
+            USING new_overall_scores n
+            WHERE t.diagnosis_id = n.id
+              AND NOT EXISTS (SELECT 1 FROM new_theme_scores s
+                              WHERE s.diagnosis_id = t.diagnosis_id AND s.theme_id = t.theme_id);
+        """)
+        written['diagnosis_theme_scores'] += cursor.rowcount
+
+    with report.phase('commit'):
+        conn.commit()
+    cursor.close()
+    return written
+
+
+def print_summary(result):
+    index = result['index']
+    print(f"\n📊 {len(result['diagnosis_ids'])} diagnósticos, {result['responses']} respostas "
+          f"({result['ignored']} fora do catálogo), {index.items} questões no índice")
+    for column, code in enumerate(index.pillar_codes):
+        scored = result['mask'][:, column]
+        if scored.any():
+            values = result['pillar_scores'][scored, column]
+            print(f"  - {code:<7} média {values.mean():6.2f}  p50 {np.percentile(values, 50):6.2f}  "
+                  f"({int(scored.sum())} diagnósticos)")
+    if len(result['overall']):
+        print(f"  - {'Geral':<7} média {result['overall'].mean():6.2f}  p50 {np.percentile(result['overall'], 50):6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recálculo em lote das pontuações dos diagnósticos')
+    parser.add_argument('--status', help="Filtra diagnósticos por status (ex.: completed); padrão: todos")
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // (1024 * 1024),
+                        help='MB do COPY de respostas acumulados por bloco')
+    parser.add_argument('--dry-run', action='store_true', help='Calcula e mostra o resumo, sem gravar')
+    args = parser.parse_args()
+
+    print("\n" + "="*60)
+    print("🧮 GREENA - Recálculo de Pontuações em Lote")
+    print("="*60)
+
+    report = SeedReport('score_diagnoses')
+    pool = get_pool(cursor_factory=CountingCursor)
+    try:
+        with pool.connection() as conn:
+            if not args.dry_run:
+                migrate(conn)
+            result = compute_scores(conn, report, args.status, args.chunk_mb * 1024 * 1024)
+            print_summary(result)
+            if args.dry_run:
+                conn.rollback()
+            else:
+                written = write_scores(conn, report, result)
+                print("\n✅ Linhas alteradas: " + ', '.join(f"{table} {count}" for table, count in written.items()))
+        report.print_report()
+        pool.metrics.print_report()
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
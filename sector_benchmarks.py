@@ -0,0 +1,378 @@
+"""
+Cubo de benchmark setorial pré-calculado (framework × setor × métrica)
+Substitui o cálculo feito a cada requisição em getBenchmarking, que carrega
+todos os diagnósticos concluídos do setor e remove duplicados por usuário.
+
+Regras (as mesmas do backend):
+- cada usuário ativo com setor entra uma vez por framework, com o diagnóstico
+  concluído mais recente
+- métricas: 'overall' (diagnoses.overall_score) e cada pilar (diagnosis_scores)
+- percentil = % de empresas do setor com pontuação estritamente menor,
+  contado exatamente (sem interpolação)
+- diagnóstico concluído sem overall_score (ainda não pontuado) não entra nas
+  contas: fica como membro sem pontuação e é informado em missingScores
+
+Tabelas:
+  sector_benchmarks          uma linha por (framework, setor, métrica): empresas,
+                             soma, melhor, pior, sem pontuação e histograma
+                             cumulativo com um bin por valor possível
+                             (BIN_WIDTH = 0,01), para percentil exato em O(1)
+  sector_benchmark_members   contribuição atual de cada usuário (permite
+                             remover a anterior quando ele conclui outro diagnóstico)
+  sector_benchmark_state     marca d'água da última atualização
+
+A atualização é incremental: só usuários com diagnósticos concluídos desde a
+marca d'água, com pontuação recalculada (score_diagnoses.py) ou que mudaram
+de setor/ficaram inativos têm a contribuição trocada, por delta.
+
+INSTRUÇÕES DE USO:
+  python sector_benchmarks.py                 # atualização incremental (ex.: a cada 5 min)
+  python sector_benchmarks.py --full          # reconstrói o cubo inteiro
+  python sector_benchmarks.py --lookup ESG Agronegócio 62.5 [overall|E|S|G...]
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db_pool import get_pool
+
+# Largura dos bins do histograma (pontos de 0-100): as pontuações têm duas
+# casas (DECIMAL(5,2)), então com 10001 bins cada valor tem o seu e a contagem
+# de pontuações menores é exata
+BIN_WIDTH = 0.01
+BINS = int(round(100 / BIN_WIDTH)) + 1
+
+OVERALL_METRIC = 'overall'
+
+# Mínimo de empresas para exibir o benchmark (getBenchmarking)
+MIN_COMPANIES = 3
+
+# Diagnósticos concluídos pouco antes da marca d'água podem ter sido gravados
+# depois dela; a janela é reprocessada (a troca por delta é idempotente)
+WATERMARK_OVERLAP = '5 minutes'
+
+# Chave do advisory lock: uma atualização por vez
+ADVISORY_LOCK_KEY = 4711001
+
+
+def ensure_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sector_benchmarks (
+            framework TEXT NOT NULL,
+            sector TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            companies INTEGER NOT NULL,
+            score_sum NUMERIC NOT NULL,
+            best DECIMAL(5,2),
+            worst DECIMAL(5,2),
+            missing INTEGER NOT NULL DEFAULT 0,
+            cumulative INTEGER[] NOT NULL,
+            updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (framework, sector, metric)
+        );
+        CREATE TABLE IF NOT EXISTS sector_benchmark_members (
+            framework TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            sector TEXT NOT NULL,
+            diagnosis_id TEXT NOT NULL,
+            score DECIMAL(5,2),
+            PRIMARY KEY (framework, user_id, metric)
+        );
+        -- Tabelas de antes da contagem dos diagnósticos sem pontuação
+        ALTER TABLE sector_benchmarks ADD COLUMN IF NOT EXISTS missing INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE sector_benchmark_members ALTER COLUMN score DROP NOT NULL;
+        CREATE INDEX IF NOT EXISTS sector_benchmark_members_group_idx
+            ON sector_benchmark_members (framework, sector, metric, score);
+        CREATE TABLE IF NOT EXISTS sector_benchmark_state (
+            id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+            watermark TIMESTAMP(3),
+            updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.commit()
+    cursor.close()
+
+
+def score_bin(score):
+    return min(BINS - 1, max(0, int(round(float(score) / BIN_WIDTH))))
+
+
+def _changed_users(cursor, watermark):
+    """Usuários cuja contribuição pode ter mudado desde a última atualização"""
+    users = set()
+    if watermark is not None:
+        cursor.execute(f"""
+            SELECT DISTINCT user_id FROM diagnoses
+            WHERE status = 'completed' AND completed_at > %s::timestamp - interval '{WATERMARK_OVERLAP}';
+        """, (watermark,))
+        users.update(row[0] for row in cursor.fetchall())
+    # Pontuação recalculada, mudança de setor/inativação ou diagnóstico reaberto
+    cursor.execute("""
+        SELECT DISTINCT m.user_id
+        FROM sector_benchmark_members m
+        JOIN users u ON u.id = m.user_id
+        LEFT JOIN diagnoses d ON d.id = m.diagnosis_id
+        LEFT JOIN pillars p ON p.code = m.metric
+        LEFT JOIN diagnosis_scores ds ON ds.diagnosis_id = d.id AND ds.pillar_id = p.id
+        WHERE d.id IS NULL OR NOT u.is_active OR u.sector IS DISTINCT FROM m.sector OR d.status <> 'completed'
+           OR m.score IS DISTINCT FROM CASE WHEN m.metric = %s THEN d.overall_score ELSE ds.score END;
+    """, (OVERALL_METRIC,))
+    users.update(row[0] for row in cursor.fetchall())
+    return users
+
+
+def _desired_members(cursor, users=None):
+    """
+    Contribuição correta de cada usuário: diagnóstico concluído mais recente
+    por framework, com a pontuação geral (None se o diagnóstico ainda não foi
+    pontuado) e a de cada pilar.
+    """
+    cursor.execute(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (d.framework, d.user_id)
+                   d.framework, d.user_id, u.sector, d.id AS diagnosis_id, d.overall_score
+            FROM diagnoses d
+            JOIN users u ON u.id = d.user_id
+            WHERE d.status = 'completed' AND u.is_active AND u.sector IS NOT NULL
+              {'AND d.user_id = ANY(%s)' if users is not None else ''}
+            ORDER BY d.framework, d.user_id, d.completed_at DESC NULLS LAST, d.id
+        )
+        SELECT framework, user_id, %s, sector, diagnosis_id, overall_score
+        FROM latest
+        UNION ALL
+        SELECT l.framework, l.user_id, p.code, l.sector, l.diagnosis_id, ds.score
+        FROM latest l
+        JOIN diagnosis_scores ds ON ds.diagnosis_id = l.diagnosis_id
+        JOIN pillars p ON p.id = ds.pillar_id;
+    """, ((list(users),) if users is not None else ()) + (OVERALL_METRIC,))
+    return {(fw, user, metric): (sector, diagnosis, score)
+            for fw, user, metric, sector, diagnosis, score in cursor.fetchall()}
+
+
+def _current_members(cursor, users=None):
+    if users is None:
+        cursor.execute("SELECT framework, user_id, metric, sector, diagnosis_id, score FROM sector_benchmark_members;")
+    else:
+        cursor.execute("""
+            SELECT framework, user_id, metric, sector, diagnosis_id, score
+            FROM sector_benchmark_members WHERE user_id = ANY(%s);
+        """, (list(users),))
+    return {(fw, user, metric): (sector, diagnosis, score)
+            for fw, user, metric, sector, diagnosis, score in cursor.fetchall()}
+
+
+class _GroupDelta:
+    """Variação de empresas, soma, sem pontuação e histograma de um grupo (framework, setor, métrica)"""
+
+    __slots__ = ('companies', 'score_sum', 'missing', 'histogram')
+
+    def __init__(self):
+        self.companies = 0
+        self.score_sum = 0
+        self.missing = 0
+        self.histogram = np.zeros(BINS, dtype=np.int64)
+
+    def add(self, score, sign):
+        if score is None:
+            self.missing += sign
+            return
+        self.companies += sign
+        self.score_sum += sign * score
+        self.histogram[score_bin(score)] += sign
+
+
+def merge_cumulative(cumulative, histogram):
+    """
+    Soma um histograma (variação por bin) ao histograma cumulativo do grupo:
+    cumulative[i] = pontuações nos bins abaixo de i (BINS + 1 posições)
+    """
+    cumulative = np.array(cumulative if cumulative else [0] * (BINS + 1), dtype=np.int64)
+    cumulative[1:] += np.cumsum(histogram)
+    return cumulative
+
+
+def apply_member_changes(cursor, current, desired):
+    """Troca as contribuições alteradas e aplica os deltas no cubo"""
+    deltas = {}
+    removed, upserted = [], []
+    for key in current.keys() | desired.keys():
+        before, after = current.get(key), desired.get(key)
+        if before == after:
+            continue
+        framework, user_id, metric = key
+        if before is not None:
+            deltas.setdefault((framework, before[0], metric), _GroupDelta()).add(before[2], -1)
+            if after is None:
+                removed.append(key)
+        if after is not None:
+            deltas.setdefault((framework, after[0], metric), _GroupDelta()).add(after[2], 1)
+            upserted.append(key + after)
+    if not deltas:
+        return 0, 0
+
+    if removed:
+        execute_values(cursor, """
+            DELETE FROM sector_benchmark_members m USING (VALUES %s) AS r (framework, user_id, metric)
+            WHERE m.framework = r.framework AND m.user_id = r.user_id AND m.metric = r.metric;
+        """, removed)
+    if upserted:
+        execute_values(cursor, """
+            INSERT INTO sector_benchmark_members (framework, user_id, metric, sector, diagnosis_id, score)
+            VALUES %s
+            ON CONFLICT (framework, user_id, metric) DO UPDATE SET
+                sector = EXCLUDED.sector, diagnosis_id = EXCLUDED.diagnosis_id, score = EXCLUDED.score;
+        """, upserted)
+
+    groups = list(deltas)
+    cursor.execute("""
+        SELECT framework, sector, metric, companies, score_sum, missing, cumulative
+        FROM sector_benchmarks
+        WHERE (framework, sector, metric) IN (SELECT * FROM unnest(%s::text[], %s::text[], %s::text[]))
+        FOR UPDATE;
+    """, ([g[0] for g in groups], [g[1] for g in groups], [g[2] for g in groups]))
+    existing = {row[:3]: row[3:] for row in cursor.fetchall()}
+
+    # Melhor/pior não dá para desfazer por delta: vêm dos membros (índice do grupo)
+    cursor.execute("""
+        SELECT framework, sector, metric, max(score), min(score)
+        FROM sector_benchmark_members
+        WHERE (framework, sector, metric) IN (SELECT * FROM unnest(%s::text[], %s::text[], %s::text[]))
+        GROUP BY framework, sector, metric;
+    """, ([g[0] for g in groups], [g[1] for g in groups], [g[2] for g in groups]))
+    extremes = {row[:3]: row[3:] for row in cursor.fetchall()}
+
+    rows, empty = [], []
+    for group, delta in deltas.items():
+        companies, score_sum, missing, cumulative = existing.get(group, (0, 0, 0, None))
+        cumulative = merge_cumulative(cumulative, delta.histogram)
+        companies += delta.companies
+        missing += delta.missing
+        if companies <= 0 and missing <= 0:
+            empty.append(group)
+            continue
+        best, worst = extremes.get(group, (None, None))
+        rows.append(group + (companies, score_sum + delta.score_sum, best, worst, missing, cumulative.tolist()))
+
+    if rows:
+        execute_values(cursor, """
+            INSERT INTO sector_benchmarks
+                (framework, sector, metric, companies, score_sum, best, worst, missing, cumulative)
+            VALUES %s
+            ON CONFLICT (framework, sector, metric) DO UPDATE SET
+                companies = EXCLUDED.companies, score_sum = EXCLUDED.score_sum, best = EXCLUDED.best,
+                worst = EXCLUDED.worst, missing = EXCLUDED.missing, cumulative = EXCLUDED.cumulative,
+                updated_at = CURRENT_TIMESTAMP;
+        """, rows, template='(%s, %s, %s, %s, %s, %s, %s, %s, %s::integer[])')
+    if empty:
+        execute_values(cursor, """
+            DELETE FROM sector_benchmarks b USING (VALUES %s) AS e (framework, sector, metric)
+            WHERE b.framework = e.framework AND b.sector = e.sector AND b.metric = e.metric;
+        """, empty)
+    return len(upserted) + len(removed), len(deltas)
+
+
+def refresh(conn, full=False):
+    """Atualiza o cubo (incremental, ou completo com `full`) em uma transação"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s);", (ADVISORY_LOCK_KEY,))
+    cursor.execute("SELECT watermark FROM sector_benchmark_state;")
+    row = cursor.fetchone()
+    watermark = row[0] if row else None
+    cursor.execute("SELECT max(completed_at) FROM diagnoses WHERE status = 'completed';")
+    new_watermark = cursor.fetchone()[0]
+    # Cubo gravado com outra largura de bin: reconstrói
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM sector_benchmarks WHERE cardinality(cumulative) <> %s);",
+                   (BINS + 1,))
+    full = full or cursor.fetchone()[0]
+
+    if full or watermark is None:
+        cursor.execute("TRUNCATE sector_benchmarks, sector_benchmark_members;")
+        current, desired = {}, _desired_members(cursor)
+        users = None
+    else:
+        users = _changed_users(cursor, watermark)
+        current = _current_members(cursor, users) if users else {}
+        desired = _desired_members(cursor, users) if users else {}
+
+    members, groups = apply_member_changes(cursor, current, desired)
+    cursor.execute("""
+        INSERT INTO sector_benchmark_state (id, watermark) VALUES (true, %s)
+        ON CONFLICT (id) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = CURRENT_TIMESTAMP;
+    """, (new_watermark or watermark,))
+    conn.commit()
+    cursor.close()
+    return {'users': len(users) if users is not None else None, 'members': members, 'groups': groups}
+
+
+def sector_benchmark(cursor, framework, sector, score, metric=OVERALL_METRIC):
+    """
+    Benchmark de uma pontuação no setor a partir de uma única linha indexada
+    (mesmos campos de getBenchmarking). Percentil exato: empresas com
+    pontuação estritamente menor / empresas com pontuação.
+    """
+    # Bins abaixo de `score` (o primeiro valor de duas casas >= score fica de fora)
+    position = min(BINS, max(0, math.ceil(float(score) / BIN_WIDTH - 1e-6)))
+    cursor.execute("""
+        SELECT companies, score_sum, best, worst, missing, cumulative[%s]
+        FROM sector_benchmarks
+        WHERE framework = %s AND sector = %s AND metric = %s;
+    """, (position + 1, framework, sector, metric))
+    row = cursor.fetchone()
+    companies = row[0] if row else 0
+    if companies < MIN_COMPANIES:
+        return {'insufficient': True,
+                'reason': f"Dados insuficientes ({companies} empresas no setor {sector})"}
+    companies, score_sum, best, worst, missing, below = row
+    return {
+        'insufficient': False,
+        'sector': sector,
+        'metric': metric,
+        'companiesCount': companies,
+        'sectorAverage': round(float(score_sum) / companies, 2),
+        'percentile': int(np.floor(below / companies * 100 + 0.5)),
+        'sectorBest': float(best),
+        'sectorWorst': float(worst),
+        'missingScores': missing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cubo de benchmark setorial')
+    parser.add_argument('--full', action='store_true', help='Reconstrói o cubo inteiro')
+    parser.add_argument('--lookup', nargs='+', metavar='ARG',
+                        help='FRAMEWORK SETOR PONTUAÇÃO [MÉTRICA]: consulta o cubo')
+    args = parser.parse_args()
+
+    pool = get_pool()
+    try:
+        with pool.connection() as conn:
+            ensure_tables(conn)
+            if args.lookup:
+                if len(args.lookup) not in (3, 4):
+                    parser.error('--lookup espera FRAMEWORK SETOR PONTUAÇÃO [MÉTRICA]')
+                framework, sector, score = args.lookup[:3]
+                metric = args.lookup[3] if len(args.lookup) == 4 else OVERALL_METRIC
+                started = time.perf_counter()
+                with conn.cursor() as cursor:
+                    result = sector_benchmark(cursor, framework, sector, float(score), metric)
+                print(f"{result}\n⏱️  {(time.perf_counter() - started) * 1000:.2f} ms")
+                return
+
+            started = time.perf_counter()
+            stats = refresh(conn, full=args.full)
+            users = 'todos' if stats['users'] is None else stats['users']
+            print(f"✅ Benchmark setorial atualizado em {(time.perf_counter() - started) * 1000:.1f} ms: "
+                  f"{users} usuários verificados, {stats['members']} contribuições trocadas, "
+                  f"{stats['groups']} grupos alterados")
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def repo_file():
+    """Caminho de um arquivo do repositório (os JSON do catálogo)"""
+    return lambda *parts: os.path.join(ROOT, *parts)
+
+
+@pytest.fixture
+def small_catalogue():
+    """
+    Catálogo mínimo no formato lido pelo CatalogueIndex: pilar E (ESG, questões
+    1 e 2) e pilares G1 e G2 (GRI, questões 3 e 4 e questão 5), um tema e um
+    critério por pilar.
+    """
+    return SimpleNamespace(
+        pillar_ids=[10, 20, 30], pillar_codes=['E', 'G1', 'G2'], pillar_frameworks=['ESG', 'GRI', 'GRI'],
+        theme_ids=[100, 200, 300], theme_pillar=[0, 1, 2],
+        criteria_ids=[1000, 2000, 3000], criteria_theme=[0, 1, 2],
+        item_ids=[1, 2, 3, 4, 5], item_criteria=[0, 0, 1, 1, 2],
+    )
@@ -0,0 +1,40 @@
+import pytest
+
+from catalogue_search import HIGHLIGHT, _restore_accents, fold, highlight_similar
+
+START, STOP = HIGHLIGHT
+
+
+def marked(word):
+    return f"{START}{word}{STOP}"
+
+
+def test_fold():
+    assert fold('Ação de Gestão ÂMBITO') == 'acao de gestao ambito'
+
+
+@pytest.mark.parametrize('headline, original, expected', [
+    # Marcadores calculados sobre o texto sem acentos voltam para o original
+    (f"{START}Emissoes{STOP} de gases", 'Emissões de gases', f"{START}Emissões{STOP} de gases"),
+    (f"Gestao de {START}residuos{STOP} {START}solidos{STOP}", 'Gestão de resíduos sólidos',
+     f"Gestão de {START}resíduos{STOP} {START}sólidos{STOP}"),
+    (f"{START}Acao{STOP}", 'Ação', f"{START}Ação{STOP}"),
+    ('sem destaque', 'sem destaque', 'sem destaque'),
+    # Tamanho diferente (ex.: 'æ' -> 'ae'): fica o texto sem acentos
+    (f"{START}aeon{STOP}", 'æon', f"{START}aeon{STOP}"),
+])
+def test_restore_accents(headline, original, expected):
+    assert _restore_accents(headline, original) == expected
+
+
+def test_highlight_similar_ignores_accents_and_inflection():
+    assert highlight_similar('Emissões de gases de efeito estufa', 'emissao gas') == \
+        f"{marked('Emissões')} de {marked('gases')} de efeito estufa"
+    assert highlight_similar('Gestão de resíduos sólidos', 'RESIDUO') == f"Gestão de {marked('resíduos')} sólidos"
+
+
+def test_highlight_similar_keeps_text():
+    text = 'Política de diversidade, equidade e inclusão'
+    assert highlight_similar(text, 'carbono') == text
+    assert highlight_similar(text, '') == text
+    assert highlight_similar(text, 'DIVERSIDADE').replace(START, '').replace(STOP, '') == text
@@ -0,0 +1,83 @@
+import json
+import shutil
+
+import pytest
+
+from catalogue_snapshot import (DEFAULT_SOURCES, CatalogueSnapshot, catalogue_from_json, open_snapshot,
+                                sources_hash, write_snapshot)
+
+COLUMNS = ('pillar_ids', 'pillar_codes', 'pillar_names', 'pillar_frameworks', 'pillar_item_start',
+           'pillar_item_end', 'theme_ids', 'theme_names', 'theme_pillar', 'criteria_ids', 'criteria_names',
+           'criteria_theme', 'item_ids', 'item_criteria', 'item_order')
+
+
+@pytest.fixture
+def sources(repo_file, tmp_path):
+    copied = {}
+    for framework, path in DEFAULT_SOURCES.items():
+        copied[framework] = str(tmp_path / f"{framework}.json")
+        shutil.copyfile(repo_file(path), copied[framework])
+    return copied
+
+
+@pytest.fixture
+def catalogue(sources):
+    return catalogue_from_json(sources)
+
+
+@pytest.fixture
+def snapshot_path(catalogue, sources, tmp_path):
+    path = str(tmp_path / 'catalogue.snapshot')
+    write_snapshot(catalogue, path, sources)
+    return path
+
+
+def test_round_trip(catalogue, snapshot_path):
+    snapshot = CatalogueSnapshot(snapshot_path)
+    assert snapshot.verify()
+    assert snapshot.version is None
+    for column in COLUMNS:
+        assert list(getattr(snapshot, column)) == list(getattr(catalogue, column)), column
+    assert snapshot.pillars() == catalogue.pillars()
+    for item_id in catalogue.item_ids:
+        assert snapshot.item(item_id) == catalogue.item(item_id)
+        assert snapshot.item_path(item_id) == catalogue.item_path(item_id)
+        assert snapshot.data_fields(item_id) == catalogue.data_fields(item_id)
+    for pillar_id in catalogue.pillar_ids:
+        assert list(snapshot.pillar_item_ids(pillar_id)) == list(catalogue.pillar_item_ids(pillar_id))
+    assert 0 not in snapshot and catalogue.item_ids[-1] + 1 not in snapshot
+
+
+def test_item_order_within_criteria(catalogue, sources):
+    # Mesmo order_index do seed: posição da questão no critério, a partir de 1
+    expected = {}
+    for path in sources.values():
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        for pillar in data.values():
+            positions = {}
+            for question in pillar.get('questions', []):
+                key = (question['theme'], question['criteria'])
+                positions[key] = positions.get(key, 0) + 1
+                expected.setdefault(question['question'], set()).add(positions[key])
+    for position, question in enumerate(catalogue.item_questions):
+        assert catalogue.item_order[position] in expected[question]
+    for criteria in set(catalogue.item_criteria):
+        orders = [order for owner, order in zip(catalogue.item_criteria, catalogue.item_order) if owner == criteria]
+        assert orders == list(range(1, len(orders) + 1))
+
+
+def test_snapshot_tracks_sources(snapshot_path, sources):
+    assert CatalogueSnapshot(snapshot_path).sources_hash == sources_hash(sources)
+    assert open_snapshot(snapshot_path, sources=sources) is not None
+    with open(sources['ESG'], 'a', encoding='utf-8') as f:
+        f.write('\n')
+    assert open_snapshot(snapshot_path, sources=sources) is None
+
+
+def test_truncated_snapshot(snapshot_path):
+    with open(snapshot_path, 'r+b') as f:
+        f.truncate(64)
+    with pytest.raises(ValueError):
+        CatalogueSnapshot(snapshot_path)
+    assert open_snapshot(snapshot_path) is None
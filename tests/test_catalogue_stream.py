@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from catalogue_snapshot import DEFAULT_SOURCES
+from catalogue_stream import iter_questions
+
+
+def _loaded(path, pillars=None):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return [(code, question) for code, pillar in data.items() if pillars is None or code in pillars
+            for question in pillar.get('questions', [])]
+
+
+@pytest.mark.parametrize('framework', sorted(DEFAULT_SOURCES))
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, 64 * 1024])
+def test_matches_json_load(repo_file, framework, chunk_size):
+    path = repo_file(DEFAULT_SOURCES[framework])
+    assert list(iter_questions(path, chunk_size=chunk_size)) == _loaded(path)
+
+
+def test_pillar_filter(repo_file):
+    path = repo_file(DEFAULT_SOURCES['ESG'])
+    assert list(iter_questions(path, pillars={'S'})) == _loaded(path, {'S'})
+
+
+def test_strings_and_nesting(tmp_path):
+    data = {
+        'E': {
+            'name': 'Ambiental {"}',
+            'questions': [
+                {'id': 1, 'question': 'Chaves } e ] em texto, aspas \\" e "citação"', 'theme': 'Água',
+                 'criteria': 'Gestão', 'dataFields': [{'name': 'x', 'options': ['a', {'b': [1, 2.5, None]}]}]},
+                {'id': 2, 'question': 'Emissões de CO₂ — escopo 1', 'theme': 'Clima', 'criteria': 'GEE',
+                 'griCode': '305-1', 'dataFields': None},
+            ],
+            'extra': {'questions': [{'id': 99}]},
+        },
+        'S': {'questions': []},
+        'G': {'name': 'Governança', 'questions': [{'id': 3, 'question': '', 'flag': True}]},
+    }
+    path = tmp_path / 'catalogue.json'
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+    for chunk_size in (1, 3, 1024):
+        assert list(iter_questions(str(path), chunk_size=chunk_size)) == _loaded(str(path))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from crosswalk import Crosswalk
+
+MAPPINGS = [
+    (1, 3, 'alta'),
+    (1, 3, 'baixa'),          # par repetido: fica o maior peso
+    (1, 5, 'baixa'),
+    (2, 3, 'media'),
+    (2, 4, 'media'),
+    (1, 99, 'alta'),          # questão fora do catálogo
+    (2, 5, 'desconhecida'),   # nível sem peso
+]
+
+
+def _batch(rows, items=5):
+    """CSR (valor/5, respondida) a partir de [{id da questão: evaluationValue}]"""
+    data, row_index, columns = [], [], []
+    for row, answers in enumerate(rows):
+        for item_id, value in answers.items():
+            data.append(value / 5)
+            row_index.append(row)
+            columns.append(item_id - 1)
+    values = sparse.csr_matrix((data, (row_index, columns)), shape=(len(rows), items))
+    answered = sparse.csr_matrix((np.ones(len(data)), (row_index, columns)), shape=(len(rows), items))
+    return values, answered
+
+
+@pytest.fixture
+def crosswalk(small_catalogue):
+    return Crosswalk(small_catalogue, MAPPINGS)
+
+
+def test_compiled_mappings(crosswalk):
+    assert crosswalk.mappings == 4
+    assert crosswalk.skipped == 2
+
+
+def test_esg_to_gri(crosswalk):
+    projection = crosswalk.project(*_batch([{1: 4, 2: 5}, {2: 2}, {}]), 'ESG')
+
+    scores = projection.item_scores.toarray()
+    np.testing.assert_allclose(scores[0], [0, 0, 1.4 / 1.6, 1.0, 0.8])
+    np.testing.assert_allclose(scores[1], [0, 0, 0.4, 0.4, 0])
+    assert projection.item_scores[2].nnz == 0
+    np.testing.assert_allclose(projection.item_confidence.toarray()[:2],
+                               [[0, 0, 1, 1, 1], [0, 0, 0.6 / 1.6, 1, 0]])
+
+    # G1: (1,0 × 0,8 + 1,2 × 1,0) / 2,2; G2: só a questão 1, peso 0,3
+    np.testing.assert_array_equal(projection.pillar_scores[0], [np.nan, 90.91, 80.0])
+    np.testing.assert_array_equal(projection.pillar_scores[1], [np.nan, 40.0, np.nan])
+    assert np.isnan(projection.pillar_scores[2]).all()
+    np.testing.assert_allclose(projection.pillar_confidence,
+                               [[0, 1, 1], [0, 1.2 / 2.2, 0], [0, 0, 0]])
+
+
+def test_gri_to_esg(crosswalk):
+    # Só a questão 3 respondida; a confiança é sobre todo o peso que chega ao destino
+    projection = crosswalk.project(*_batch([{3: 3}]), 'GRI')
+
+    np.testing.assert_allclose(projection.item_scores.toarray(), [[0.6, 0.6, 0, 0, 0]])
+    np.testing.assert_allclose(projection.item_confidence.toarray(), [[1.0 / 1.3, 0.6 / 1.2, 0, 0, 0]])
+    np.testing.assert_array_equal(projection.pillar_scores, [[60.0, np.nan, np.nan]])
+    np.testing.assert_allclose(projection.pillar_confidence, [[1.6 / 2.5, 0, 0]])
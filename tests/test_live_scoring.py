@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from live_scoring import aggregate_scores
+from score_diagnoses import CatalogueIndex
+
+DIAGNOSES = [('d1', 'ESG'), ('d2', 'GRI'), ('d3', None), ('d4', 'ESG_GRI')]
+
+# (diagnóstico, nível, nó, soma, válidas) como em diagnosis_aggregates
+AGGREGATES = [
+    ('d1', 'pillar', 10, 18, 4),
+    ('d1', 'theme', 100, 18, 4),
+    ('d1', 'criteria', 1000, 18, 4),      # nível não usado
+    ('d2', 'pillar', 20, 7, 2),
+    ('d2', 'pillar', 30, 0, 0),           # só 'Não se aplica'
+    ('d2', 'theme', 300, 0, 0),
+    ('d2', 'theme', 200, 7, 2),
+    ('d4', 'pillar', 10, 5, 1),
+    ('d4', 'pillar', 20, 3, 3),
+    ('d4', 'pillar', 30, 2, 3),
+    ('d4', 'pillar', 99, 5, 1),           # pilar fora do catálogo
+    ('gone', 'pillar', 10, 5, 1),         # diagnóstico apagado
+]
+
+
+@pytest.fixture
+def result(small_catalogue):
+    return aggregate_scores(CatalogueIndex(small_catalogue), DIAGNOSES, AGGREGATES)
+
+
+def test_pillar_scores(result):
+    assert result['diagnosis_ids'] == ['d1', 'd2', 'd3', 'd4']
+    assert result['frameworks'] == ['ESG', 'GRI', 'ESG', 'ESG_GRI']
+    np.testing.assert_array_equal(result['pillar_scores'], [
+        [90.0, 0.0, 0.0],
+        [0.0, 70.0, 0.0],
+        [0.0, 0.0, 0.0],
+        [100.0, 20.0, 13.33],
+    ])
+    np.testing.assert_array_equal(result['mask'], [
+        [True, False, False],
+        [False, True, True],
+        [True, False, False],
+        [True, True, True],
+    ])
+
+
+def test_overall_uses_framework_pillars(result):
+    # d4: (100 + 20 + 13,33) / 3 com o arredondamento do backend
+    np.testing.assert_array_equal(result['overall'], [90.0, 35.0, 0.0, 44.44])
+
+
+def test_theme_scores(result):
+    # Chave = linha do diagnóstico × temas + posição do tema, em ordem
+    np.testing.assert_array_equal(result['theme_keys'], [0 * 3 + 0, 1 * 3 + 1, 1 * 3 + 2])
+    np.testing.assert_array_equal(result['theme_scores'], [90.0, 70.0, 0.0])
+
+
+def test_no_changes(small_catalogue):
+    result = aggregate_scores(CatalogueIndex(small_catalogue), [], [])
+    assert result['pillar_scores'].shape == (0, 3)
+    assert len(result['overall']) == 0 and len(result['theme_keys']) == 0
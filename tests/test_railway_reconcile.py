@@ -0,0 +1,179 @@
+import json
+import random
+import threading
+
+import pytest
+
+import railway_client
+from railway_client import MockRailway, RailwayClient, RailwayError, RailwayUncertainError, create_or_find
+from railway_reconcile import diff_state, fetch_current_state, load_desired_state, reconcile
+
+DESIRED = {
+    'project': 'GREENA ESG Platform',
+    'environment': 'production',
+    'repo': 'org/greena',
+    'services': {
+        'api': {'rootDirectory': 'backend', 'variables': {'NODE_ENV': 'production', 'PORT': '3000'}},
+        'web': {'rootDirectory': 'frontend', 'variables': {}},
+    },
+}
+
+
+class LossyRailway(MockRailway):
+    """MockRailway que aplica e perde a primeira resposta de cada operação em `lose`"""
+
+    def __init__(self, lose, **kwargs):
+        self.lose = set(lose)
+        self._local = threading.local()
+        super().__init__(**kwargs)
+
+    # O handler consulta lost_rate logo depois do _resolve, na mesma thread
+    @property
+    def lost_rate(self):
+        return getattr(self._local, 'lost_rate', 0.0)
+
+    @lost_rate.setter
+    def lost_rate(self, value):
+        pass
+
+    def _resolve(self, query, variables):
+        data = super()._resolve(query, variables)
+        operation = next(iter(data))
+        with self._lock:
+            lost = operation in self.lose
+            self.lose.discard(operation)
+        self._local.lost_rate = 1.0 if lost else 0.0
+        return data
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(railway_client, 'retry_delay', lambda attempt: 0.0)
+
+
+def _client(mock):
+    return RailwayClient('mock-token', api=mock.url, rate=1000, burst=1000)
+
+
+def _state(mock):
+    """{projeto: {serviço: variáveis do ambiente production}} guardado no mock"""
+    state = {}
+    for project_id, project in mock.projects.items():
+        environment_id = next(iter(project['environments']))
+        services = state.setdefault(project['name'], {})
+        for service_id, service in project['services'].items():
+            assert service['name'] not in services, f"serviço duplicado: {service['name']}"
+            services[service['name']] = mock.variables(project_id, environment_id, service_id)
+    return state
+
+
+def _expected():
+    return {DESIRED['project']: {name: service['variables'] for name, service in DESIRED['services'].items()}}
+
+
+def test_creates_then_converges():
+    with MockRailway(latency=0) as mock, _client(mock) as client:
+        service_ids = reconcile(client, DESIRED)
+        assert set(service_ids) == set(DESIRED['services']) and all(service_ids.values())
+        assert _state(mock) == _expected()
+
+        # Sem mudanças: só leituras (estado + variáveis de cada serviço)
+        before = mock.requests
+        assert reconcile(client, DESIRED) == service_ids
+        assert mock.requests - before == 1 + len(DESIRED['services'])
+
+
+def test_updates_only_what_changed():
+    with MockRailway(latency=0) as mock, _client(mock) as client:
+        reconcile(client, DESIRED)
+        changed = json.loads(json.dumps(DESIRED))
+        changed['services']['api']['variables']['PORT'] = '8080'
+        changed['services']['web']['variables']['API_URL'] = 'https://api'
+
+        plan = diff_state(changed, fetch_current_state(client, changed))
+        assert plan.changed == {'api': {'PORT': '8080'}}
+        assert plan.added == {'web': {'API_URL': 'https://api'}}
+        assert plan.writes == 2
+
+        reconcile(client, changed)
+        assert _state(mock)[DESIRED['project']]['api']['PORT'] == '8080'
+        assert diff_state(changed, fetch_current_state(client, changed)).empty
+
+
+def test_variables_are_read_per_environment():
+    with MockRailway(latency=0) as mock, _client(mock) as client:
+        reconcile(client, DESIRED)
+        project_id, project = next(iter(mock.projects.items()))
+        staging = 'staging-id'
+        project['environments'][staging] = 'staging'
+        api_id = next(service_id for service_id, service in project['services'].items() if service['name'] == 'api')
+        project['variables'][(staging, api_id)] = {'NODE_ENV': 'staging', 'DEBUG': '1'}
+
+        current = fetch_current_state(client, DESIRED)
+        assert current['services']['api']['variables'] == DESIRED['services']['api']['variables']
+        assert diff_state(DESIRED, current).empty
+
+        staged = dict(DESIRED, environment='staging')
+        current = fetch_current_state(client, staged)
+        assert current['environment_id'] == staging
+        assert current['services']['api']['variables'] == {'NODE_ENV': 'staging', 'DEBUG': '1'}
+
+        with pytest.raises(RailwayError):
+            reconcile(client, dict(DESIRED, environment='preview'))
+
+
+def test_diff_keeps_or_prunes_extra_variables():
+    current = {'project_id': 'p', 'environment_id': 'e', 'services': {
+        'api': {'id': 's1', 'variables': {'NODE_ENV': 'production', 'PORT': '3000', 'OLD': 'x',
+                                          'RAILWAY_PUBLIC_DOMAIN': 'api.up.railway.app'}},
+        'web': {'id': 's2', 'variables': {}},
+    }}
+    plan = diff_state(DESIRED, current)
+    assert plan.empty and plan.extra == {'api': ['OLD']}
+    plan = diff_state(DESIRED, current, prune=True)
+    assert plan.removed == {'api': ['OLD']} and plan.writes == 1
+
+
+def test_lost_creations_are_found_not_repeated():
+    with LossyRailway({'projectCreate', 'serviceCreate'}, latency=0) as mock, _client(mock) as client:
+        service_ids = reconcile(client, DESIRED)
+        assert all(service_ids.values())
+        assert _state(mock) == _expected()
+        assert diff_state(DESIRED, fetch_current_state(client, DESIRED)).empty
+
+
+def test_random_losses_converge():
+    random.seed(7)
+    with MockRailway(latency=0, lost_rate=0.5) as mock, _client(mock) as client:
+        reconcile(client, DESIRED)
+        mock.lost_rate = 0.0
+        assert _state(mock) == _expected()
+
+
+def test_create_or_find_gives_up_when_nothing_was_created():
+    class Client:
+        max_retries = 2
+        calls = 0
+
+        def query(self, query, variables=None):
+            self.calls += 1
+            raise RailwayUncertainError('HTTP 503 na mutação')
+
+    client = Client()
+    with pytest.raises(RailwayError) as error:
+        create_or_find(client, 'Serviço api', ('mutation { serviceCreate }', None), lambda data: data,
+                       lambda: None)
+    assert not isinstance(error.value, RailwayUncertainError)
+    assert client.calls == client.max_retries + 1
+
+
+def test_load_desired_state(tmp_path):
+    path = tmp_path / 'railway.services.json'
+    desired = json.loads(json.dumps(DESIRED))
+    desired['services']['api']['variables']['DATABASE_URL'] = '${DATABASE_URL}'
+    path.write_text(json.dumps(desired), encoding='utf-8')
+
+    loaded = load_desired_state(str(path), {'DATABASE_URL': 'postgresql://db'})
+    assert loaded['services']['api']['variables']['DATABASE_URL'] == 'postgresql://db'
+    with pytest.raises(ValueError, match='DATABASE_URL'):
+        load_desired_state(str(path), {})
@@ -0,0 +1,115 @@
+import math
+import random
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from sector_benchmarks import BINS, MIN_COMPANIES, _GroupDelta, merge_cumulative, score_bin, sector_benchmark
+
+
+class CubeCursor:
+    """Cursor que responde à consulta de sector_benchmark com uma linha do cubo"""
+
+    def __init__(self, row):
+        self.row = row
+        self.position = None
+
+    def execute(self, query, params):
+        self.position = params[0]
+
+    def fetchone(self):
+        if self.row is None:
+            return None
+        companies, score_sum, best, worst, missing, cumulative = self.row
+        # cumulative[%s] do PostgreSQL: índice a partir de 1
+        return companies, score_sum, best, worst, missing, int(cumulative[self.position - 1])
+
+
+def _cube(*changes):
+    """Linha do cubo aplicando, em sequência, listas de (pontuação, sinal)"""
+    companies, score_sum, missing, cumulative = 0, 0, 0, None
+    members = []
+    for change in changes:
+        delta = _GroupDelta()
+        for score, sign in change:
+            delta.add(score, sign)
+            if sign > 0:
+                members.append(score)
+            else:
+                members.remove(score)
+        cumulative = merge_cumulative(cumulative, delta.histogram).tolist()
+        companies += delta.companies
+        score_sum += delta.score_sum
+        missing += delta.missing
+    scored = [score for score in members if score is not None]
+    return (companies, score_sum, max(scored), min(scored), missing, cumulative), scored
+
+
+def _brute_percentile(scores, score):
+    below = sum(1 for s in scores if float(s) < score)
+    return math.floor(Fraction(below * 100, len(scores)) + Fraction(1, 2))
+
+
+def _score(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def test_score_bin():
+    assert score_bin(0) == 0
+    assert score_bin(Decimal('0.29')) == 29
+    assert score_bin(Decimal('62.50')) == 6250
+    assert score_bin(100) == BINS - 1
+    assert score_bin(-3) == 0
+    assert score_bin(250) == BINS - 1
+
+
+def test_percentile_matches_brute_force():
+    random.seed(11)
+    scores = [_score(f'{random.randint(0, 10000) / 100:.2f}') for _ in range(300)]
+    scores += scores[:40]  # empates
+    row, scored = _cube([(score, 1) for score in scores])
+    assert row[0] == len(scored) and row[-1][-1] == len(scored)
+
+    lookups = [float(s) for s in scored[:60]] + [0, 0.001, 0.29, 33.335, 62.505, 99.999, 100, 120]
+    lookups += [random.uniform(0, 100) for _ in range(200)]
+    for score in lookups:
+        result = sector_benchmark(CubeCursor(row), 'ESG', 'Agronegócio', score)
+        assert result['percentile'] == _brute_percentile(scored, score), score
+
+
+def test_deltas_match_a_fresh_cube():
+    random.seed(3)
+    initial = [_score(f'{random.randint(0, 10000) / 100:.2f}') for _ in range(120)]
+    removed = initial[::3]
+    added = [_score(f'{random.randint(0, 10000) / 100:.2f}') for _ in range(50)]
+
+    incremental, scored = _cube([(score, 1) for score in initial],
+                                [(score, -1) for score in removed] + [(score, 1) for score in added])
+    fresh, fresh_scored = _cube([(score, 1) for score in scored])
+    assert sorted(scored) == sorted(fresh_scored)
+    assert incremental == fresh
+
+
+def test_benchmark_fields_and_missing_scores():
+    scores = [_score('40'), _score('55.5'), _score('70.25'), _score('70.25')]
+    row, _ = _cube([(score, 1) for score in scores] + [(None, 1), (None, 1)])
+    result = sector_benchmark(CubeCursor(row), 'ESG', 'Agronegócio', 70.25)
+    assert result == {
+        'insufficient': False, 'sector': 'Agronegócio', 'metric': 'overall', 'companiesCount': 4,
+        'sectorAverage': 59.0, 'percentile': 50, 'sectorBest': 70.25, 'sectorWorst': 40.0, 'missingScores': 2,
+    }
+
+    # Remover um sem pontuação e um com pontuação
+    row, _ = _cube([(score, 1) for score in scores] + [(None, 1), (None, 1)], [(None, -1), (scores[0], -1)])
+    result = sector_benchmark(CubeCursor(row), 'ESG', 'Agronegócio', 70.25)
+    assert (result['companiesCount'], result['missingScores'], result['percentile']) == (3, 1, 33)
+
+
+@pytest.mark.parametrize('row', [None, 'small'])
+def test_insufficient_data(row):
+    if row == 'small':
+        row, _ = _cube([(_score(f'{10 * i}'), 1) for i in range(MIN_COMPANIES - 1)] + [(None, 1)])
+    result = sector_benchmark(CubeCursor(row), 'GRI', 'Varejo', 50)
+    assert result['insufficient'] is True
+    assert 'Varejo' in result['reason']